@@ -0,0 +1,72 @@
+"""
+把users集合中旧的favoriteNovels数组迁移到独立的favorites集合
+
+用法:
+    python System/backfill_favorites.py --mongodb-url mongodb://localhost:4000 --database zhangzhixing
+    python System/backfill_favorites.py --unset   # 迁移后删除用户文档中的favoriteNovels字段
+
+可以重复执行：已存在的收藏关系不会被覆盖
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.core.config import settings  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+
+def backfill(db, batch_size=1000, unset=False):
+    """逐个用户把favoriteNovels写入favorites集合，按批提交"""
+    # 与应用使用相同的集合名
+    users = db[settings.USERS_COLLECTION]
+    favorites = db[settings.FAVORITES_COLLECTION]
+    favorites.create_index([("userId", 1), ("novelId", 1)], name="user_novel_unique", unique=True)
+
+    now = datetime.utcnow()
+    operations = []
+    migrated_users = 0
+    written = 0
+    cursor = users.find({"favoriteNovels.0": {"$exists": True}}, {"favoriteNovels": 1})
+    for user in cursor:
+        user_id = str(user["_id"])
+        for novel_id in user["favoriteNovels"]:
+            if not novel_id:
+                continue
+            key = {"userId": user_id, "novelId": str(novel_id)}
+            operations.append(UpdateOne(key, {"$setOnInsert": {**key, "createTime": now}}, upsert=True))
+        migrated_users += 1
+        if len(operations) >= batch_size:
+            written += favorites.bulk_write(operations, ordered=False).upserted_count
+            operations = []
+    if operations:
+        written += favorites.bulk_write(operations, ordered=False).upserted_count
+
+    logging.info(f"迁移完成：{migrated_users} 个用户，新增 {written} 条收藏")
+
+    if unset:
+        result = users.update_many({"favoriteNovels": {"$exists": True}}, {"$unset": {"favoriteNovels": ""}})
+        logging.info(f"已从 {result.modified_count} 个用户文档中删除favoriteNovels")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="迁移用户收藏到favorites集合")
+    parser.add_argument("--mongodb-url", default=settings.MONGODB_URL)
+    parser.add_argument("--database", default=settings.DATABASE_NAME)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--unset", action="store_true", help="迁移后删除用户文档中的favoriteNovels字段")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_url)
+    try:
+        backfill(client[args.database], args.batch_size, args.unset)
+    finally:
+        client.close()
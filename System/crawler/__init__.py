@@ -0,0 +1,22 @@
+"""
+小说爬虫基础组件
+
+- engine: 异步抓取引擎（连接池、并发限制、限速、重试）
+- http_cache: 磁盘HTTP响应缓存（内容寻址、压缩、条件请求重新验证）
+- sync: 章节目录对比和增量同步的更新文档
+- storage: 共用数据库客户端和批量写入缓冲
+- export: 导出为压缩JSONL/BSON分片文件的写入缓冲（代替直接写库）
+- frontier: 基于MongoDB的可恢复抓取队列（去重、优先级、租约、重试）
+- pipeline: 有界队列连接的多阶段流水线（背压、各阶段统计）
+- parsing: 可替换的HTML解析后端（selectolax/lxml/bs4）和解析进程池
+- dedupe: SimHash指纹和分段索引，书籍、章节的近似去重
+"""
+from .dedupe import Deduplicator, SimHashIndex, simhash
+from .engine import CrawlEngine, EngineConfig, FetchError, TokenBucket
+from .export import ShardSink, iter_shard
+from .frontier import Frontier
+from .http_cache import CacheEntry, HttpCache
+from .pipeline import Pipeline, Stage
+from .parsing import ParsePool, available_backends, resolve_backend
+from .storage import NovelSink, WriteFailure, create_client
+from .sync import TocDiff, diff_toc, build_sync_update
@@ -0,0 +1,194 @@
+"""
+基于SimHash的近似去重
+
+- simhash: 文本的64位指纹，相似文本的指纹只有少数几位不同
+- SimHashIndex: 分段（banded）LSH索引。把64位分成 max_distance+1 段，
+  海明距离不超过max_distance的两个指纹至少有一段完全相同（抽屉原理），
+  查询时只需比较与某一段相同的候选，不用遍历全部指纹
+- Deduplicator: 书籍和章节的去重策略
+"""
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# 重复内容的处理策略
+SKIP = "skip"      # 不保存重复的书籍/章节
+MERGE = "merge"    # 重复书籍的新章节合并到已有的书中
+FLAG = "flag"      # 照常保存，用duplicateOf标记重复的对象
+POLICIES = (SKIP, MERGE, FLAG)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    计算64位SimHash：以字符n-gram为特征、出现次数为权重
+    先按每个字节的取值累加权重（每个特征只做8次加法），最后再统计每一位，长文本也很快
+    """
+    text = _WHITESPACE.sub("", text or "")
+    if not text:
+        return 0
+    if len(text) <= shingle_size:
+        features = Counter([text])
+    else:
+        features = Counter(text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1))
+
+    counts = [[0] * 256 for _ in range(8)]
+    total = 0
+    for feature, weight in features.items():
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        for position, byte in enumerate(digest):
+            counts[position][byte] += weight
+        total += weight
+
+    fingerprint = 0
+    for position, column in enumerate(counts):
+        for bit in range(8):
+            mask = 1 << bit
+            # 该位为1的特征权重超过一半时，指纹的这一位为1
+            if 2 * sum(weight for byte, weight in enumerate(column) if byte & mask) > total:
+                fingerprint |= 1 << (position * 8 + bit)
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed(fingerprint: int) -> int:
+    """MongoDB只能存有符号64位整数"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class SimHashIndex:
+    """海明距离近邻索引，key为任意可哈希的标识"""
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        # 把64位尽量平均地分成bands段，记录每段的(偏移, 掩码)
+        self._bands: List[Tuple[int, int]] = []
+        offset = 0
+        for index in range(bands):
+            width = 64 // bands + (1 if index < 64 % bands else 0)
+            self._bands.append((offset, (1 << width) - 1))
+            offset += width
+        self._tables: List[Dict[int, List[Hashable]]] = [defaultdict(list) for _ in range(bands)]
+        self._fingerprints: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def add(self, key: Hashable, fingerprint: int):
+        self._fingerprints[key] = fingerprint
+        for table, (offset, mask) in zip(self._tables, self._bands):
+            table[(fingerprint >> offset) & mask].append(key)
+
+    def query(self, fingerprint: int) -> List[Tuple[Hashable, int]]:
+        """返回距离不超过max_distance的 [(key, 距离)]，按距离从近到远排列"""
+        candidates = set()
+        for table, (offset, mask) in zip(self._tables, self._bands):
+            candidates.update(table.get((fingerprint >> offset) & mask, ()))
+        matches = []
+        for key in candidates:
+            distance = hamming(fingerprint, self._fingerprints[key])
+            if distance <= self.max_distance:
+                matches.append((key, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def nearest(self, fingerprint: int) -> Optional[Hashable]:
+        matches = self.query(fingerprint)
+        return matches[0][0] if matches else None
+
+
+class Deduplicator:
+    """
+    书籍和章节的近似去重
+    书籍先按简介的指纹找候选，再要求前head_size章中至少min_head_overlap比例的章节互相近似才认定为重复，
+    避免简介雷同（如模板简介）的不同书籍被误判；章节在同一本书的已存储章节和本次新章节中查找近似重复。
+    书籍索引只在进程内，启动时用load从数据库加载；新书先用reserve登记，写入成功后才用settle加入索引，
+    避免duplicateOf指向写入失败或因同名书籍已存在而没有插入的_id
+    """
+
+    def __init__(self, policy: str = FLAG, max_distance: int = 3, head_size: int = 5, min_head_overlap: float = 0.5):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的去重策略: {policy}，可选: {', '.join(POLICIES)}")
+        self.policy = policy
+        self.max_distance = max_distance
+        self.head_size = head_size
+        self.min_head_overlap = min_head_overlap
+        self.books = SimHashIndex(max_distance)
+        self._heads: Dict[Any, List[int]] = {}
+        # 已判定为新书、等待写入结果的书籍：_id -> (简介指纹, 前几章指纹)
+        self._pending: Dict[Any, Tuple[int, List[int]]] = {}
+        # 统计信息
+        self.duplicate_books = 0
+        self.duplicate_chapters = 0
+
+    def load(self, collection) -> int:
+        """加载已存储书籍的指纹（标记为重复的书籍除外），返回加载的数量"""
+        cursor = collection.find(
+            {"fingerprint.description": {"$exists": True}, "duplicateOf": {"$exists": False}},
+            {"fingerprint": 1},
+        )
+        for doc in cursor:
+            fingerprint = doc["fingerprint"]
+            self.add_book(doc["_id"], to_unsigned(fingerprint["description"]),
+                          [to_unsigned(value) for value in fingerprint.get("head", [])])
+        return len(self.books)
+
+    def add_book(self, book_id: Any, description: int, head: List[int]):
+        self.books.add(book_id, description)
+        self._heads[book_id] = head
+
+    def reserve(self, book_id: Any, description: int, head: List[int]):
+        self._pending[book_id] = (description, head)
+
+    def settle(self, inserted: Iterable[Any], dropped: Iterable[Any] = ()):
+        """写入成功的书籍加入索引，写入失败或没有插入的书籍丢弃"""
+        for book_id in inserted:
+            fingerprint = self._pending.pop(book_id, None)
+            if fingerprint is not None:
+                self.add_book(book_id, *fingerprint)
+        for book_id in dropped:
+            self._pending.pop(book_id, None)
+
+    def find_duplicate_book(self, description: int, head: List[int]) -> Optional[Any]:
+        """返回与之重复的书籍ID"""
+        for book_id, _ in self.books.query(description):
+            if self._heads_match(head, self._heads.get(book_id, [])):
+                return book_id
+        return None
+
+    def _heads_match(self, head: List[int], other: List[int]) -> bool:
+        if not head or not other:
+            return False
+        matched = sum(1 for a in head if any(hamming(a, b) <= self.max_distance for b in other))
+        return matched >= math.ceil(self.min_head_overlap * min(len(head), len(other)))
+
+    def chapter_index(self, chapters: Iterable[Dict[str, Any]]) -> SimHashIndex:
+        """用已存储章节的指纹（本身是重复章节的除外）建立索引，key为chapterId"""
+        index = SimHashIndex(self.max_distance)
+        for chapter in chapters:
+            if chapter.get("simhash") is not None and not chapter.get("duplicateOf"):
+                index.add(chapter["chapterId"], to_unsigned(chapter["simhash"]))
+        return index
+
+    def fingerprint_doc(self, description: int, head: List[int]) -> Dict[str, Any]:
+        """保存在小说文档中的指纹"""
+        return {"description": to_signed(description), "head": [to_signed(value) for value in head]}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "indexed_books": len(self.books),
+            "pending_books": len(self._pending),
+            "duplicate_books": self.duplicate_books,
+            "duplicate_chapters": self.duplicate_chapters,
+        }
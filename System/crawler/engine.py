@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+from .http_cache import HttpCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/114.0.0.0',
+    'Accept-Language': 'zh-CN,zh;q=0.9'
+}
+
+# 这些状态码认为是临时错误，退避后重试
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class EngineConfig:
+    """爬虫引擎配置，时间单位均为秒"""
+    max_concurrency: int = 32           # 全局同时进行的请求数（也是连接池大小）
+    per_host_concurrency: int = 4       # 单个站点同时进行的请求数
+    per_host_rate: float = 5.0          # 单个站点每秒请求数（令牌桶填充速率），<=0表示不限速
+    per_host_burst: int = 5             # 令牌桶容量，允许的瞬时突发请求数
+    retries: int = 3                    # 失败后的最大重试次数
+    backoff_base: float = 0.5           # 第n次重试前等待 backoff_base * 2^(n-1)，再加随机抖动
+    backoff_max: float = 30.0
+    connect_timeout: float = 5.0        # 建立连接
+    read_timeout: float = 15.0          # 两次读取之间的最长间隔
+    write_timeout: float = 10.0
+    pool_timeout: float = 30.0          # 等待连接池中的空闲连接
+    request_timeout: float = 60.0       # 单次请求（不含重试）的总耗时上限
+    headers: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_HEADERS))
+
+
+class FetchError(Exception):
+    """重试用尽后仍然失败"""
+
+    def __init__(self, url: str, reason: str, status: Optional[int] = None):
+        super().__init__(f"{url}: {reason}")
+        self.url = url
+        self.reason = reason
+        self.status = status
+
+
+class TokenBucket:
+    """
+    令牌桶限速器
+    每秒补充rate个令牌，最多积累capacity个；acquire在没有令牌时等待到下一个令牌产生
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        # 加锁保证等待者按先来后到获得令牌
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _HostLimiter:
+    """单个站点的并发限制和限速"""
+
+    def __init__(self, config: EngineConfig):
+        self.semaphore = asyncio.Semaphore(config.per_host_concurrency)
+        self.bucket = TokenBucket(config.per_host_rate, config.per_host_burst)
+
+
+class CrawlEngine:
+    """
+    异步抓取引擎
+    - 复用一个httpx连接池
+    - 全局并发和按站点的并发、令牌桶限速
+    - 临时错误（连接失败、超时、429/5xx）按指数退避加随机抖动重试，429/503优先使用Retry-After
+    - 连接、读取、写入、等待连接池和单次请求总耗时分别设置超时
+    - 传入cache时fetch_text先查磁盘缓存，未过期直接返回，过期后发送条件请求，304时使用缓存内容
+
+    用法:
+        async with CrawlEngine(EngineConfig(per_host_rate=2)) as engine:
+            html = await engine.fetch_text(url)
+    """
+
+    def __init__(self, config: Optional[EngineConfig] = None, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 cache: Optional[HttpCache] = None):
+        self.config = config or EngineConfig()
+        self.cache = cache
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._hosts: Dict[str, _HostLimiter] = {}
+        # 统计信息
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes_received = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        config = self.config
+        self._client = httpx.AsyncClient(
+            headers=config.headers,
+            timeout=httpx.Timeout(
+                connect=config.connect_timeout,
+                read=config.read_timeout,
+                write=config.write_timeout,
+                pool=config.pool_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=config.max_concurrency,
+                max_keepalive_connections=config.max_concurrency,
+            ),
+            follow_redirects=True,
+            transport=self._transport,
+        )
+        self._semaphore = asyncio.Semaphore(config.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_limiter(self, url: str) -> _HostLimiter:
+        host = urlsplit(url).netloc
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = self._hosts[host] = _HostLimiter(self.config)
+        return limiter
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """第attempt次重试前的等待时间（指数退避，在上限的一半到上限之间随机），服务端给出Retry-After时优先使用"""
+        if response is not None:
+            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.config.backoff_max)
+        ceiling = min(self.config.backoff_max, self.config.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    async def _send(self, method: str, url: str, headers: Optional[Dict[str, str]]) -> httpx.Response:
+        limiter = self._host_limiter(url)
+        async with limiter.semaphore:
+            # 先在站点内排队和限速，再占用全局名额，限速等待中的慢站点不会占满全局并发
+            await limiter.bucket.acquire()
+            async with self._semaphore:
+                self.requests += 1
+                response = await asyncio.wait_for(
+                    self._client.request(method, url, headers=headers),
+                    timeout=self.config.request_timeout,
+                )
+                self.bytes_received += len(response.content)
+                return response
+
+    async def request(self, url: str, method: str = "GET", headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        发送请求并在临时错误时重试，返回最终的响应（可能是4xx等非重试状态）
+        重试用尽时抛出FetchError
+        """
+        if self._client is None:
+            raise RuntimeError("CrawlEngine尚未启动，请使用 async with CrawlEngine() as engine")
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await self._send(method, url, headers)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                reason = f"{type(e).__name__}: {e}"
+
+            attempt += 1
+            if attempt > self.config.retries:
+                self.failures += 1
+                raise FetchError(url, reason, response.status_code if response is not None else None)
+            delay = self._backoff(attempt, response)
+            self.retries += 1
+            logger.warning(f"请求失败，{delay:.2f}秒后第{attempt}次重试: {url}, 原因: {reason}")
+            await asyncio.sleep(delay)
+
+    async def fetch_text(self, url: str) -> Optional[str]:
+        """获取页面文本，失败或非200时记录日志并返回None"""
+        if self.cache is not None:
+            return await self._fetch_text_cached(url)
+        try:
+            response = await self.request(url)
+        except FetchError as e:
+            logger.error(f"获取页面失败: {url}, 错误: {e.reason}")
+            return None
+        if response.status_code != 200:
+            logger.error(f"获取页面失败: {url}, 状态码: {response.status_code}")
+            return None
+        return response.text
+
+    async def _fetch_text_cached(self, url: str) -> Optional[str]:
+        cache = self.cache
+        # 缓存读写是磁盘IO，放到线程中执行
+        entry = await asyncio.to_thread(cache.lookup, url)
+        if entry is not None and cache.is_fresh(entry):
+            text = await asyncio.to_thread(cache.load_text, entry)
+            if text is not None:
+                cache.hits += 1
+                return text
+
+        try:
+            response = await self.request(url, headers=entry.conditional_headers() if entry is not None else None)
+            if response.status_code == 304 and entry is not None:
+                text = await asyncio.to_thread(cache.load_text, entry)
+                if text is not None:
+                    cache.revalidated += 1
+                    try:
+                        await asyncio.to_thread(
+                            cache.touch, entry, response.headers.get("ETag"), response.headers.get("Last-Modified")
+                        )
+                    except OSError as e:
+                        logger.warning(f"缓存写入失败: {url}, 错误: {e}")
+                    return text
+                # 缓存正文丢失，重新下载完整内容
+                response = await self.request(url)
+        except FetchError as e:
+            if entry is not None:
+                # 源站不可用时使用过期的缓存
+                text = await asyncio.to_thread(cache.load_text, entry)
+                if text is not None:
+                    logger.warning(f"获取页面失败，使用过期缓存: {url}, 错误: {e.reason}")
+                    return text
+            logger.error(f"获取页面失败: {url}, 错误: {e.reason}")
+            return None
+
+        if response.status_code != 200:
+            logger.error(f"获取页面失败: {url}, 状态码: {response.status_code}")
+            return None
+        cache.misses += 1
+        try:
+            await asyncio.to_thread(
+                cache.store, url, response.status_code, response.content, response.encoding,
+                response.headers.get("ETag"), response.headers.get("Last-Modified"),
+            )
+        except OSError as e:
+            # 缓存只是加速手段，写入失败不影响本次抓取
+            logger.warning(f"缓存写入失败: {url}, 错误: {e}")
+        return response.text
+
+    def stats(self) -> Dict[str, float]:
+        stats = {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "bytes_received": self.bytes_received,
+        }
+        if self.cache is not None:
+            stats.update({f"cache_{key}": value for key, value in self.cache.stats().items()})
+        return stats
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After可以是秒数或HTTP日期"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
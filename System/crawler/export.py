@@ -0,0 +1,192 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import bson
+from bson import ObjectId, json_util
+from .storage import WriteFailure
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "bson")
+EXTENSIONS = {"jsonl": "jsonl.gz", "bson": "bson.gz"}
+
+
+def novel_object_id(user_id: str, title: str) -> ObjectId:
+    """由(user_id, title)确定的_id：同一本书多次导出（不同书页URL同名、--reset重新导出）得到相同的_id"""
+    return ObjectId(hashlib.sha1(f"{user_id}\0{title}".encode("utf-8")).digest()[:12])
+
+
+def encode_document(doc: Dict[str, Any], format: str) -> bytes:
+    """编码一个文档，格式与benchmarks/datagen.py输出的分片文件相同"""
+    if format == "jsonl":
+        return json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False).encode("utf-8") + b"\n"
+    return bson.encode(doc)
+
+
+def shard_format(path: str) -> str:
+    for format, extension in EXTENSIONS.items():
+        if path.endswith(f".{extension}"):
+            return format
+    raise ValueError(f"无法识别的分片文件: {path}，应以 {' / '.join(EXTENSIONS.values())} 结尾")
+
+
+def iter_shard(path: str) -> Iterator[Dict[str, Any]]:
+    """逐个读取分片文件中的文档"""
+    format = shard_format(path)
+    with gzip.open(path, "rb") as f:
+        if format == "bson":
+            yield from bson.decode_file_iter(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json_util.loads(line)
+
+
+class ShardSink:
+    """
+    把抓取完成的小说写成压缩的JSONL/BSON分片文件，代替NovelSink直接写库，之后用System/load_shards.py批量载入
+    每个分片先写临时文件，写满shard_size本（或调用flush）后改名为正式文件，
+    改名后才以 on_written(token列表, []) 和 on_inserted(_id列表, []) 回调，进程崩溃时未完成的分片丢弃，
+    其中的书籍在租约过期后重新抓取。
+    文件名带主机名、进程号和随机串，多个爬虫进程可以写入同一个目录。
+    导出模式下每本书都按新书处理，不支持增量更新
+    """
+
+    collection = None
+
+    def __init__(self, out_dir: str, format: str = "jsonl", shard_size: int = 1000, batch_size: int = 20,
+                 compress_level: int = 3, kind: str = "novels",
+                 on_written: Optional[Callable[[List[Any], List[tuple]], None]] = None,
+                 on_inserted: Optional[Callable[[List[Any], List[Any]], None]] = None):
+        if format not in FORMATS:
+            raise ValueError(f"未知的分片格式: {format}，可选: {', '.join(FORMATS)}")
+        self.out_dir = out_dir
+        self.format = format
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.compress_level = compress_level
+        self.on_written = on_written
+        self.on_inserted = on_inserted
+        self._prefix = f"{kind}-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._pending: List[tuple] = []  # (书名, 文档, token)
+        self._file = None
+        self._path: Optional[str] = None
+        self._shard_titles: List[str] = []
+        self._shard_tokens: List[Any] = []
+        self._shard_ids: List[Any] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # 统计信息
+        self.shards = 0
+        self.inserted = 0
+        self.compressed_bytes = 0
+        self.failures: List[WriteFailure] = []
+
+    async def insert_novel(self, novel: Dict[str, Any], token: Any = None):
+        # 导出时按(user_id, title)确定_id，重复导出或重复载入都不会产生重复的书
+        novel.setdefault("_id", novel_object_id(novel["user_id"], novel["title"]))
+        self._pending.append((novel["title"], novel, token))
+        if len(self._pending) >= self.batch_size:
+            await self._write_pending()
+
+    async def update_novel(self, title: str, filter: Dict[str, Any], update: Dict[str, Any], token: Any = None):
+        # 导出模式下NovelCrawler读不到已存储的书，不会生成更新操作；误用时明确报错，而不是悄悄丢弃
+        raise ValueError(f"导出到分片文件时不支持增量更新（小说 {title}），请直接写入数据库同步已有的书")
+
+    async def acknowledge(self, token: Any):
+        if self.on_written is not None:
+            await asyncio.to_thread(self.on_written, [token], [])
+
+    async def _write_pending(self, finish: bool = False):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if batch or finish:
+                # 压缩和写文件放到线程中执行，不阻塞抓取
+                await asyncio.to_thread(self._write, batch, finish)
+
+    async def flush(self):
+        """写出缓冲区并结束当前分片"""
+        await self._write_pending(finish=True)
+
+    def _write(self, batch: List[tuple], finish: bool):
+        written = 0
+        completed: List[Any] = []
+        inserted: List[Any] = []
+        try:
+            for title, novel, token in batch:
+                if self._file is None:
+                    self._open_shard()
+                self._file.write(encode_document(novel, self.format))
+                self._shard_titles.append(title)
+                self._shard_tokens.append(token)
+                self._shard_ids.append(novel["_id"])
+                written += 1
+                if len(self._shard_tokens) >= self.shard_size:
+                    ids = self._shard_ids
+                    completed += self._close_shard()
+                    inserted += ids
+            if finish and self._file is not None:
+                ids = self._shard_ids
+                completed += self._close_shard()
+                inserted += ids
+        except Exception as e:
+            self._shard_titles += [title for title, _, _ in batch[written:]]
+            self._shard_tokens += [token for _, _, token in batch[written:]]
+            self._shard_ids += [novel["_id"] for _, novel, _ in batch[written:]]
+            self._discard_shard(e)
+        if self.on_inserted is not None and inserted:
+            self.on_inserted(inserted, [])
+        if self.on_written is not None and completed:
+            self.on_written(completed, [])
+
+    def _open_shard(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._path = os.path.join(self.out_dir, f"{self._prefix}-{self.shards:05d}.{EXTENSIONS[self.format]}")
+        self._file = gzip.open(f"{self._path}.tmp", "wb", compresslevel=self.compress_level)
+
+    def _close_shard(self) -> List[Any]:
+        """结束当前分片，返回其中书籍的token"""
+        self._file.close()
+        self._file = None
+        os.replace(f"{self._path}.tmp", self._path)
+        tokens, self._shard_titles, self._shard_tokens, self._shard_ids = self._shard_tokens, [], [], []
+        self.shards += 1
+        self.inserted += len(tokens)
+        self.compressed_bytes += os.path.getsize(self._path)
+        logger.info(f"分片 {os.path.basename(self._path)} 写入完成，{len(tokens)} 本小说")
+        return tokens
+
+    def _discard_shard(self, error: Exception):
+        """写文件失败：丢弃当前分片，其中的书籍都记为失败"""
+        logger.error(f"写入分片 {self._path} 失败: {error}")
+        if self._file is not None:
+            try:
+                self._file.close()
+                os.remove(f"{self._path}.tmp")
+            except OSError:
+                pass
+            self._file = None
+        failed = []
+        for title, token in zip(self._shard_titles, self._shard_tokens):
+            failure = WriteFailure(title, None, str(error))
+            self.failures.append(failure)
+            failed.append((token, failure))
+        dropped, self._shard_titles, self._shard_tokens, self._shard_ids = self._shard_ids, [], [], []
+        if self.on_inserted is not None and dropped:
+            self.on_inserted([], dropped)
+        if self.on_written is not None and failed:
+            self.on_written([], failed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shards": self.shards,
+            "inserted": self.inserted,
+            "compressed_bytes": self.compressed_bytes,
+            "failed": len(self.failures),
+        }
@@ -0,0 +1,193 @@
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# 唯一索引冲突的错误码
+DUPLICATE_KEY = 11000
+
+
+def default_worker_id() -> str:
+    """主机名:进程号:随机串，多台机器、多个进程之间不重复"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Frontier:
+    """
+    基于MongoDB的抓取队列
+    每个URL一条文档（_id为URL，天然去重），状态流转：
+        pending --lease--> leased --complete--> done
+                             |--fail--> pending（退避后重试） / failed（超过最大尝试次数）
+                             |--租约过期--> 可被其他worker重新领取
+    领取用find_one_and_update原子地把一条可领取的任务标记为leased，多个进程、多台机器可以同时领取而不会重复；
+    worker崩溃后租约到期，任务自动回到可领取状态，已完成的任务不会重做。
+    checkpoint可以在处理过程中保存进度，任务被重新领取时从上次的进度继续
+    """
+
+    def __init__(self, collection, worker_id: Optional[str] = None, lease_seconds: float = 300,
+                 max_attempts: int = 5, retry_backoff: float = 60):
+        self.collection = collection
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+    def ensure_indexes(self):
+        # 领取：按状态、优先级、可用时间查找
+        self.collection.create_index(
+            [("state", ASCENDING), ("priority", DESCENDING), ("availableAt", ASCENDING)], name="state_priority"
+        )
+        # 回收过期租约
+        self.collection.create_index([("state", ASCENDING), ("leaseExpires", ASCENDING)], name="state_lease_expires")
+
+    def add(self, urls: Iterable[str], kind: str, priority: int = 0, data: Optional[Dict[str, Any]] = None) -> int:
+        """加入待抓取的URL，已存在的URL（无论什么状态）不会重复加入，返回新加入的数量"""
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne({"_id": url}, {"$setOnInsert": {
+                "kind": kind,
+                "priority": priority,
+                "state": PENDING,
+                "attempts": 0,
+                "availableAt": now,
+                "createTime": now,
+                "data": data or {},
+                "checkpoint": {},
+            }}, upsert=True)
+            for url in dict.fromkeys(urls)
+        ]
+        if not operations:
+            return 0
+        try:
+            return self.collection.bulk_write(operations, ordered=False).upserted_count
+        except BulkWriteError as e:
+            # 多个worker同时加入同一个URL时，后到的upsert会撞上_id唯一索引，忽略即可
+            failed = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY]
+            if failed:
+                raise
+            return e.details.get("nUpserted", 0)
+
+    def lease(self, kinds: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """领取一个任务：优先级高的先领，同优先级先到先领；没有可领取的任务时返回None"""
+        now = datetime.utcnow()
+        query: Dict[str, Any] = {"$or": [
+            {"state": PENDING, "availableAt": {"$lte": now}},
+            {"state": LEASED, "leaseExpires": {"$lt": now}, "attempts": {"$lt": self.max_attempts}},
+        ]}
+        if kinds:
+            query["kind"] = {"$in": kinds}
+        return self.collection.find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "state": LEASED,
+                    "leaseOwner": self.worker_id,
+                    "leaseExpires": now + timedelta(seconds=self.lease_seconds),
+                    "updateTime": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", DESCENDING), ("availableAt", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _owned(self, url: str) -> Dict[str, Any]:
+        """只有仍持有租约的worker才能修改任务，租约已被他人接手时更新不生效"""
+        return {"_id": url, "state": LEASED, "leaseOwner": self.worker_id}
+
+    def renew(self, url: str) -> bool:
+        """延长租约，处理时间较长的任务应定期调用；返回False表示租约已丢失"""
+        now = datetime.utcnow()
+        result = self.collection.update_one(
+            self._owned(url), {"$set": {"leaseExpires": now + timedelta(seconds=self.lease_seconds), "updateTime": now}}
+        )
+        return result.matched_count == 1
+
+    def renew_many(self, urls: List[str]) -> int:
+        """批量延长租约，返回仍持有租约的任务数"""
+        now = datetime.utcnow()
+        result = self.collection.update_many(
+            {"_id": {"$in": urls}, "state": LEASED, "leaseOwner": self.worker_id},
+            {"$set": {"leaseExpires": now + timedelta(seconds=self.lease_seconds), "updateTime": now}},
+        )
+        return result.matched_count
+
+    def checkpoint(self, url: str, progress: Dict[str, Any]) -> bool:
+        """保存处理进度，任务被重新领取时可从item['checkpoint']继续"""
+        fields = {f"checkpoint.{key}": value for key, value in progress.items()}
+        fields["updateTime"] = datetime.utcnow()
+        return self.collection.update_one(self._owned(url), {"$set": fields}).matched_count == 1
+
+    def complete(self, url: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        """标记任务完成"""
+        now = datetime.utcnow()
+        fields = {"state": DONE, "doneTime": now, "updateTime": now}
+        if result:
+            fields["result"] = result
+        update = {"$set": fields, "$unset": {"leaseOwner": "", "leaseExpires": "", "lastError": ""}}
+        return self.collection.update_one(self._owned(url), update).matched_count == 1
+
+    def fail(self, url: str, error: str, attempts: int) -> bool:
+        """
+        任务处理失败：未超过最大尝试次数时按指数退避放回队列，否则标记为failed
+        attempts为领取时返回的尝试次数
+        """
+        now = datetime.utcnow()
+        if attempts >= self.max_attempts:
+            fields = {"state": FAILED, "lastError": error, "updateTime": now}
+        else:
+            delay = self.retry_backoff * (2 ** (attempts - 1))
+            fields = {"state": PENDING, "lastError": error, "availableAt": now + timedelta(seconds=delay), "updateTime": now}
+        update = {"$set": fields, "$unset": {"leaseOwner": "", "leaseExpires": ""}}
+        return self.collection.update_one(self._owned(url), update).matched_count == 1
+
+    def reap(self) -> int:
+        """把租约过期且已用完尝试次数的任务标记为failed（worker反复在同一个任务上崩溃的情况）"""
+        now = datetime.utcnow()
+        result = self.collection.update_many(
+            {"state": LEASED, "leaseExpires": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"state": FAILED, "lastError": "租约过期次数过多", "updateTime": now},
+             "$unset": {"leaseOwner": "", "leaseExpires": ""}},
+        )
+        return result.modified_count
+
+    def reset(self, states: Iterable[str] = (DONE, FAILED), kinds: Optional[List[str]] = None) -> int:
+        """把指定状态的任务重新放回队列（重新抓取），返回重置的数量"""
+        query: Dict[str, Any] = {"state": {"$in": list(states)}}
+        if kinds:
+            query["kind"] = {"$in": kinds}
+        now = datetime.utcnow()
+        result = self.collection.update_many(query, {
+            "$set": {"state": PENDING, "attempts": 0, "availableAt": now, "updateTime": now},
+            "$unset": {"lastError": "", "leaseOwner": "", "leaseExpires": ""},
+        })
+        return result.modified_count
+
+    def count(self, kind: Optional[str] = None) -> int:
+        return self.collection.count_documents({"kind": kind} if kind else {})
+
+    def has_unfinished(self, kinds: Optional[List[str]] = None) -> bool:
+        """是否还有待处理或处理中的任务（包括退避中的任务）"""
+        query: Dict[str, Any] = {"state": {"$in": [PENDING, LEASED]}}
+        if kinds:
+            query["kind"] = {"$in": kinds}
+        return self.collection.find_one(query, {"_id": 1}) is not None
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for row in self.collection.aggregate([{"$group": {"_id": "$state", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认的URL分类和有效期（秒）：分类页变化最快，章节页发布后很少修改
+DEFAULT_TTL_RULES: List[Tuple[str, float]] = [
+    (r"/lishi/\d+\.html$", 3600),            # 分类列表页
+    (r"/kan/\d+/$", 6 * 3600),               # 书籍主页（目录）
+    (r"/kan/\d+/\d+\.html$", 30 * 86400),    # 章节页
+]
+DEFAULT_TTL = 3600
+
+
+@dataclass
+class CacheEntry:
+    """一个URL的缓存记录，正文按内容哈希单独存放"""
+    url: str
+    status: int
+    body_hash: str
+    encoding: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float       # 首次写入或内容变化的时间
+    validated_at: float    # 最近一次确认内容有效（下载或304）的时间
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """重新验证时附带的条件请求头"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    磁盘上的HTTP响应缓存
+    - 索引：每个URL一个JSON文件（按URL的SHA1分目录），记录ETag、Last-Modified和正文哈希
+    - 正文：按SHA256内容寻址、gzip压缩存放，内容相同的页面只存一份
+    - 有效期：按URL正则分类设置，过期后带If-None-Match / If-Modified-Since重新验证，
+      服务端返回304时只刷新验证时间，不重新下载
+    文件先写临时文件再原子替换，多个爬虫进程可以共用同一个缓存目录
+    """
+
+    def __init__(self, directory: str, ttl_rules: Optional[List[Tuple[str, float]]] = None,
+                 default_ttl: float = DEFAULT_TTL, compress_level: int = 6):
+        self.directory = directory
+        self.rules: List[Tuple[Pattern, float]] = [
+            (re.compile(pattern), ttl) for pattern, ttl in (DEFAULT_TTL_RULES if ttl_rules is None else ttl_rules)
+        ]
+        self.default_ttl = default_ttl
+        self.compress_level = compress_level
+        # 统计信息
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stored_bytes = 0
+        self.compressed_bytes = 0
+
+    def ttl_for(self, url: str) -> float:
+        """URL的有效期（秒），匹配第一个符合的规则"""
+        for pattern, ttl in self.rules:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def _index_path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "index", digest[:2], f"{digest}.json")
+
+    def _object_path(self, body_hash: str) -> str:
+        return os.path.join(self.directory, "objects", body_hash[:2], f"{body_hash}.gz")
+
+    def _write_atomic(self, path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # 每个写入者使用独立的临时文件：同一进程的多个线程可能同时写入同一个正文对象
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """读取URL的缓存记录，没有或已损坏时返回None"""
+        try:
+            with open(self._index_path(url), encoding="utf-8") as f:
+                return CacheEntry(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as e:
+            logger.warning(f"缓存索引损坏，忽略: {url}, 错误: {e}")
+            return None
+
+    def is_fresh(self, entry: CacheEntry, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - entry.validated_at < self.ttl_for(entry.url)
+
+    def load_body(self, entry: CacheEntry) -> Optional[bytes]:
+        """读取正文，文件缺失或损坏时返回None"""
+        try:
+            with gzip.open(self._object_path(entry.body_hash), "rb") as f:
+                return f.read()
+        except (OSError, EOFError) as e:
+            logger.warning(f"缓存正文读取失败，忽略: {entry.url}, 错误: {e}")
+            return None
+
+    def load_text(self, entry: CacheEntry) -> Optional[str]:
+        body = self.load_body(entry)
+        if body is None:
+            return None
+        return body.decode(entry.encoding or "utf-8", errors="replace")
+
+    def store(self, url: str, status: int, body: bytes, encoding: Optional[str],
+              etag: Optional[str], last_modified: Optional[str]) -> CacheEntry:
+        """保存一次完整响应"""
+        body_hash = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(body_hash)
+        if not os.path.exists(object_path):
+            compressed = gzip.compress(body, compresslevel=self.compress_level)
+            self._write_atomic(object_path, compressed)
+            self.stored_bytes += len(body)
+            self.compressed_bytes += len(compressed)
+
+        now = time.time()
+        previous = self.lookup(url)
+        stored_at = previous.stored_at if previous is not None and previous.body_hash == body_hash else now
+        entry = CacheEntry(url, status, body_hash, encoding, etag, last_modified, stored_at, now)
+        self._write_atomic(self._index_path(url), json.dumps(asdict(entry), ensure_ascii=False).encode("utf-8"))
+        return entry
+
+    def touch(self, entry: CacheEntry, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """服务端返回304：内容未变，刷新验证时间（服务端给出新的验证器时一并更新）"""
+        entry.validated_at = time.time()
+        entry.etag = etag or entry.etag
+        entry.last_modified = last_modified or entry.last_modified
+        self._write_atomic(self._index_path(entry.url), json.dumps(asdict(entry), ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "stored_bytes": self.stored_bytes,
+            "compressed_bytes": self.compressed_bytes,
+        }
@@ -0,0 +1,247 @@
+"""
+可替换的HTML解析后端
+
+页面提取逻辑只依赖select/select_one/text/attr四个操作，同一套CSS选择器可以在以下后端上运行：
+- selectolax: 基于Lexbor的C实现，最快（pip install selectolax）
+- lxml:       libxml2 + cssselect（pip install lxml cssselect）
+- bs4:        BeautifulSoup + html.parser，纯Python，最慢，作为兜底和对比基准
+
+文本提取的规则与BeautifulSoup的get_text(sep, strip=True)一致：
+各文本节点去掉首尾空白后用分隔符连接，跳过空节点、注释和script/style中的内容
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # pragma: no cover - selectolax是可选依赖
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    import cssselect  # noqa: F401  lxml的CSS选择器依赖cssselect
+except ImportError:  # pragma: no cover - lxml是可选依赖
+    lxml = None
+
+# 不参与文本提取的标签
+SKIP_TEXT_TAGS = {"script", "style", "template"}
+
+# 页面上用到的选择器
+BOOK_LINK_SELECTOR = '.hot .item a[href*="/kan/"]'
+TOC_SELECTOR = 'div.listmain dd a:not([href*="javascript"])'
+CHAPTER_CONTENT_SELECTOR = '#chaptercontent'
+
+
+def _join_text(texts, separator: str) -> str:
+    return separator.join(text for text in (text.strip() for text in texts) if text)
+
+
+class _Bs4Node:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def text(self, separator: str = "") -> str:
+        return self.node.get_text(separator, strip=True)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.node.get(name)
+
+
+class _Bs4Document:
+    def __init__(self, html: str):
+        self.soup = BeautifulSoup(html, "html.parser")
+
+    def select(self, selector: str) -> List[_Bs4Node]:
+        return [_Bs4Node(node) for node in self.soup.select(selector)]
+
+    def select_one(self, selector: str) -> Optional[_Bs4Node]:
+        node = self.soup.select_one(selector)
+        return _Bs4Node(node) if node is not None else None
+
+
+class _LxmlNode:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def _texts(self, element):
+        if element.text:
+            yield element.text
+        for child in element:
+            # 注释、处理指令的tag不是字符串，只取其后的tail
+            if isinstance(child.tag, str) and child.tag not in SKIP_TEXT_TAGS:
+                yield from self._texts(child)
+            if child.tail:
+                yield child.tail
+
+    def text(self, separator: str = "") -> str:
+        return _join_text(self._texts(self.node), separator)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.node.get(name)
+
+
+class _LxmlDocument:
+    def __init__(self, html: str):
+        self.root = lxml.html.fromstring(html)
+
+    def select(self, selector: str) -> List[_LxmlNode]:
+        return [_LxmlNode(node) for node in self.root.cssselect(selector)]
+
+    def select_one(self, selector: str) -> Optional[_LxmlNode]:
+        nodes = self.root.cssselect(selector)
+        return _LxmlNode(nodes[0]) if nodes else None
+
+
+class _SelectolaxNode:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def _texts(self, node):
+        for child in node.iter(include_text=True):
+            if child.tag == "-text":
+                yield child.text_content
+            elif child.tag[:1].isalpha() and child.tag not in SKIP_TEXT_TAGS:
+                # 注释等非元素节点的tag以非字母开头
+                yield from self._texts(child)
+
+    def text(self, separator: str = "") -> str:
+        return _join_text(self._texts(self.node), separator)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.node.attributes.get(name)
+
+
+class _SelectolaxDocument:
+    def __init__(self, html: str):
+        self.tree = LexborHTMLParser(html)
+
+    def select(self, selector: str) -> List[_SelectolaxNode]:
+        return [_SelectolaxNode(node) for node in self.tree.css(selector)]
+
+    def select_one(self, selector: str) -> Optional[_SelectolaxNode]:
+        node = self.tree.css_first(selector)
+        return _SelectolaxNode(node) if node is not None else None
+
+
+# 后端名称 -> 文档类，按速度从快到慢排列
+_BACKENDS: Dict[str, Callable] = {
+    "selectolax": _SelectolaxDocument,
+    "lxml": _LxmlDocument,
+    "bs4": _Bs4Document,
+}
+
+
+def available_backends() -> List[str]:
+    """已安装的后端，按速度从快到慢排列"""
+    installed = {"selectolax": LexborHTMLParser is not None, "lxml": lxml is not None, "bs4": True}
+    return [name for name in _BACKENDS if installed[name]]
+
+
+def resolve_backend(name: str = "auto") -> str:
+    """auto选择已安装的最快后端；指定的后端未安装时抛出ValueError"""
+    backends = available_backends()
+    if name == "auto":
+        return backends[0]
+    if name not in _BACKENDS:
+        raise ValueError(f"未知的解析后端: {name}，可选: auto, {', '.join(_BACKENDS)}")
+    if name not in backends:
+        raise ValueError(f"解析后端 {name} 未安装，已安装: {', '.join(backends)}")
+    return name
+
+
+def parse_document(html: str, backend: str = "bs4"):
+    """用指定后端解析HTML，返回支持select/select_one的文档"""
+    return _BACKENDS[backend](html)
+
+
+# ---------- 页面提取，结果只包含基本类型，可以在进程间传递 ----------
+
+def extract_book_links(html: str, backend: str = "bs4") -> List[str]:
+    """分类页中的书籍链接（未拼接域名）"""
+    document = parse_document(html, backend)
+    return [node.attr("href") for node in document.select(BOOK_LINK_SELECTOR)]
+
+
+def extract_toc(html: str, backend: str = "bs4") -> List[Tuple[str, str]]:
+    """目录页中的 [(章节链接, 章节标题)]"""
+    document = parse_document(html, backend)
+    return [(node.attr("href"), node.text()) for node in document.select(TOC_SELECTOR)]
+
+
+def extract_chapter_content(html: str, backend: str = "bs4") -> str:
+    """章节正文，段落之间用换行分隔"""
+    node = parse_document(html, backend).select_one(CHAPTER_CONTENT_SELECTOR)
+    return node.text("\n") if node is not None else ""
+
+
+def extract_book_info(html: str, backend: str = "bs4") -> Dict[str, Optional[str]]:
+    """书籍主页的基本信息，缺失的字段为None"""
+    document = parse_document(html, backend)
+
+    def text_of(selector, separator=""):
+        node = document.select_one(selector)
+        return node.text(separator) if node is not None else None
+
+    cover = document.select_one('.cover img')
+    return {
+        "title": text_of('h1'),
+        "author": text_of('.small span:first-child'),
+        "updateTime": text_of('.small .last'),
+        "cover": cover.attr("src") if cover is not None else None,
+        "description": text_of(".intro dd", "\n"),
+    }
+
+
+class ParsePool:
+    """
+    页面解析执行器
+    一次解析的页面数达到process_threshold时分块交给进程池并行解析，避免CPU密集的解析阻塞事件循环；
+    页面较少时直接在当前线程解析，省去进程间传递HTML的开销。workers为0时不使用进程池
+    """
+
+    def __init__(self, backend: str = "auto", workers: int = 0, process_threshold: int = 16, chunk_size: int = 8):
+        self.backend = resolve_backend(backend)
+        self.workers = workers
+        self.process_threshold = process_threshold
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def parse(self, extractor: Callable, html: str):
+        """在当前线程解析单个页面"""
+        return extractor(html, self.backend)
+
+    async def parse_many(self, extractor: Callable, htmls: List[str]) -> list:
+        """批量解析，结果与htmls一一对应；extractor必须是模块级函数（进程池需要pickle）"""
+        if self.workers <= 0 or len(htmls) < self.process_threshold:
+            return [extractor(html, self.backend) for html in htmls]
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        chunks = [htmls[start:start + self.chunk_size] for start in range(0, len(htmls), self.chunk_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _parse_chunk, extractor, chunk, self.backend) for chunk in chunks
+        ))
+        return [item for chunk in results for item in chunk]
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _parse_chunk(extractor: Callable, htmls: List[str], backend: str) -> list:
+    return [extractor(html, backend) for html in htmls]
@@ -0,0 +1,158 @@
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    """
+    流水线的一个阶段
+    handler接收上一阶段的输出，返回交给下一阶段的结果（可以是协程函数）；返回None表示到此为止。
+    queue_size为该阶段输入队列的容量，0表示取workers的两倍
+    """
+    name: str
+    handler: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 0
+
+
+class _StageState:
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0   # 等待下一阶段队列空位的时间，持续增长说明下游是瓶颈
+        self.max_depth = 0
+
+
+class Pipeline:
+    """
+    由有界队列连接的多阶段流水线
+    每个阶段有独立的worker数和输入队列，I/O阶段（抓取、写库）和CPU阶段（解析）可以同时进行；
+    下游处理不过来时队列被填满，上游的put随之等待，背压逐级传到数据源，内存占用有上限。
+    某个元素在某阶段抛出异常时调用on_error(元素, 阶段名, 异常)，不影响其他元素
+
+    用法:
+        pipeline = Pipeline([Stage("fetch", fetch, 8), Stage("parse", parse, 2), Stage("store", store)])
+        await pipeline.run(source)
+    """
+
+    def __init__(self, stages: List[Stage], on_error: Optional[Callable[[Any, str, Exception], Any]] = None,
+                 report_interval: float = 0):
+        self._states = [_StageState(stage) for stage in stages]
+        self.on_error = on_error
+        self.report_interval = report_interval
+        self._started_at: Optional[float] = None
+        self._reporter: Optional[asyncio.Task] = None
+
+    def start(self):
+        """创建队列和worker，需要在事件循环中调用"""
+        if self._started_at is not None:
+            return
+        self._started_at = time.perf_counter()
+        for state in self._states:
+            state.queue = asyncio.Queue(state.stage.queue_size or state.stage.workers * 2)
+        for index, state in enumerate(self._states):
+            state.tasks = [asyncio.ensure_future(self._worker(index)) for _ in range(state.stage.workers)]
+        if self.report_interval > 0:
+            self._reporter = asyncio.ensure_future(self._report())
+
+    async def put(self, item: Any):
+        """放入第一个阶段，队列已满时等待"""
+        await self._put(self._states[0], item)
+
+    async def _put(self, state: _StageState, item: Any):
+        await state.queue.put(item)
+        state.max_depth = max(state.max_depth, state.queue.qsize())
+
+    async def drain(self):
+        """等待已放入的元素全部处理完（期间不应再调用put）"""
+        for state in self._states:
+            await state.queue.join()
+
+    async def close(self):
+        """处理完剩余元素后停止所有worker"""
+        await self.drain()
+        tasks = [task for state in self._states for task in state.tasks]
+        if self._reporter is not None:
+            tasks.append(self._reporter)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, source: AsyncIterable):
+        """从source读取元素送入流水线，source结束且全部处理完后返回"""
+        self.start()
+        try:
+            async for item in source:
+                await self.put(item)
+        finally:
+            await self.close()
+
+    async def _worker(self, index: int):
+        state = self._states[index]
+        next_state = self._states[index + 1] if index + 1 < len(self._states) else None
+        while True:
+            item = await state.queue.get()
+            try:
+                started = time.perf_counter()
+                result = state.stage.handler(item)
+                if inspect.isawaitable(result):
+                    result = await result
+                state.busy_seconds += time.perf_counter() - started
+                state.processed += 1
+                if result is not None and next_state is not None:
+                    waited = time.perf_counter()
+                    await self._put(next_state, result)
+                    state.blocked_seconds += time.perf_counter() - waited
+            except Exception as e:
+                state.errors += 1
+                await self._handle_error(item, state.stage.name, e)
+            finally:
+                state.queue.task_done()
+
+    async def _handle_error(self, item: Any, stage: str, error: Exception):
+        if self.on_error is None:
+            logger.error(f"流水线阶段 {stage} 处理失败: {error}")
+            return
+        try:
+            result = self.on_error(item, stage, error)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error(f"流水线错误处理失败: {e}")
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            summary = ", ".join(
+                f"{name}: {stats['throughput']:.1f}/s 队列{stats['queue_depth']}"
+                for name, stats in self.stats().items()
+            )
+            logger.info(f"流水线状态 - {summary}")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各阶段的处理数、吞吐（个/秒）、worker利用率、当前和最大队列深度"""
+        elapsed = time.perf_counter() - self._started_at if self._started_at is not None else 0.0
+        result = {}
+        for state in self._states:
+            workers = state.stage.workers
+            result[state.stage.name] = {
+                "workers": workers,
+                "processed": state.processed,
+                "errors": state.errors,
+                "throughput": state.processed / elapsed if elapsed else 0.0,
+                "utilization": state.busy_seconds / (elapsed * workers) if elapsed else 0.0,
+                "blocked_seconds": state.blocked_seconds,
+                "queue_depth": state.queue.qsize() if state.queue is not None else 0,
+                "max_queue_depth": state.max_depth,
+            }
+        return result
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# 唯一索引冲突的错误码
+DUPLICATE_KEY = 11000
+
+
+@dataclass
+class WriteFailure:
+    """单本书写入失败的信息"""
+    title: str
+    code: Optional[int]
+    message: str
+
+
+def create_client(mongodb_url: str, max_pool_size: int = 10) -> MongoClient:
+    """整个爬虫进程共用一个带连接池的客户端"""
+    return MongoClient(mongodb_url, maxPoolSize=max_pool_size)
+
+
+class NovelSink:
+    """
+    小说写入缓冲
+    抓取完成的书籍先放入缓冲区，凑满batch_size本后用一次无序bulk_write写入：
+    - 新书：UpdateOne(按user_id+title, $setOnInsert, upsert=True)，并发插入同一本书时只有一个生效
+    - 已有书籍的增量同步：UpdateOne(带$size条件的过滤, 增量更新)，过滤不匹配说明被其他任务抢先同步
+    单条写入失败不影响同批的其他书籍，失败原因按书名记录在failures中。
+    写入时可以附带token，每批写完后以 on_written(成功的token列表, [(失败的token, WriteFailure)]) 回调；
+    带_id的新书另以 on_inserted(插入的_id列表, 未插入的_id列表) 回调，未插入包括写入失败和同名书籍已存在（upsert未生效）。
+    回调在写入线程中执行
+    """
+
+    def __init__(self, collection, batch_size: int = 20,
+                 on_written: Optional[Callable[[List[Any], List[tuple]], None]] = None,
+                 on_inserted: Optional[Callable[[List[Any], List[Any]], None]] = None):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.on_written = on_written
+        self.on_inserted = on_inserted
+        # 缓冲区：(书名, 操作, 是否为新书, token, 新书的_id)
+        self._pending: List[tuple] = []
+        # 在事件循环中首次刷新时创建（Python 3.9的Lock创建时会绑定当前事件循环）
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # 统计信息
+        self.batches = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failures: List[WriteFailure] = []
+
+    def ensure_indexes(self, strict: bool = False):
+        """
+        创建(user_id, title)唯一索引，已存在重复数据时记录日志后继续（strict时抛出异常）；
+        另建crawl.mirrors索引，同步镜像书时按镜像来源查找收录它的书
+        """
+        self.collection.create_index([("crawl.mirrors", ASCENDING)], name="crawl_mirrors")
+        try:
+            self.collection.create_index(
+                [("user_id", ASCENDING), ("title", ASCENDING)], name="user_title_unique", unique=True
+            )
+        except OperationFailure as e:
+            logger.error(f"创建索引 user_title_unique 失败，请先清理重复的小说: {e}")
+            if strict:
+                raise
+
+    async def insert_novel(self, novel: Dict[str, Any], token: Any = None):
+        """缓冲一本新书，已存在同名书籍时不覆盖"""
+        key = {"user_id": novel["user_id"], "title": novel["title"]}
+        operation = UpdateOne(key, {"$setOnInsert": novel}, upsert=True)
+        await self._add(novel["title"], operation, True, token, novel.get("_id"))
+
+    async def update_novel(self, title: str, filter: Dict[str, Any], update: Dict[str, Any], token: Any = None):
+        """缓冲一本已有书籍的增量更新"""
+        await self._add(title, UpdateOne(filter, update), False, token)
+
+    async def acknowledge(self, token: Any):
+        """不需要写入的书籍（如被去重跳过）直接以成功回调，让调用方结束对应的任务"""
+        if self.on_written is not None:
+            await asyncio.to_thread(self.on_written, [token], [])
+
+    async def _add(self, title: str, operation: UpdateOne, is_insert: bool, token: Any, novel_id: Any = None):
+        self._pending.append((title, operation, is_insert, token, novel_id))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """写出缓冲区中的所有书籍"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if batch:
+                # pymongo是同步驱动，放到线程中执行，不阻塞抓取
+                await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch: List[tuple]):
+        failed, upserted = self._bulk_write(batch)
+        if self.on_inserted is not None:
+            inserts = [(index, item[4]) for index, item in enumerate(batch) if item[2] and item[4] is not None]
+            if inserts:
+                self.on_inserted([novel_id for index, novel_id in inserts if index in upserted],
+                                 [novel_id for index, novel_id in inserts if index not in upserted])
+        if self.on_written is not None:
+            self.on_written(
+                [item[3] for index, item in enumerate(batch) if index not in failed],
+                [(batch[index][3], failure) for index, failure in failed.items()],
+            )
+
+    def _bulk_write(self, batch: List[tuple]) -> Tuple[Dict[int, WriteFailure], Set[int]]:
+        """执行一批写入，返回 ({下标: WriteFailure}, 实际插入了新书的下标)"""
+        operations = [item[1] for item in batch]
+        failed: Dict[int, WriteFailure] = {}
+        duplicates = set()
+        try:
+            result = self.collection.bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+            for error in result.get("writeErrors", []):
+                index = error["index"]
+                title, _, is_insert = batch[index][:3]
+                if is_insert and error.get("code") == DUPLICATE_KEY:
+                    # 并发upsert同一本书时后到的会撞上唯一索引，书已存在，视为跳过
+                    duplicates.add(index)
+                    continue
+                failed[index] = WriteFailure(title, error.get("code"), error.get("errmsg", ""))
+                self.failures.append(failed[index])
+                logger.error(f"保存小说失败: {title}, 错误: {error.get('errmsg')}")
+        except Exception as e:
+            # 整批失败（连接断开等），每本书都记为失败
+            for index, item in enumerate(batch):
+                failed[index] = WriteFailure(item[0], None, str(e))
+                self.failures.append(failed[index])
+            logger.error(f"批量保存 {len(batch)} 本小说失败: {e}")
+            return failed, set()
+
+        self.batches += 1
+        written = [index for index in range(len(batch)) if index not in failed and index not in duplicates]
+        inserts = len([index for index in written if batch[index][2]])
+        upserted = result.get("nUpserted", 0)
+        # 新书的upsert要么插入，要么匹配到已存在的书（不修改）；剩余的匹配数属于增量更新
+        update_matched = result.get("nMatched", 0) - (inserts - upserted)
+        skipped = len(written) - upserted - update_matched + len(duplicates)
+        self.inserted += upserted
+        self.updated += update_matched
+        self.skipped += skipped
+        logger.info(f"批量保存 {len(batch)} 本小说：新增 {upserted}，更新 {update_matched}，"
+                    f"跳过 {skipped}，失败 {len(failed)}")
+        return failed, {item["index"] for item in result.get("upserted", [])}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "failed": len(self.failures),
+        }
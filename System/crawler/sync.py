@@ -0,0 +1,140 @@
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# 读取已存储目录时只需要这些字段，不读取章节正文
+STORED_TOC_PROJECTION = {
+    'chapters.chapterId': 1,
+    'chapters.title': 1,
+    'chapters.sourceUrl': 1,
+    'chapters.wordCount': 1,
+    'chapters.simhash': 1,
+    'chapters.duplicateOf': 1,
+    'crawl': 1,
+}
+
+
+@dataclass
+class TocDiff:
+    """远端目录与已存储目录的差异"""
+    new: List[Tuple[str, str]] = field(default_factory=list)            # (url, 标题)，按远端顺序
+    changed: List[Tuple[int, str, str]] = field(default_factory=list)   # (已存储章节下标, url, 新标题)
+    relinked: List[Tuple[int, str]] = field(default_factory=list)       # 旧数据没有sourceUrl，按标题匹配上的 (下标, url)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.new or self.changed or self.relinked)
+
+
+def diff_toc(stored: List[Dict[str, Any]], remote: List[Tuple[str, str]]) -> TocDiff:
+    """
+    对比目录
+    已存储章节优先按sourceUrl匹配，同一URL标题变了视为章节被修改；
+    没有sourceUrl的旧章节按标题匹配，匹配上后补写sourceUrl；其余远端章节为新增。
+    远端删除的章节不处理
+    """
+    by_url = {}
+    by_title = {}
+    for index, chapter in enumerate(stored):
+        url = chapter.get('sourceUrl')
+        if url:
+            by_url[url] = index
+        else:
+            by_title.setdefault(chapter.get('title'), index)
+
+    diff = TocDiff()
+    for url, title in remote:
+        if url in by_url:
+            index = by_url[url]
+            if stored[index].get('title') != title:
+                diff.changed.append((index, url, title))
+        elif title in by_title:
+            diff.relinked.append((by_title.pop(title), url))
+        else:
+            diff.new.append((url, title))
+    return diff
+
+
+def mirror_key(url: str) -> str:
+    """镜像来源在crawl.mirrorSync中的键，URL含有点号不能直接作为字段名"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+def mirror_offset(progress: Optional[Dict[str, Any]], remote: List[Tuple[str, str]]) -> int:
+    """
+    镜像目录中已处理过的章节数
+    记录的最后一章仍在原位置时从它之后开始；没有记录或镜像目录被改动过时从头开始
+    """
+    if not progress or not progress.get('tocSize'):
+        return 0
+    size = progress['tocSize']
+    if size <= len(remote) and remote[size - 1][0] == progress.get('lastChapterUrl'):
+        return size
+    return 0
+
+
+def build_chapter(chapter_id: str, url: str, title: str, content: str) -> Dict[str, Any]:
+    """构建章节子文档"""
+    return {
+        'chapterId': chapter_id,
+        'title': title,
+        'content': content,
+        'sourceUrl': url,
+        'publishTime': datetime.now(),
+        'wordCount': len(content),
+        'comments': []
+    }
+
+
+def next_chapter_ids(stored_count: int, count: int) -> List[str]:
+    """新增章节的ID，接着已有章节编号"""
+    return [f'ch_{index:03d}' for index in range(stored_count + 1, stored_count + count + 1)]
+
+
+def build_sync_update(stored: List[Dict[str, Any]], new_chapters: List[Dict[str, Any]],
+                      changed: List[Tuple[int, str, str, str]], relinked: List[Tuple[int, str]],
+                      source_url: str, metadata: Optional[Dict[str, Any]] = None) -> Tuple[Dict, Dict]:
+    """
+    生成一次同步的原子更新，返回(附加过滤条件, 更新文档)
+    过滤条件要求章节数组长度仍等于读取时的值：并发的同步只有一个能成功，不会重复追加
+    changed中的元素为(下标, url, 新标题, 新正文)
+    """
+    stored_count = len(stored)
+    now = datetime.now()
+    set_fields = {
+        'crawl.sourceUrl': source_url,
+        'crawl.lastSyncTime': now,
+    }
+    word_delta = 0
+
+    for index, url in relinked:
+        set_fields[f'chapters.{index}.sourceUrl'] = url
+
+    for index, url, title, content in changed:
+        set_fields[f'chapters.{index}.title'] = title
+        set_fields[f'chapters.{index}.content'] = content
+        set_fields[f'chapters.{index}.wordCount'] = len(content)
+        word_delta += len(content) - stored[index].get('wordCount', 0)
+
+    update: Dict[str, Any] = {'$set': set_fields}
+    if changed:
+        # 正文被迁移压缩过的章节（见app/migrations）删除旧的压缩正文，读取端以明文content为准
+        update['$unset'] = {f'chapters.{index}.contentZ': '' for index, _, _, _ in changed}
+    if new_chapters:
+        update['$push'] = {'chapters': {'$each': new_chapters}}
+        word_delta += sum(chapter['wordCount'] for chapter in new_chapters)
+        set_fields['crawl.lastChapterUrl'] = new_chapters[-1]['sourceUrl']
+    if new_chapters or changed:
+        set_fields['updateTime'] = now
+        if metadata:
+            set_fields.update(metadata)
+    inc = {}
+    if new_chapters:
+        inc['meta.totalChapters'] = len(new_chapters)
+    if word_delta:
+        inc['meta.totalWords'] = word_delta
+    if inc:
+        update['$inc'] = inc
+
+    return {'chapters': {'$size': stored_count}}, update
@@ -0,0 +1,224 @@
+"""
+把压缩的JSONL/BSON分片文件并行批量载入MongoDB
+
+分片文件来自爬虫的导出模式（novel_crawler.py --export-dir）或合成数据生成器（benchmarks.datagen --output jsonl/bson），
+文件名以集合名开头，如 novels-*.jsonl.gz、users-00001.bson.gz。
+- 多进程并行，每个进程一个客户端，按batch_size条一批无序insert_many
+- 目标集合已分片（或指定--shard-key新建分片）时，先按分片文件中采样的键值预分割chunk并分散到各分片，
+  载入期间不需要等均衡器迁移数据
+- 索引在载入完成后才创建，一次性建索引比逐条维护快得多
+文档的_id在导出时就已确定，中断后重新执行时已载入的文档按重复键跳过；
+novels按(user_id, title)无序upsert（$setOnInsert），与爬虫直接写库时一样，同名的书只保留先写入的一本。
+载入后无法创建唯一索引（已有重复数据）时载入失败
+
+用法:
+    python System/load_shards.py --in-dir data/crawl --mongodb-url mongodb://localhost:4000
+    python System/load_shards.py --in-dir data/synthetic --kinds novels,users,favorites,reading_history --workers 16 --batch-size 2000
+    python System/load_shards.py --in-dir data/crawl --shard-key user_id,title --chunks 64 --drop
+"""
+import argparse
+import glob
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from crawler.export import EXTENSIONS, iter_shard
+from crawler.storage import DUPLICATE_KEY, NovelSink
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def find_shards(in_dir: str, kind: str) -> List[str]:
+    return sorted(path for extension in EXTENSIONS.values()
+                  for path in glob.glob(os.path.join(in_dir, f"{kind}-*.{extension}")))
+
+
+# 按业务键去重的集合：集合名 -> 键字段，载入时按这些字段upsert，与对应的唯一索引一致
+UPSERT_KEYS = {"novels": ("user_id", "title")}
+
+
+def _insert(collection, batch: List[Dict[str, Any]], upsert_key: Optional[Tuple[str, ...]] = None) -> Tuple[int, int, int]:
+    """无序写入一批文档，返回(插入数, 重复数, 失败数)；指定upsert_key时按该键upsert，已存在的文档不覆盖"""
+    try:
+        if upsert_key:
+            operations = [
+                UpdateOne({field: doc.get(field) for field in upsert_key}, {"$setOnInsert": doc}, upsert=True)
+                for doc in batch
+            ]
+            result = collection.bulk_write(operations, ordered=False, bypass_document_validation=True)
+            return result.upserted_count, result.matched_count, 0
+        return len(collection.insert_many(batch, ordered=False, bypass_document_validation=True).inserted_ids), 0, 0
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        # 并发upsert同一个键时_id冲突，也按重复处理
+        duplicates = len([error for error in errors if error.get("code") == DUPLICATE_KEY])
+        for error in errors:
+            if error.get("code") != DUPLICATE_KEY:
+                logging.error(f"插入失败: {error.get('errmsg')}")
+        inserted = e.details.get("nUpserted", 0) if upsert_key else e.details.get("nInserted", 0)
+        return inserted, duplicates + e.details.get("nMatched", 0), len(errors) - duplicates
+
+
+def _load_shard(task) -> Tuple[str, int, int, int]:
+    """子进程入口：载入一个分片文件，返回(文件, 插入数, 重复数, 失败数)"""
+    path, options = task
+    client = MongoClient(options["mongodb_url"])
+    collection = client[options["database"]][options["collection"]]
+    totals = [0, 0, 0]
+    try:
+        documents = iter_shard(path)
+        while True:
+            batch = list(itertools.islice(documents, options["batch_size"]))
+            if not batch:
+                break
+            for index, count in enumerate(_insert(collection, batch, UPSERT_KEYS.get(options["collection"]))):
+                totals[index] += count
+    finally:
+        client.close()
+    return (path, *totals)
+
+
+def sample_keys(paths: List[str], fields: List[str], per_shard: int) -> List[tuple]:
+    """从每个分片文件开头读取per_shard个文档的分片键值"""
+    values = []
+    for path in paths:
+        for doc in itertools.islice(iter_shard(path), per_shard):
+            value = tuple(doc.get(field) for field in fields)
+            if None not in value:
+                values.append(value)
+    return values
+
+
+def presplit(client: MongoClient, database: str, collection: str, paths: List[str],
+             shard_key: Optional[str] = None, chunks: int = 0, sample_per_shard: int = 100) -> int:
+    """
+    按采样的键值预分割chunk，并轮流移动到各个分片，返回分割点数量
+    不是分片集群、集合未分片且没有指定shard_key、或使用哈希分片键时跳过
+    """
+    if client.admin.command("hello").get("msg") != "isdbgrid":
+        logging.info("目标不是分片集群（mongos），跳过预分割")
+        return 0
+    namespace = f"{database}.{collection}"
+    config = client.config.collections.find_one({"_id": namespace, "dropped": {"$ne": True}})
+    if config is None:
+        if not shard_key:
+            logging.info(f"{namespace} 未分片，也没有指定--shard-key，跳过预分割")
+            return 0
+        client.admin.command("enableSharding", database)
+        fields = [field.strip() for field in shard_key.split(",")]
+        client.admin.command("shardCollection", namespace, key={field: 1 for field in fields})
+    else:
+        key = config["key"]
+        if "hashed" in key.values():
+            logging.info(f"{namespace} 的分片键为 {dict(key)}，跳过预分割（哈希分片键在建集合时用numInitialChunks预分割）")
+            return 0
+        fields = list(key)
+
+    shards = [shard["_id"] for shard in client.config.shards.find({}, {"_id": 1})]
+    chunks = chunks or len(shards) * 8
+    values = sorted(set(sample_keys(paths, fields, sample_per_shard)))
+    if chunks < 2 or len(values) < chunks:
+        logging.info(f"采样到 {len(values)} 个不同的键值，不足以分成 {chunks} 个chunk，跳过预分割")
+        return 0
+    points = [values[len(values) * index // chunks] for index in range(1, chunks)]
+    for index, value in enumerate(points):
+        middle = dict(zip(fields, value))
+        try:
+            client.admin.command("split", namespace, middle=middle)
+            # 空chunk的迁移很快，载入前分散好，写入从一开始就落在所有分片上
+            client.admin.command("moveChunk", namespace, find=middle, to=shards[index % len(shards)])
+        except OperationFailure as e:
+            logging.warning(f"预分割 {middle} 失败，跳过: {e}")
+    logging.info(f"{namespace} 按 {','.join(fields)} 预分割为 {len(points) + 1} 个chunk，分布在 {len(shards)} 个分片")
+    return len(points)
+
+
+def build_indexes(db, kind: str):
+    """
+    载入完成后创建索引：novels用爬虫写库时的索引，其他集合用应用启动时声明的INDEXES
+    唯一索引建不起来说明载入了重复数据，抛出OperationFailure使载入失败
+    """
+    if kind == "novels":
+        NovelSink(db[kind]).ensure_indexes(strict=True)
+        return
+    sys.path.insert(0, ROOT_DIR)
+    from app.database.mongodb import INDEXES
+    for keys, options in INDEXES.get(kind, []):
+        try:
+            db[kind].create_index(keys, **options)
+        except OperationFailure as e:
+            logging.error(f"创建索引失败: {kind}.{options['name']}, 错误: {e}")
+            raise
+
+
+def load(in_dir: str, kind: str, mongodb_url: str, database: str, workers: int, batch_size: int,
+         shard_key: Optional[str] = None, chunks: int = 0, drop: bool = False) -> Dict[str, int]:
+    paths = find_shards(in_dir, kind)
+    if not paths:
+        logging.warning(f"{in_dir} 下没有 {kind} 的分片文件")
+        return {"inserted": 0, "duplicates": 0, "failed": 0}
+    client = MongoClient(mongodb_url)
+    db = client[database]
+    try:
+        if drop:
+            db.drop_collection(kind)
+            logging.info(f"已删除集合 {kind}")
+        existing = [name for name in db[kind].index_information() if name != "_id_"]
+        if existing:
+            logging.warning(f"集合 {kind} 已有索引 {existing}，载入时需要逐条维护，会明显变慢")
+        presplit(client, database, kind, paths, shard_key, chunks)
+
+        options = {"mongodb_url": mongodb_url, "database": database, "collection": kind, "batch_size": batch_size}
+        totals = {"inserted": 0, "duplicates": 0, "failed": 0}
+        started = time.perf_counter()
+        with multiprocessing.Pool(workers) as pool:
+            tasks = [(path, options) for path in paths]
+            for done, (path, inserted, duplicates, failed) in enumerate(pool.imap_unordered(_load_shard, tasks), 1):
+                totals["inserted"] += inserted
+                totals["duplicates"] += duplicates
+                totals["failed"] += failed
+                logging.info(f"[{done}/{len(paths)}] {os.path.basename(path)}：插入 {inserted}，重复 {duplicates}，失败 {failed}")
+        elapsed = time.perf_counter() - started
+        logging.info(f"{kind} 载入完成：{totals}，耗时 {elapsed:.1f} 秒，{totals['inserted'] / max(elapsed, 1e-9):.0f} 文档/秒")
+
+        started = time.perf_counter()
+        build_indexes(db, kind)
+        logging.info(f"{kind} 索引创建完成，耗时 {time.perf_counter() - started:.1f} 秒")
+        return totals
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把压缩的JSONL/BSON分片文件并行批量载入MongoDB")
+    parser.add_argument("--in-dir", required=True, help="分片文件目录")
+    parser.add_argument("--kinds", default="novels", help="要载入的集合，逗号分隔，对应文件名前缀")
+    parser.add_argument("--mongodb-url", default=os.getenv("MONGODB_URL", "mongodb://localhost:4000"))
+    parser.add_argument("--database", default=os.getenv("DATABASE_NAME", "zhangzhixing"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行载入的进程数")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批insert_many的文档数")
+    parser.add_argument("--shard-key", default=None,
+                        help="集合未分片时按这些字段（逗号分隔，范围分片）分片并预分割；"
+                             "分片集合上的唯一索引必须以分片键为前缀，novels应使用user_id,title")
+    parser.add_argument("--chunks", type=int, default=0, help="预分割的chunk数，默认每个分片8个")
+    parser.add_argument("--drop", action="store_true", help="载入前删除目标集合")
+    args = parser.parse_args()
+
+    for kind in [kind.strip() for kind in args.kinds.split(",") if kind.strip()]:
+        try:
+            load(args.in_dir, kind, args.mongodb_url, args.database, args.workers, args.batch_size,
+                 args.shard_key, args.chunks, args.drop)
+        except OperationFailure as e:
+            logging.error(f"{kind} 载入失败: {e}")
+            sys.exit(1)
@@ -1,12 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
-from pymongo import MongoClient
-from bson.objectid import ObjectId
+import asyncio
+from dataclasses import dataclass, field
 from datetime import datetime
-import time
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
 import logging
 from urllib.parse import urljoin
 import random
+from bson import ObjectId
+from crawler import CrawlEngine, EngineConfig, Frontier, HttpCache
+from crawler.dedupe import MERGE, POLICIES, SKIP, Deduplicator, simhash, to_signed
+from crawler.export import FORMATS, ShardSink
+from crawler.pipeline import Pipeline, Stage
+from crawler.parsing import ParsePool, available_backends, extract_book_info, extract_book_links, \
+    extract_chapter_content, extract_toc
+from crawler.storage import NovelSink, create_client
+from crawler.sync import STORED_TOC_PROJECTION, diff_toc, build_chapter, next_chapter_ids, build_sync_update, \
+    mirror_key, mirror_offset
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,84 +32,108 @@ NOVEL_TAGS = [
 # 小说状态列表
 NOVEL_STATUS = ["连载中", "已完结"]
 
+BASE_URL = "https://www.cb62.bar"
+MONGODB_URL = "mongodb://localhost:4000"
+DATABASE_NAME = "zhangzhixing"
+HTTP_CACHE_DIR = "data/http_cache"
+
+# 书籍流水线各阶段的默认worker数：下载阶段受引擎的并发和限速约束，解析阶段是CPU密集的
+DEFAULT_STAGE_WORKERS = {
+    'fetch_index': 8,
+    'plan': 4,
+    'fetch_chapters': 16,
+    'parse_chapters': 2,
+    'dedupe': 2,
+    'transform': 1,
+    'store': 1,
+}
+
 class HistoryCategoryCrawler:
-    def __init__(self, base_url="https://www.cb62.bar"):
+    def __init__(self, engine, base_url=BASE_URL, parser=None):
+        self.engine = engine
         self.base_url = base_url
+        self.parser = parser or ParsePool()
         self.category_url = "/lishi/"  # 历史分类路径
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/114.0.0.0',
-            'Accept-Language': 'zh-CN,zh;q=0.9'
-        }
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
-
-    def get_category_page_html(self, page=1):
-        """获取历史分类分页HTML"""
-        url = f"{self.base_url}{self.category_url}{page}.html"
-        for _ in range(3):
-            try:
-                response = self.session.get(url, timeout=15)
-                if response.status_code == 200:
-                    return response.text
-                time.sleep(random.uniform(1, 2))
-            except Exception as e:
-                logging.error(f"请求分类页 {page} 失败: {str(e)}")
-        return None
+
+    def category_page_url(self, page):
+        return f"{self.base_url}{self.category_url}{page}.html"
+
+    async def get_category_page_html(self, page=1):
+        """获取历史分类分页HTML（重试和限速由抓取引擎负责）"""
+        return await self.engine.fetch_text(self.category_page_url(page))
 
     def parse_history_book_urls(self, html):
         """解析历史分类页的书籍URL"""
         if not html:
             return []
-        soup = BeautifulSoup(html, 'html.parser')
-        book_items = soup.select('.hot .item a[href*="/kan/"]')
-        urls = []
-        for a in book_items:
-            if '/kan/' in a['href']:
-                urls.append(urljoin(self.base_url, a['href']))
-        return urls
-
-    def crawl_history_category(self, start_page=1, end_page=3):
-        """批量爬取历史分类页书籍URL"""
+        return [urljoin(self.base_url, href) for href in self.parser.parse(extract_book_links, html)]
+
+    async def crawl_history_category(self, start_page=1, end_page=3):
+        """并发爬取历史分类页书籍URL"""
+        pages = list(range(start_page, end_page + 1))
+        htmls = await asyncio.gather(*(self.get_category_page_html(page) for page in pages))
         all_urls = []
-        for page in range(start_page, end_page + 1):
-            html = self.get_category_page_html(page)
+        for page, html in zip(pages, htmls):
             if not html:
                 continue
             
             urls = self.parse_history_book_urls(html)
             all_urls.extend(urls)
             logging.info(f"历史分类页 {page} 解析到 {len(urls)} 个书籍URL")
-            time.sleep(0.5)  # 页面间延迟
         
-        unique_urls = list(set(all_urls))
+        # 去重并保持页面顺序
+        unique_urls = list(dict.fromkeys(all_urls))
         logging.info(f"历史分类共获取 {len(unique_urls)} 个唯一书籍URL")
         return unique_urls
 
+class CrawlError(Exception):
+    """书籍抓取失败（主页无法获取等），队列中的任务稍后重试"""
+
+
+@dataclass
+class BookJob:
+    """流水线中的一本书，各阶段依次填充字段，用完的页面HTML及时释放"""
+    url: str
+    token: Any = None                       # 原样传给写入缓冲的回调
+    index_html: Optional[str] = None
+    novel: Optional[Dict[str, Any]] = None
+    toc_size: int = 0
+    existing: Optional[Dict[str, Any]] = None
+    new_links: List[Tuple[str, str]] = field(default_factory=list)
+    changed: List[Tuple[int, str, str]] = field(default_factory=list)
+    relinked: List[Tuple[int, str]] = field(default_factory=list)
+    page_htmls: List[Optional[str]] = field(default_factory=list)   # 新章节在前，修改的章节在后
+    contents: List[Optional[str]] = field(default_factory=list)
+    fingerprints: List[Optional[int]] = field(default_factory=list)   # 与contents一一对应
+    book_fingerprint: Optional[Tuple[int, List[int]]] = None          # (简介指纹, 前几章指纹)
+    chapter_duplicates: Dict[int, Any] = field(default_factory=dict)  # 新章节下标 -> 重复的章节
+    duplicate_of: Any = None    # flag/skip策略：重复的书籍ID
+    merge: bool = False         # merge策略：existing是被合并进去的书
+    mirror_offset: int = 0      # 作为镜像合并时，本次从远端目录的第几章开始
+    skip: bool = False          # skip策略：重复的书不保存
+    write: Optional[tuple] = None
+
+
 class NovelCrawler:
-    def __init__(self, novel_url, user_id="system"):
-        self.novel_url = novel_url
-        self.base_url = "https://www.cb62.bar"
-        self.client = MongoClient('mongodb://localhost:4000')
-        self.db = self.client['zhangzhixing']
-        self.novels = self.db['novels']
+    """
+    单本书的抓取分为几个阶段，既可以用crawl()顺序执行，也可以作为流水线的各个阶段并行执行：
+    fetch_index（下载主页）-> plan（解析主页、读取已存储目录、确定要抓的章节）-> fetch_chapters（下载章节页）
+    -> parse_chapters（解析正文）-> dedupe（近似去重）-> transform（生成写入操作）-> store（交给写入缓冲）
+    """
+
+    def __init__(self, engine, sink, user_id="system", base_url=BASE_URL, max_chapters=None, parser=None,
+                 deduplicator=None):
+        self.engine = engine
+        self.deduplicator = deduplicator  # 为None时不去重
+        self.parser = parser or ParsePool()  # 页面解析后端，批量章节可交给进程池
+        self.sink = sink  # 所有书籍共用的写入缓冲，数据库连接也由它共享
+        self.novels = sink.collection  # 导出到分片文件时为None，每本书都按新书处理
+        self.base_url = base_url
+        self.max_chapters = max_chapters  # 每次最多抓取的新章节数，None表示不限制
         self.user_id = user_id
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/114.0.0.0',
-            'Accept-Language': 'zh-CN,zh;q=0.9'
-        })
-
-    def get_page(self, url):
-        for _ in range(3):
-            try:
-                response = self.session.get(url, timeout=15)
-                if response.status_code == 200:
-                    return response.text
-                time.sleep(2)
-            except Exception as e:
-                logging.error(f"获取页面失败: {url}, 错误: {str(e)}")
-                time.sleep(2)
-        return None
+
+    async def get_page(self, url):
+        return await self.engine.fetch_text(url)
 
     def _generate_random_tags(self):
         """生成随机标签"""
@@ -115,13 +148,9 @@ class NovelCrawler:
         return random.choices(NOVEL_STATUS, weights=[0.7, 0.3])[0]
 
     def build_novel_document(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        update_time = self._parse_update_time(soup)
-        title = soup.select_one('h1').text.strip()
-        
-        # 调试输出
-        print(f"\n解析小说: {title}")
-        print("分类信息:", soup.select('.small span'))
+        info = self.parser.parse(extract_book_info, html)
+        title = info['title']
+        logging.debug(f"解析小说: {title}")
         
         # 生成随机标签和出版状态
         tags = self._generate_random_tags()
@@ -131,13 +160,13 @@ class NovelCrawler:
             # 不再设置 _id，让 MongoDB 自动生成 ObjectId
             'user_id': self.user_id,
             'title': title,
-            'author': self._get_field(soup, '.small span:first-child', '：', "佚名"),
+            'author': self._get_field(info['author'], '：', "佚名"),
             'tags': tags,                   # 标签数组字段
             'publication_status': publication_status,  # 出版状态
-            'cover': soup.select_one('.cover img')['src'] if soup.select_one('.cover img') else "",
-            'description': soup.select_one('.intro dd').text.strip() if soup.select_one('.intro dd') else "暂无简介",
+            'cover': info['cover'] or "",
+            'description': info['description'] or "暂无简介",
             'createTime': datetime.now(),
-            'updateTime': update_time,
+            'updateTime': self._parse_update_time(info['updateTime']),
             'chapters': [],
             'meta': {
                 'totalChapters': 0,
@@ -148,121 +177,489 @@ class NovelCrawler:
             }
         }
 
-    def _get_field(self, soup, selector, split_char, default):
-        element = soup.select_one(selector)
-        return element.text.split(split_char)[-1].strip() if element else default
+    def _get_field(self, text, split_char, default):
+        return text.split(split_char)[-1].strip() if text else default
 
-    def _parse_update_time(self, soup):
-        update_time_str = self._get_field(soup, '.small .last', '：', None)
+    def _parse_update_time(self, text):
+        update_time_str = self._get_field(text, '：', None)
         try:
             return datetime.strptime(update_time_str, "%Y-%m-%d %H:%M:%S") if update_time_str else datetime.now()
         except:
             return datetime.now()
 
-    def parse_chapters(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        chapter_links = soup.select('div.listmain dd a:not([href*="javascript"])')
+    def parse_toc(self, html):
+        """解析目录页，返回按顺序排列的 [(章节URL, 章节标题)]"""
+        # 同一章节可能同时出现在"最新章节"和正文目录中，按URL去重
+        toc = {}
+        for href, title in self.parser.parse(extract_toc, html):
+            toc.setdefault(urljoin(self.base_url, href), title)
+        return list(toc.items())
+
+    async def fetch_index(self, job):
+        job.index_html = await self.get_page(job.url)
+        if not job.index_html:
+            raise CrawlError(f"主页爬取失败: {job.url}")
+        return job
+
+    async def plan(self, job):
+        """解析主页，读取已存储的目录，确定需要抓取的新章节和修改过的章节"""
+        job.novel = self.build_novel_document(job.index_html)
+        remote_toc = self.parse_toc(job.index_html)
+        job.index_html = None
+        job.toc_size = len(remote_toc)
+        
+        # pymongo是同步驱动，放到线程中执行，不阻塞其他书籍的抓取
+        if self.novels is not None:
+            job.existing = await asyncio.to_thread(
+                self.novels.find_one,
+                {'user_id': job.novel['user_id'], 'title': job.novel['title']},
+                STORED_TOC_PROJECTION
+            )
+            if job.existing is None:
+                # 之前被合并或跳过的镜像书名不同，按镜像来源找到收录它的书
+                job.existing = await asyncio.to_thread(
+                    self.novels.find_one, {'crawl.mirrors': job.url}, STORED_TOC_PROJECTION
+                )
+                job.merge = job.existing is not None
+        if job.merge:
+            # 镜像的章节URL与已有的书不同，按记录的进度只抓取镜像目录中新增的部分
+            progress = job.existing.get('crawl', {}).get('mirrorSync', {}).get(mirror_key(job.url))
+            if progress and progress.get('skipped') and self.deduplicator is not None \
+                    and self.deduplicator.policy == SKIP:
+                job.skip = True
+                new_links = []
+            else:
+                job.mirror_offset = mirror_offset(progress, remote_toc)
+                new_links = remote_toc[job.mirror_offset:]
+        elif job.existing:
+            diff = diff_toc(job.existing.get('chapters', []), remote_toc)
+            new_links, job.changed, job.relinked = diff.new, diff.changed, diff.relinked
+        else:
+            new_links = remote_toc
+        job.new_links = new_links[:self.max_chapters] if self.max_chapters is not None else new_links
+        return job
+
+    async def fetch_chapters(self, job):
+        """并发获取章节页，限速由抓取引擎负责；获取失败的章节为None"""
+        urls = [url for url, _ in job.new_links] + [url for _, url, _ in job.changed]
+        job.page_htmls = list(await asyncio.gather(*(self.get_page(url) for url in urls)))
+        return job
+
+    async def parse_chapters(self, job):
+        htmls = job.page_htmls
+        contents = iter(await self.parser.parse_many(extract_chapter_content, [html for html in htmls if html]))
+        job.contents = [next(contents) if html else None for html in htmls]
+        job.page_htmls = []
+        return job
+
+    async def dedupe(self, job):
+        """
+        计算新章节和简介的SimHash，按策略处理重复：
+        新书与已有的书重复时跳过(skip)、把新章节合并到已有的书(merge)或标记duplicateOf(flag)；
+        新章节与本书已有章节重复时，skip/merge策略不保存，flag策略标记duplicateOf
+        """
+        dedup = self.deduplicator
+        if dedup is None:
+            return job
+        job.fingerprints = [simhash(content) if content is not None else None for content in job.contents]
+        new_fingerprints = job.fingerprints[:len(job.new_links)]
+        
+        if job.existing is None:
+            head = [fp for fp in new_fingerprints[:dedup.head_size] if fp is not None]
+            job.book_fingerprint = (simhash(job.novel['description']), head)
+            duplicate_of = dedup.find_duplicate_book(*job.book_fingerprint)
+            if duplicate_of is None:
+                # 预先生成ID，写入缓冲确认插入后指纹才加入索引，之后的书才会标记为与它重复
+                job.novel['_id'] = ObjectId()
+                dedup.reserve(job.novel['_id'], *job.book_fingerprint)
+            else:
+                dedup.duplicate_books += 1
+                logging.info(f"小说 {job.novel['title']} 与 {duplicate_of} 重复，处理策略: {dedup.policy}")
+                if dedup.policy == SKIP:
+                    job.skip = True
+                    job.duplicate_of = duplicate_of
+                    return job
+                if dedup.policy == MERGE and self.novels is not None:
+                    job.existing = await asyncio.to_thread(
+                        self.novels.find_one, {'_id': duplicate_of}, STORED_TOC_PROJECTION
+                    )
+                    job.merge = job.existing is not None
+                if not job.merge:
+                    job.duplicate_of = duplicate_of
+        
+        # 章节与已存储的章节、以及本次更早的新章节比较
+        index = dedup.chapter_index(job.existing.get('chapters', []) if job.existing else [])
+        for position, fingerprint in enumerate(new_fingerprints):
+            if fingerprint is None:
+                continue
+            match = index.nearest(fingerprint)
+            if match is None:
+                index.add(('new', position), fingerprint)
+            else:
+                job.chapter_duplicates[position] = match
+                dedup.duplicate_chapters += 1
+        return job
+
+    @staticmethod
+    def _fetched_count(job):
+        """新章节中连续获取成功的章节数"""
+        contents = job.contents[:len(job.new_links)]
+        return contents.index(None) if None in contents else len(contents)
+
+    def _build_new_chapters(self, job, stored_count):
+        """
+        生成新章节子文档
+        新章节遇到获取失败的就截断，保证已存储的章节连续，失败的章节下次同步时重新抓取；
+        重复的章节在skip/merge策略下不保存（下次同步时会再次判定为重复），flag策略下标记duplicateOf
+        """
+        links = job.new_links[:self._fetched_count(job)]
+        contents = job.contents[:len(links)]
+        keep_duplicates = self.deduplicator is None or self.deduplicator.policy not in (SKIP, MERGE)
         chapters = []
-        # 只爬取前5章
-        for idx, a in enumerate(chapter_links[:5], 1):
-            chapter_url = urljoin(self.base_url, a['href'])
-            chapter_title = a.text.strip()
-            chapter_html = self.get_page(chapter_url)
-            content = self._parse_chapter_content(chapter_html)
-            chapters.append({
-                'chapterId': f'ch_{idx:03d}',
-                'title': chapter_title,
-                'content': content,
-                'publishTime': datetime.now(),
-                'wordCount': len(content),
-                'comments': []
-            })
-            time.sleep(0.01)  # 添加延迟避免请求过快
+        assigned = {}  # 新章节下标 -> chapterId
+        for position, ((url, title), content) in enumerate(zip(links, contents)):
+            duplicate = job.chapter_duplicates.get(position)
+            if duplicate is not None and not keep_duplicates:
+                continue
+            chapter_id = next_chapter_ids(stored_count + len(chapters), 1)[0]
+            chapter = build_chapter(chapter_id, url, title, content)
+            fingerprint = job.fingerprints[position] if job.fingerprints else None
+            if fingerprint is not None:
+                chapter['simhash'] = to_signed(fingerprint)
+            if duplicate is not None:
+                chapter['duplicateOf'] = assigned.get(duplicate[1]) if isinstance(duplicate, tuple) else duplicate
+            assigned[position] = chapter_id
+            chapters.append(chapter)
         return chapters
 
-    def _parse_chapter_content(self, html):
-        if not html:
-            return ""
-        soup = BeautifulSoup(html, 'html.parser')
-        content = soup.select_one('#chaptercontent')
-        return content.get_text('\n', strip=True) if content else ""
-
-    def crawl(self):
-        main_html = self.get_page(self.novel_url)
-        if not main_html:
-            logging.error(f"主页爬取失败: {self.novel_url}")
+    def transform(self, job):
+        """生成写入操作：新书整本插入，已有的书只追加新章节、更新修改过的章节"""
+        novel = job.novel
+        if job.skip:
+            if job.duplicate_of is not None and self.novels is not None:
+                # 记录跳过的镜像，之后同步时在plan中直接跳过，不再下载整本书
+                job.write = ('update', novel['title'], {'_id': job.duplicate_of}, {
+                    '$addToSet': {'crawl.mirrors': job.url},
+                    '$set': {f'crawl.mirrorSync.{mirror_key(job.url)}': {'url': job.url, 'skipped': True}},
+                })
+            else:
+                job.write = ('skip',)
+            return job
+        changed_contents = job.contents[len(job.new_links):]
+        stored = job.existing.get('chapters', []) if job.existing else []
+        new_chapters = self._build_new_chapters(job, len(stored))
+        
+        if job.existing is None:
+            novel['chapters'] = new_chapters
+            novel['meta']['totalChapters'] = len(new_chapters)
+            novel['meta']['totalWords'] = sum(chapter['wordCount'] for chapter in new_chapters)
+            novel['crawl'] = {
+                'sourceUrl': job.url,
+                'lastSyncTime': datetime.now(),
+                'lastChapterUrl': new_chapters[-1]['sourceUrl'] if new_chapters else None
+            }
+            if job.book_fingerprint is not None:
+                novel['fingerprint'] = self.deduplicator.fingerprint_doc(*job.book_fingerprint)
+            if job.duplicate_of is not None:
+                novel['duplicateOf'] = job.duplicate_of
+            job.write = ('insert', novel)
+            logging.info(f"小说 {novel['title']} 抓取完成，包含 {len(new_chapters)} 章，等待批量保存")
+            return job
+        
+        changed = [(index, url, title, content)
+                   for (index, url, title), content in zip(job.changed, changed_contents) if content is not None]
+        if job.merge:
+            # 合并到已有的书：保留它自己的来源和简介，只记录镜像来源
+            filter_extra, update = build_sync_update(
+                stored, new_chapters, changed, job.relinked, job.existing.get('crawl', {}).get('sourceUrl', job.url)
+            )
+            update['$addToSet'] = {'crawl.mirrors': job.url}
+            fetched = self._fetched_count(job)
+            if fetched:
+                # 重复而未保存的章节也算已处理，下次同步从这之后开始
+                update['$set'][f'crawl.mirrorSync.{mirror_key(job.url)}'] = {
+                    'url': job.url,
+                    'tocSize': job.mirror_offset + fetched,
+                    'lastChapterUrl': job.new_links[fetched - 1][0],
+                }
+        else:
+            filter_extra, update = build_sync_update(
+                stored, new_chapters, changed, job.relinked, job.url,
+                metadata={'cover': novel['cover'], 'description': novel['description']}
+            )
+        # 过滤条件不匹配（其他任务已先同步）时这次更新不生效，计入写入缓冲的skipped
+        job.write = ('update', novel['title'], {'_id': job.existing['_id'], **filter_extra}, update)
+        logging.info(f"小说 {novel['title']} 同步抓取完成：新增 {len(new_chapters)} 章，更新 {len(changed)} 章，"
+                     f"远端共 {job.toc_size} 章，已存储 {len(stored) + len(new_chapters)} 章")
+        return job
+
+    async def store(self, job):
+        if job.write[0] == 'skip':
+            await self.sink.acknowledge(job.token)
+        elif job.write[0] == 'insert':
+            await self.sink.insert_novel(job.write[1], job.token)
+        else:
+            await self.sink.update_novel(*job.write[1:], job.token)
+        return None
+
+    async def crawl(self, url, token=None):
+        """顺序执行所有阶段，抓取一本书并交给写入缓冲"""
+        job = BookJob(url, token)
+        try:
+            for step in (self.fetch_index, self.plan, self.fetch_chapters, self.parse_chapters, self.dedupe):
+                job = await step(job)
+        except CrawlError as e:
+            logging.error(str(e))
             return False
+        await self.store(self.transform(job))
+        return True
+
+async def batch_crawl_novels(max_novels=100, config=None, base_url=BASE_URL, max_chapters=None,
+                             mongodb_url=MONGODB_URL, database=DATABASE_NAME, batch_size=20, parser=None, cache=None,
+                             tasks=16, start_page=3, end_page=20, reset=False, stage_workers=None, dedupe=None,
+                             export_dir=None, export_format="jsonl", shard_size=1000):
+    """
+    批量爬取小说，所有书籍共用一个抓取引擎和一个数据库客户端
+    待抓取的分类页和书籍保存在crawl_frontier集合中，进程崩溃后重新运行会从中断处继续；
+    多个进程（可以在不同机器上）连接同一个数据库即可共同处理同一个队列。
+    书籍由下载、解析、转换、写入各阶段组成的流水线处理，stage_workers可以覆盖各阶段的worker数；
+    并发度和请求速率由引擎配置控制，抓取完成的书籍按batch_size本一批写入数据库，写入成功后才标记为完成；
+    传入cache时未过期或未变化（304）的页面直接从磁盘缓存读取；
+    传入dedupe（Deduplicator）时按其策略处理近似重复的书籍和章节；
+    传入export_dir时小说写成压缩分片文件而不写库（抓取队列仍在数据库中），之后用load_shards.py批量载入
+    """
+    client = create_client(mongodb_url)
+    frontier = Frontier(client[database]['crawl_frontier'])
+    if export_dir:
+        sink = ShardSink(export_dir, export_format, shard_size=shard_size, batch_size=batch_size)
+    else:
+        sink = NovelSink(client[database]['novels'], batch_size=batch_size)
+        await asyncio.to_thread(sink.ensure_indexes)
+    await asyncio.to_thread(frontier.ensure_indexes)
+    if dedupe is not None and sink.collection is not None:
+        count = await asyncio.to_thread(dedupe.load, sink.collection)
+        logging.info(f"已加载 {count} 本小说的去重指纹")
+    if reset:
+        count = await asyncio.to_thread(frontier.reset)
+        logging.info(f"已重置 {count} 个已完成或失败的任务")
+    parser = parser or ParsePool()
+    try:
+        await _crawl_all(frontier, sink, parser, cache, max_novels, config, base_url, max_chapters,
+                         tasks, start_page, end_page, stage_workers, dedupe)
+    finally:
+        await sink.flush()
+        logging.info(f"保存统计: {sink.stats()}，队列状态: {await asyncio.to_thread(frontier.stats)}")
+        client.close()
+        parser.shutdown()
+    for failure in sink.failures:
+        logging.error(f"未能保存: {failure.title}, 错误码: {failure.code}, 错误: {failure.message}")
+
+def _finish_books(frontier, written, failed):
+    """书籍写入数据库后再更新队列状态，崩溃时缓冲区中尚未写入的书籍会在租约过期后重新抓取"""
+    for url, attempts in written:
+        frontier.complete(url)
+    for (url, attempts), failure in failed:
+        frontier.fail(url, failure.message, attempts)
+
+async def _crawl_all(frontier, sink, parser, cache, max_novels, config, base_url, max_chapters,
+                     tasks, start_page, end_page, stage_workers, dedupe):
+    async with CrawlEngine(config, cache=cache) as engine:
+        history_crawler = HistoryCategoryCrawler(engine, base_url, parser)
+        # 分类页优先处理；已在队列中的URL不会重复加入
+        pages = [history_crawler.category_page_url(page) for page in range(start_page, end_page + 1)]
+        await asyncio.to_thread(frontier.add, pages, 'category', 10)
         
-        novel = self.build_novel_document(main_html)
-        chapters = self.parse_chapters(main_html)
+        async def handle_category(item):
+            html = await engine.fetch_text(item['_id'])
+            if not html:
+                return False
+            book_urls = history_crawler.parse_history_book_urls(html)
+            # 限制队列中的书籍总数
+            remaining = max_novels - await asyncio.to_thread(frontier.count, 'book')
+            added = await asyncio.to_thread(frontier.add, book_urls[:max(remaining, 0)], 'book')
+            logging.info(f"分类页 {item['_id']} 解析到 {len(book_urls)} 个书籍URL，新加入 {added} 个")
+            await asyncio.to_thread(frontier.complete, item['_id'], {'books': len(book_urls)})
+            return True
         
-        novel['chapters'] = chapters
-        novel['meta']['totalChapters'] = len(chapters)
-        novel['meta']['totalWords'] = sum(chapter['wordCount'] for chapter in chapters)
+        handlers = {'category': handle_category}
+        await asyncio.gather(*(_frontier_worker(frontier, handlers, ['category']) for _ in range(tasks)))
         
-        self._save_to_mongodb(novel)
-        logging.info(f"成功保存小说 {novel['title']}，包含 {len(chapters)} 章")
-        return True
+        crawler = NovelCrawler(engine, sink, base_url=base_url, max_chapters=max_chapters, parser=parser,
+                               deduplicator=dedupe)
+        keeper = LeaseKeeper(frontier)
+        
+        def on_written(written, failed):
+            keeper.discard(written, failed)
+            _finish_books(frontier, written, failed)
+        sink.on_written = on_written
+        
+        if dedupe is not None:
+            # 写入回调在写入线程中执行，去重索引只在事件循环线程中修改
+            loop = asyncio.get_running_loop()
+            sink.on_inserted = lambda inserted, dropped: loop.call_soon_threadsafe(dedupe.settle, inserted, dropped)
+        
+        async def on_error(job, stage, error):
+            logging.error(f"小说 {job.url} 在 {stage} 阶段失败: {error}")
+            if dedupe is not None and job.novel is not None and '_id' in job.novel:
+                dedupe.settle([], [job.novel['_id']])
+            keeper.discard([job.token], [])
+            await asyncio.to_thread(frontier.fail, job.url, f"{stage}: {error}", job.token[1])
+        
+        workers = dict(DEFAULT_STAGE_WORKERS, **(stage_workers or {}))
+        pipeline = Pipeline([
+            Stage('fetch_index', crawler.fetch_index, workers['fetch_index']),
+            Stage('plan', crawler.plan, workers['plan']),
+            Stage('fetch_chapters', crawler.fetch_chapters, workers['fetch_chapters']),
+            Stage('parse_chapters', crawler.parse_chapters, workers['parse_chapters']),
+            Stage('dedupe', crawler.dedupe, workers['dedupe']),
+            Stage('transform', crawler.transform, workers['transform']),
+            # 写入缓冲满时store阻塞在bulk_write上，背压经各阶段队列一直传到领取任务
+            Stage('store', crawler.store, workers['store'], queue_size=workers['store']),
+        ], on_error=on_error, report_interval=30)
+        
+        keeper.start()
+        try:
+            await pipeline.run(_lease_books(frontier, pipeline, sink, keeper))
+        finally:
+            keeper.stop()
+        logging.info(f"批量爬取完成，流水线统计: {pipeline.stats()}，抓取统计: {engine.stats()}")
+        if dedupe is not None:
+            logging.info(f"去重统计: {dedupe.stats()}")
 
-    def _save_to_mongodb(self, novel):
+async def _lease_books(frontier, pipeline, sink, keeper, poll_interval=5.0):
+    """从队列领取书籍作为流水线的数据源，流水线已满时不再领取"""
+    while True:
+        item = await asyncio.to_thread(frontier.lease, ['book'])
+        if item is None:
+            # 队列暂时为空：先把流水线和写入缓冲中的书籍写完，否则它们会一直占着租约
+            await pipeline.drain()
+            await sink.flush()
+            await asyncio.to_thread(frontier.reap)
+            if not await asyncio.to_thread(frontier.has_unfinished):
+                return
+            await asyncio.sleep(poll_interval)
+            continue
+        token = (item['_id'], item['attempts'])
+        keeper.add(token)
+        yield BookJob(item['_id'], token)
+
+class LeaseKeeper:
+    """定期为流水线中所有未写入的书籍续租"""
+
+    def __init__(self, frontier):
+        self.frontier = frontier
+        self.tokens = set()
+        self._task = None
+
+    def add(self, token):
+        self.tokens.add(token)
+
+    def discard(self, written, failed):
+        for token in written:
+            self.tokens.discard(token)
+        for token, _ in failed:
+            self.tokens.discard(token)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.frontier.lease_seconds / 3)
+            urls = [url for url, _ in list(self.tokens)]
+            if urls:
+                await asyncio.to_thread(self.frontier.renew_many, urls)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+async def _frontier_worker(frontier, handlers, kinds, poll_interval=5.0):
+    """循环领取并处理任务，队列中没有未完成的任务时退出，返回处理的任务数"""
+    processed = 0
+    while True:
+        item = await asyncio.to_thread(frontier.lease, kinds)
+        if item is None:
+            await asyncio.to_thread(frontier.reap)
+            if not await asyncio.to_thread(frontier.has_unfinished, kinds):
+                return processed
+            # 其他worker正在处理或有任务在退避中，稍后再试
+            await asyncio.sleep(poll_interval)
+            continue
+        
+        url = item['_id']
+        keeper = asyncio.ensure_future(_keep_lease(frontier, url))
         try:
-            # 先尝试查找是否存在
-            existing = self.novels.find_one({
-                'user_id': novel['user_id'],
-                'title': novel['title']
-            })
-            
-            if existing:
-                # 如果存在，更新除 _id 外的所有字段
-                update_doc = {
-                    'user_id': novel['user_id'],
-                    'title': novel['title'],
-                    'author': novel['author'],
-                    'tags': novel['tags'],
-                    'publication_status': novel['publication_status'],
-                    'cover': novel['cover'],
-                    'description': novel['description'],
-                    'createTime': novel['createTime'],
-                    'updateTime': datetime.now(),
-                    'chapters': novel['chapters'],
-                    'meta': novel['meta']
-                }
-                
-                result = self.novels.update_one(
-                    {'_id': existing['_id']},  # 使用已存在的 _id
-                    {'$set': update_doc}
-                )
-                logging.info(f"小说已更新: {novel['title']}")
-                logging.info(f"标签: {novel['tags']}, 出版状态: {novel['publication_status']}")
-            else:
-                # 如果不存在，插入新文档，让MongoDB自动生成ObjectId
-                result = self.novels.insert_one(novel)
-                logging.info(f"新小说已插入: {novel['title']}, ID: {result.inserted_id}")
-                logging.info(f"标签: {novel['tags']}, 出版状态: {novel['publication_status']}")
-                
+            ok = await handlers[item['kind']](item)
+            error = "抓取失败"
         except Exception as e:
-            logging.error(f"保存小说失败: {str(e)}")
-            raise
-
-def batch_crawl_novels(max_novels=100):
-    """批量爬取小说"""
-    # 使用历史分类爬虫获取URL
-    history_crawler = HistoryCategoryCrawler()
-    book_urls = history_crawler.crawl_history_category(start_page=3, end_page=20)
-    
-    # 限制爬取数量
-    book_urls = book_urls[:max_novels]
-    logging.info(f"准备爬取 {len(book_urls)} 本小说")
-    
-    success_count = 0
-    for idx, url in enumerate(book_urls, 1):
-        logging.info(f"开始爬取第 {idx}/{len(book_urls)} 本小说: {url}")
-        crawler = NovelCrawler(url)
-        if crawler.crawl():
-            success_count += 1
-        time.sleep(0.5)  # 在爬取不同小说之间添加延迟
-    
-    logging.info(f"批量爬取完成，成功爬取 {success_count}/{len(book_urls)} 本小说")
+            logging.error(f"处理任务失败: {url}, 错误: {e}")
+            ok, error = False, str(e)
+        finally:
+            keeper.cancel()
+        if not ok:
+            await asyncio.to_thread(frontier.fail, url, error, item['attempts'])
+        processed += 1
+
+async def _keep_lease(frontier, url):
+    """处理期间定期续租，避免耗时较长的书籍被其他worker重复领取"""
+    while True:
+        await asyncio.sleep(frontier.lease_seconds / 3)
+        if not await asyncio.to_thread(frontier.renew, url):
+            logging.warning(f"任务租约已丢失: {url}")
+            return
 
 if __name__ == "__main__":
-    batch_crawl_novels(max_novels=100)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="批量爬取小说")
+    parser.add_argument("--max-novels", type=int, default=100, help="队列中书籍总数的上限")
+    parser.add_argument("--start-page", type=int, default=3, help="历史分类起始页")
+    parser.add_argument("--end-page", type=int, default=20, help="历史分类结束页")
+    parser.add_argument("--tasks", type=int, default=16, help="本进程同时处理的分类页数")
+    parser.add_argument("--stage-workers", default="",
+                        help="书籍流水线各阶段的worker数，如 fetch_chapters=32,parse_chapters=4，"
+                             f"阶段: {','.join(DEFAULT_STAGE_WORKERS)}")
+    parser.add_argument("--reset", action="store_true", help="把已完成和失败的任务放回队列，重新抓取")
+    parser.add_argument("--dedupe", default="flag", choices=["off"] + list(POLICIES),
+                        help="近似重复的书籍和章节的处理策略，off表示不去重")
+    parser.add_argument("--dedupe-distance", type=int, default=3, help="SimHash海明距离不超过该值视为重复")
+    parser.add_argument("--concurrency", type=int, default=32, help="全局并发请求数")
+    parser.add_argument("--per-host-concurrency", type=int, default=4, help="单个站点并发请求数")
+    parser.add_argument("--rate", type=float, default=5.0, help="单个站点每秒请求数")
+    parser.add_argument("--max-chapters", type=int, default=None, help="每本书每次最多抓取的新章节数，默认不限制")
+    parser.add_argument("--mongodb-url", default=MONGODB_URL)
+    parser.add_argument("--database", default=DATABASE_NAME)
+    parser.add_argument("--batch-size", type=int, default=20, help="每次批量写入的书籍数")
+    parser.add_argument("--parser", default="auto", choices=["auto"] + available_backends(), help="HTML解析后端")
+    parser.add_argument("--parse-workers", type=int, default=0, help="解析进程数，0表示在主进程中解析")
+    parser.add_argument("--cache-dir", default=HTTP_CACHE_DIR, help="HTTP响应缓存目录")
+    parser.add_argument("--export-dir", default=None, help="把小说写成压缩分片文件到该目录，而不是写入数据库")
+    parser.add_argument("--export-format", default="jsonl", choices=FORMATS, help="分片文件格式")
+    parser.add_argument("--shard-size", type=int, default=1000, help="每个分片文件包含的小说数")
+    parser.add_argument("--no-cache", action="store_true", help="不使用HTTP响应缓存")
+    args = parser.parse_args()
+    
+    asyncio.run(batch_crawl_novels(
+        max_novels=args.max_novels,
+        config=EngineConfig(
+            max_concurrency=args.concurrency,
+            per_host_concurrency=args.per_host_concurrency,
+            per_host_rate=args.rate,
+        ),
+        max_chapters=args.max_chapters,
+        mongodb_url=args.mongodb_url,
+        database=args.database,
+        batch_size=args.batch_size,
+        parser=ParsePool(args.parser, workers=args.parse_workers),
+        cache=None if args.no_cache else HttpCache(args.cache_dir),
+        tasks=args.tasks,
+        start_page=args.start_page,
+        end_page=args.end_page,
+        reset=args.reset,
+        stage_workers={name: int(count) for name, count in
+                       (pair.split("=") for pair in args.stage_workers.split(",") if pair)},
+        dedupe=None if args.dedupe == "off" else Deduplicator(args.dedupe, args.dedupe_distance),
+        export_dir=args.export_dir,
+        export_format=args.export_format,
+        shard_size=args.shard_size,
+    ))
\ No newline at end of file
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from pymongo import MongoClient
+from benchmarks.local_mongod import LocalMongod
+
+SITE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "site")
+
+
+class FixtureSite(ThreadingHTTPServer):
+    """
+    本地替身站点：提供fixtures/site下的静态页面，另有几个用于测试抓取引擎的特殊路径
+    - /flaky/<n>/...  前n次请求返回503，之后返回200
+    - /slow/<秒数>     等待指定秒数后返回
+    - /busy/...       每个请求停留0.1秒，用于统计同时处理的请求数
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.hits = defaultdict(int)
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(SimpleHTTPRequestHandler):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=SITE_DIR, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_text(self, status, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] += 1
+            hits = server.hits[self.path]
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            parts = self.path.strip("/").split("/")
+            if parts[0] == "flaky":
+                if hits <= int(parts[1]):
+                    self._send_text(503, "busy")
+                else:
+                    self._send_text(200, f"ok after {hits}")
+            elif parts[0] == "slow":
+                time.sleep(float(parts[1]))
+                self._send_text(200, "slow")
+            elif parts[0] == "busy":
+                time.sleep(0.1)
+                self._send_text(200, "busy")
+            else:
+                super().do_GET()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+@pytest.fixture
+def fixture_site():
+    server = FixtureSite()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(scope="session")
+def mongod():
+    """临时启动的本地mongod，本机没有mongod时跳过需要数据库的测试"""
+    if not LocalMongod.available():
+        pytest.skip("找不到mongod，跳过需要数据库的测试")
+    with LocalMongod() as server:
+        yield server
+
+
+@pytest.fixture
+def mongo_db(mongod):
+    client = MongoClient(mongod.url)
+    client.drop_database("crawler_test")
+    try:
+        yield client["crawler_test"]
+    finally:
+        client.close()
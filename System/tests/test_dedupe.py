@@ -0,0 +1,110 @@
+import random
+import pytest
+from crawler import CrawlEngine, EngineConfig, NovelSink
+from crawler.dedupe import FLAG, MERGE, SKIP, Deduplicator, SimHashIndex, hamming, simhash, to_signed, to_unsigned
+from crawler.sync import mirror_key
+from novel_crawler import BookJob, NovelCrawler
+
+
+def random_text(seed, length=3000):
+    rng = random.Random(seed)
+    return "".join(rng.choice("天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏") for _ in range(length))
+
+
+TEXT = random_text(7)
+
+
+def test_simhash_near_duplicates():
+    edited = TEXT[:1000] + "（本章完）" + TEXT[1000:2990]
+    other = random_text(8)
+    assert simhash(TEXT) == simhash(" \n".join([TEXT[:1500], TEXT[1500:]]))  # 忽略空白
+    assert hamming(simhash(TEXT), simhash(edited)) <= 3
+    assert hamming(simhash(TEXT), simhash(other)) > 10
+    fingerprint = simhash(TEXT)
+    assert to_unsigned(to_signed(fingerprint)) == fingerprint and -(1 << 63) <= to_signed(fingerprint) < 1 << 63
+
+
+def test_simhash_index():
+    index = SimHashIndex(max_distance=3)
+    base = random.Random(1).getrandbits(64)
+    index.add("a", base)
+    index.add("b", base ^ 0b101)               # 距离2
+    index.add("c", base ^ (0xF << 40))         # 距离4
+    assert index.query(base) == [("a", 0), ("b", 2)]
+    assert index.nearest(base ^ (1 << 63)) == "a"
+    assert index.nearest(~base & ((1 << 64) - 1)) is None
+
+
+def test_deduplicator_requires_head_overlap():
+    dedup = Deduplicator(SKIP)
+    description = simhash("长安城的晨鼓刚刚敲过")
+    head = [simhash(TEXT[i:i + 500]) for i in range(0, 2500, 500)]
+    dedup.add_book("book-1", description, head)
+    assert dedup.find_duplicate_book(description, head[:3]) == "book-1"
+    # 简介相同但正文不同：不是重复
+    assert dedup.find_duplicate_book(description, [simhash(TEXT[i + 250:i + 750]) for i in range(0, 2500, 500)]) is None
+    with pytest.raises(ValueError):
+        Deduplicator("drop")
+
+
+@pytest.mark.asyncio
+async def test_crawler_flags_mirror_book(fixture_site):
+    dedup = Deduplicator(FLAG)
+    novels = []
+    async with CrawlEngine(EngineConfig(per_host_rate=0)) as engine:
+        crawler = NovelCrawler(engine, NovelSink(None), base_url=fixture_site.base_url, deduplicator=dedup)
+        for _ in range(4):
+            job = await crawler.fetch_index(BookJob(f"{fixture_site.base_url}/kan/1001/"))
+            job.novel = crawler.build_novel_document(job.index_html)
+            job.new_links = crawler.parse_toc(job.index_html)[:3]
+            await crawler.dedupe(await crawler.parse_chapters(await crawler.fetch_chapters(job)))
+            novels.append(crawler.transform(job).write[1])
+            # 第一本没有插入（写入失败或同名书籍已存在），第二本插入成功
+            if len(novels) == 1:
+                dedup.settle([], [novels[0]["_id"]])
+            elif len(novels) == 2:
+                dedup.settle([novels[1]["_id"]])
+    dropped, first, second, third = novels
+    assert "duplicateOf" not in dropped and "duplicateOf" not in first
+    assert second["duplicateOf"] == first["_id"] and third["duplicateOf"] == first["_id"]
+    assert len(first["fingerprint"]["head"]) == 3
+    assert all(isinstance(chapter["simhash"], int) for chapter in first["chapters"])
+    assert dedup.stats()["duplicate_books"] == 2 and dedup.stats()["indexed_books"] == 1
+
+
+class MirrorNovels:
+    """书名查不到，按镜像来源能查到收录它的书"""
+
+    def __init__(self, canonical):
+        self.canonical = canonical
+
+    def find_one(self, query, projection=None):
+        return self.canonical if "crawl.mirrors" in query else None
+
+
+@pytest.mark.asyncio
+async def test_crawler_syncs_mirror_from_recorded_progress(fixture_site):
+    url = f"{fixture_site.base_url}/kan/1001/"
+    canonical = {"_id": "book-1", "chapters": [], "crawl": {"sourceUrl": "/kan/1/", "mirrors": [url], "mirrorSync": {}}}
+    async with CrawlEngine(EngineConfig(per_host_rate=0)) as engine:
+        crawler = NovelCrawler(engine, NovelSink(MirrorNovels(canonical)), base_url=fixture_site.base_url,
+                               deduplicator=Deduplicator(MERGE))
+        job = await crawler.plan(await crawler.fetch_index(BookJob(url)))
+        remote = job.new_links
+        assert job.merge and job.existing is canonical and job.mirror_offset == 0
+
+        # 已处理过前两章：只抓取之后的章节，写入时记录新的进度
+        canonical["crawl"]["mirrorSync"][mirror_key(url)] = {"tocSize": 2, "lastChapterUrl": remote[1][0]}
+        job = await crawler.plan(await crawler.fetch_index(BookJob(url)))
+        assert job.new_links == remote[2:]
+        job = crawler.transform(await crawler.dedupe(await crawler.parse_chapters(await crawler.fetch_chapters(job))))
+        _, _, query, update = job.write
+        assert query["_id"] == "book-1" and update["$addToSet"] == {"crawl.mirrors": url}
+        assert update["$set"][f"crawl.mirrorSync.{mirror_key(url)}"]["tocSize"] == len(remote)
+
+        # skip策略下跳过过的镜像不再抓取章节
+        crawler.deduplicator = Deduplicator(SKIP)
+        canonical["crawl"]["mirrorSync"][mirror_key(url)] = {"url": url, "skipped": True}
+        job = await crawler.plan(await crawler.fetch_index(BookJob(url)))
+        assert job.skip and job.new_links == []
+        assert crawler.transform(job).write == ("skip",)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from crawler import CrawlEngine, EngineConfig, FetchError, HttpCache, NovelSink, TokenBucket
+from novel_crawler import BookJob, HistoryCategoryCrawler, NovelCrawler
+
+
+def fast_config(**overrides):
+    """测试用配置：不限速、退避时间很短"""
+    options = dict(per_host_rate=0, backoff_base=0.01, backoff_max=0.05)
+    options.update(overrides)
+    return EngineConfig(**options)
+
+
+@pytest.mark.asyncio
+async def test_fetch_fixture_page(fixture_site):
+    async with CrawlEngine(fast_config()) as engine:
+        html = await engine.fetch_text(f"{fixture_site.base_url}/kan/1001/")
+    assert "<h1>长安十二时辰</h1>" in html
+
+
+@pytest.mark.asyncio
+async def test_retry_then_succeed(fixture_site):
+    async with CrawlEngine(fast_config(retries=3)) as engine:
+        html = await engine.fetch_text(f"{fixture_site.base_url}/flaky/2/a")
+    assert html == "ok after 3"
+    assert engine.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_retries_exhausted(fixture_site):
+    async with CrawlEngine(fast_config(retries=1)) as engine:
+        with pytest.raises(FetchError) as info:
+            await engine.request(f"{fixture_site.base_url}/flaky/5/b")
+        assert await engine.fetch_text(f"{fixture_site.base_url}/missing.html") is None
+    assert info.value.status == 503
+    assert fixture_site.hits["/flaky/5/b"] == 2
+
+
+@pytest.mark.asyncio
+async def test_read_timeout(fixture_site):
+    config = fast_config(retries=0, read_timeout=0.2)
+    async with CrawlEngine(config) as engine:
+        with pytest.raises(FetchError):
+            await engine.request(f"{fixture_site.base_url}/slow/1")
+
+
+@pytest.mark.asyncio
+async def test_per_host_concurrency(fixture_site):
+    async with CrawlEngine(fast_config(per_host_concurrency=3)) as engine:
+        await asyncio.gather(*(engine.fetch_text(f"{fixture_site.base_url}/busy/{i}") for i in range(12)))
+    assert fixture_site.max_active == 3
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_host_does_not_block_other_hosts():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text="ok"))
+    config = fast_config(max_concurrency=2, per_host_rate=4, per_host_burst=1)
+    async with CrawlEngine(config, transport=transport) as engine:
+        slow = [asyncio.ensure_future(engine.fetch_text(f"http://slow.test/{i}")) for i in range(6)]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        assert await engine.fetch_text("http://fast.test/") == "ok"
+        # 慢站点的请求在令牌桶上等待，不占用全局名额
+        assert time.monotonic() - started < 0.2
+        await asyncio.gather(*slow)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(15):
+        await bucket.acquire()
+    # 前5个令牌立即可用，其余10个按每秒50个补充
+    assert time.monotonic() - started >= 10 / 50 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_crawl_fixture_site(fixture_site):
+    base_url = fixture_site.base_url
+    async with CrawlEngine(fast_config()) as engine:
+        urls = await HistoryCategoryCrawler(engine, base_url).crawl_history_category(3, 3)
+        assert urls == [f"{base_url}/kan/1001/", f"{base_url}/kan/1002/"]
+
+        crawler = NovelCrawler(engine, NovelSink(None), base_url=base_url)
+        job = await crawler.fetch_index(BookJob(urls[0]))
+        toc = crawler.parse_toc(job.index_html)
+        job.novel = crawler.build_novel_document(job.index_html)
+        job.new_links = toc[:5]
+        await crawler.parse_chapters(await crawler.fetch_chapters(job))
+    novel = crawler.transform(job).write[1]
+    chapters = novel["chapters"]
+    assert len(toc) == 6
+    assert novel["title"] == "长安十二时辰" and novel["author"] == "马伯庸"
+    assert [chapter["chapterId"] for chapter in chapters] == ["ch_001", "ch_002", "ch_003", "ch_004", "ch_005"]
+    assert chapters[0]["content"].startswith("长安城的晨鼓刚刚敲过")
+    assert chapters[0]["sourceUrl"] == toc[0][0]
+
+
+@pytest.mark.asyncio
+async def test_http_cache_revalidation(fixture_site, tmp_path):
+    url = f"{fixture_site.base_url}/kan/1001/1.html"
+    # 有效期为0：每次都发送条件请求，本地静态服务器按Last-Modified返回304
+    cache = HttpCache(str(tmp_path), ttl_rules=[], default_ttl=0)
+    async with CrawlEngine(fast_config(), cache=cache) as engine:
+        first = await engine.fetch_text(url)
+        second = await engine.fetch_text(url)
+    assert first == second and "长安城的晨鼓" in first
+    assert fixture_site.hits["/kan/1001/1.html"] == 2
+    assert (cache.misses, cache.revalidated) == (1, 1)
+
+    # 未过期时不发请求
+    cache = HttpCache(str(tmp_path))
+    async with CrawlEngine(fast_config(), cache=cache) as engine:
+        assert await engine.fetch_text(url) == first
+    assert fixture_site.hits["/kan/1001/1.html"] == 2
+    assert cache.hits == 1
+
+
+def test_http_cache_concurrent_store_same_body(tmp_path):
+    # 多个线程同时保存相同的正文（如共用的"章节缺失"页面）写入同一个正文对象
+    cache = HttpCache(str(tmp_path))
+    body = bytes(range(256)) * 8192
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        entries = list(executor.map(
+            lambda i: cache.store(f"http://example.com/kan/1/{i}.html", 200, body, "utf-8", None, None), range(6)
+        ))
+    assert all(cache.load_body(entry) == body for entry in entries)
+    assert not list(tmp_path.rglob("*.tmp"))
@@ -0,0 +1,92 @@
+import os
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from crawler.dedupe import SKIP, Deduplicator
+from crawler.export import ShardSink, iter_shard, novel_object_id
+from load_shards import find_shards, load
+from novel_crawler import BookJob, NovelCrawler
+
+
+def novel(index):
+    return {"user_id": "system", "title": f"小说{index}", "createTime": datetime(2024, 1, 1),
+            "chapters": [{"chapterId": "ch_001", "content": "正文", "simhash": -(1 << 62)}]}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", ["jsonl", "bson"])
+async def test_shard_sink_roundtrip(tmp_path, format):
+    written, inserted = [], []
+    sink = ShardSink(str(tmp_path), format, shard_size=3, batch_size=2,
+                     on_written=lambda tokens, failed: written.append(tokens),
+                     on_inserted=lambda ids, dropped: inserted.extend(ids))
+    for index in range(5):
+        await sink.insert_novel(novel(index), token=index)
+    # 第一个分片写满3本后才回调，剩下的在flush时结束分片
+    assert written == [[0, 1, 2]] and len(inserted) == 3
+    await sink.flush()
+    assert written == [[0, 1, 2], [3, 4]]
+    assert inserted == [novel_object_id("system", f"小说{index}") for index in range(5)]
+
+    paths = find_shards(str(tmp_path), "novels")
+    assert len(paths) == 2 and not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    docs = [doc for path in paths for doc in iter_shard(path)]
+    assert sorted(doc["title"] for doc in docs) == [f"小说{index}" for index in range(5)]
+    assert docs[0]["createTime"].replace(tzinfo=None) == datetime(2024, 1, 1)
+    assert docs[0]["chapters"][0]["simhash"] == -(1 << 62)
+    assert all(doc["_id"] == novel_object_id("system", doc["title"]) for doc in docs)
+    assert sink.stats()["shards"] == 2
+
+
+@pytest.mark.asyncio
+async def test_shard_sink_rejects_updates(tmp_path):
+    sink = ShardSink(str(tmp_path))
+    with pytest.raises(ValueError):
+        await sink.update_novel("小说0", {"_id": ObjectId()}, {"$set": {"crawl.lastSyncTime": datetime.now()}})
+    # 导出模式下跳过的镜像只确认完成，不记录到重复的书上
+    crawler = NovelCrawler(None, sink, deduplicator=Deduplicator(SKIP))
+    job = BookJob("/kan/1/", novel=novel(0), skip=True, duplicate_of=ObjectId())
+    assert crawler.transform(job).write == ("skip",)
+
+
+@pytest.mark.asyncio
+async def test_load_shards_is_idempotent(tmp_path, mongo_db):
+    sink = ShardSink(str(tmp_path), shard_size=10)
+    for index in range(25):
+        await sink.insert_novel(novel(index))
+    await sink.flush()
+
+    url = f"mongodb://{mongo_db.client.address[0]}:{mongo_db.client.address[1]}"
+    assert load(str(tmp_path), "novels", url, mongo_db.name, workers=2, batch_size=4)["inserted"] == 25
+    # 重新载入时全部按重复键跳过
+    assert load(str(tmp_path), "novels", url, mongo_db.name, workers=2, batch_size=4)["duplicates"] == 25
+    assert mongo_db.novels.count_documents({}) == 25
+    assert "user_title_unique" in mongo_db.novels.index_information()
+
+
+@pytest.mark.asyncio
+async def test_load_shards_dedupes_by_user_and_title(tmp_path, mongo_db):
+    # 两个书页URL同名、或--reset后重新导出：_id不同但(user_id, title)相同
+    sink = ShardSink(str(tmp_path), shard_size=10)
+    for index in range(3):
+        await sink.insert_novel(novel(index))
+    await sink.insert_novel(dict(novel(0), _id=ObjectId()))
+    await sink.flush()
+
+    url = f"mongodb://{mongo_db.client.address[0]}:{mongo_db.client.address[1]}"
+    totals = load(str(tmp_path), "novels", url, mongo_db.name, workers=1, batch_size=2)
+    assert (totals["inserted"], totals["duplicates"]) == (3, 1)
+    assert mongo_db.novels.count_documents({"title": "小说0"}) == 1
+
+
+@pytest.mark.asyncio
+async def test_load_shards_fails_without_unique_index(tmp_path, mongo_db):
+    mongo_db.novels.insert_many([novel(0), novel(0)])
+    sink = ShardSink(str(tmp_path))
+    await sink.insert_novel(novel(1))
+    await sink.flush()
+
+    url = f"mongodb://{mongo_db.client.address[0]}:{mongo_db.client.address[1]}"
+    with pytest.raises(OperationFailure):
+        load(str(tmp_path), "novels", url, mongo_db.name, workers=1, batch_size=2)
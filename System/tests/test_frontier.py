@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from crawler.frontier import DONE, FAILED, LEASED, PENDING, Frontier
+
+
+def test_concurrent_leases_are_disjoint(mongo_db):
+    Frontier(mongo_db.frontier).ensure_indexes()
+    urls = [f"https://example.com/kan/{n}/" for n in range(50)]
+    assert Frontier(mongo_db.frontier).add(urls + urls[:10], "book") == 50
+    assert Frontier(mongo_db.frontier).add(urls[:5], "book") == 0
+
+    def drain(worker_id):
+        frontier = Frontier(mongo_db.frontier, worker_id=worker_id)
+        leased = []
+        while True:
+            item = frontier.lease()
+            if item is None:
+                return leased
+            leased.append(item["_id"])
+            assert frontier.complete(item["_id"])
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(drain, ["a", "b", "c", "d"]))
+    leased = [url for result in results for url in result]
+    assert sorted(leased) == sorted(urls)
+    assert Frontier(mongo_db.frontier).stats()[DONE] == 50
+
+
+def test_priority_expired_lease_and_retries(mongo_db):
+    first = Frontier(mongo_db.frontier, worker_id="first", lease_seconds=0.2, max_attempts=2, retry_backoff=0)
+    second = Frontier(mongo_db.frontier, worker_id="second", lease_seconds=60, max_attempts=2, retry_backoff=0)
+    first.add(["book"], "book")
+    first.add(["category"], "category", priority=10)
+
+    assert first.lease()["_id"] == "category"
+    item = first.lease()
+    assert item["_id"] == "book" and item["state"] == LEASED
+
+    # 第一个worker"崩溃"，租约过期后被第二个worker领取，原持有者无法再修改
+    time.sleep(0.3)
+    taken = {second.lease()["_id"], second.lease()["_id"]}
+    assert taken == {"category", "book"}
+    assert not first.complete("book")
+
+    assert second.fail("book", "timeout", 2)
+    assert second.complete("category")
+    doc = mongo_db.frontier.find_one({"_id": "book"})
+    assert doc["state"] == FAILED and doc["lastError"] == "timeout"
+
+    assert second.reset() == 2
+    assert second.stats()[PENDING] == 2
@@ -0,0 +1,21 @@
+import pytest
+from crawler.parsing import ParsePool, available_backends, extract_chapter_content
+from benchmarks.parsers import DEFAULT_PAGES_DIR, load_pages
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backend_matches_bs4(backend):
+    for path, html, extractors in load_pages(DEFAULT_PAGES_DIR):
+        for extractor in extractors:
+            assert extractor(html, backend) == extractor(html, "bs4"), (path, extractor.__name__)
+
+
+@pytest.mark.asyncio
+async def test_parse_pool_keeps_order():
+    htmls = [f'<div id="chaptercontent">第{i}段<br>结束</div>' for i in range(6)]
+    pool = ParsePool("bs4", workers=2, process_threshold=4, chunk_size=2)
+    try:
+        contents = await pool.parse_many(extract_chapter_content, htmls)
+    finally:
+        pool.shutdown()
+    assert contents == [f"第{i}段\n结束" for i in range(6)]
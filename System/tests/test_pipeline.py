@@ -0,0 +1,37 @@
+import asyncio
+import pytest
+from crawler.pipeline import Pipeline, Stage
+
+
+async def numbers(count):
+    for number in range(count):
+        yield number
+
+
+@pytest.mark.asyncio
+async def test_pipeline_backpressure_and_errors():
+    stored = []
+    errors = []
+
+    def parse(number):
+        if number == 3:
+            raise ValueError("bad page")
+        return number * 10
+
+    async def store(value):
+        # 写入比上游慢，队列被填满后上游等待
+        await asyncio.sleep(0.01)
+        stored.append(value)
+
+    pipeline = Pipeline(
+        [Stage("parse", parse, workers=2), Stage("store", store, workers=1, queue_size=2)],
+        on_error=lambda item, stage, error: errors.append((item, stage)),
+    )
+    await pipeline.run(numbers(20))
+
+    assert sorted(stored) == [number * 10 for number in range(20) if number != 3]
+    assert errors == [(3, "parse")]
+    stats = pipeline.stats()
+    assert stats["parse"]["processed"] == 19 and stats["parse"]["errors"] == 1
+    assert stats["store"]["max_queue_depth"] <= 2
+    assert stats["parse"]["blocked_seconds"] > 0
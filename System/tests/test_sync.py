@@ -0,0 +1,58 @@
+from crawler.sync import build_chapter, build_sync_update, diff_toc, mirror_offset, next_chapter_ids
+
+
+def stored_chapter(index, title, url=None, word_count=10):
+    chapter = {'chapterId': f'ch_{index:03d}', 'title': title, 'wordCount': word_count}
+    if url:
+        chapter['sourceUrl'] = url
+    return chapter
+
+
+def test_diff_toc():
+    stored = [
+        stored_chapter(1, '第一章', '/kan/1/1.html'),
+        stored_chapter(2, '第二章', '/kan/1/2.html'),
+        stored_chapter(3, '第三章'),  # 旧数据没有sourceUrl
+    ]
+    remote = [
+        ('/kan/1/1.html', '第一章'),
+        ('/kan/1/2.html', '第二章（修订）'),
+        ('/kan/1/3.html', '第三章'),
+        ('/kan/1/4.html', '第四章'),
+    ]
+    diff = diff_toc(stored, remote)
+    assert diff.changed == [(1, '/kan/1/2.html', '第二章（修订）')]
+    assert diff.relinked == [(2, '/kan/1/3.html')]
+    assert diff.new == [('/kan/1/4.html', '第四章')]
+    assert diff_toc(stored[:2], remote[:1] + [('/kan/1/2.html', '第二章')]).empty
+
+
+def test_build_sync_update():
+    stored = [stored_chapter(1, '第一章', '/kan/1/1.html', 10), stored_chapter(2, '第二章', '/kan/1/2.html', 10)]
+    chapter_ids = next_chapter_ids(len(stored), 2)
+    assert chapter_ids == ['ch_003', 'ch_004']
+    new_chapters = [build_chapter(chapter_id, f'/kan/1/{n}.html', f'第{n}章', 'x' * 5)
+                    for n, chapter_id in zip((3, 4), chapter_ids)]
+
+    filter_extra, update = build_sync_update(
+        stored, new_chapters, [(1, '/kan/1/2.html', '第二章（修订）', 'y' * 4)], [], '/kan/1/')
+    assert filter_extra == {'chapters': {'$size': 2}}
+    assert update['$push'] == {'chapters': {'$each': new_chapters}}
+    assert update['$inc'] == {'meta.totalChapters': 2, 'meta.totalWords': 10 - 6}
+    assert update['$set']['chapters.1.title'] == '第二章（修订）'
+    assert update['$set']['crawl.lastChapterUrl'] == '/kan/1/4.html'
+
+    # 没有变化时只更新同步时间
+    _, update = build_sync_update(stored, [], [], [], '/kan/1/')
+    assert set(update) == {'$set'}
+    assert set(update['$set']) == {'crawl.sourceUrl', 'crawl.lastSyncTime'}
+
+
+def test_mirror_offset():
+    remote = [(f'/m/{index}.html', f'第{index}章') for index in range(1, 6)]
+    assert mirror_offset(None, remote) == 0
+    assert mirror_offset({'tocSize': 3, 'lastChapterUrl': '/m/3.html'}, remote) == 3
+    # 镜像目录被改动过（记录的最后一章不在原位置或目录变短）时从头开始
+    assert mirror_offset({'tocSize': 3, 'lastChapterUrl': '/m/2.html'}, remote) == 0
+    assert mirror_offset({'tocSize': 6, 'lastChapterUrl': '/m/6.html'}, remote) == 0
+    assert mirror_offset({'skipped': True}, remote) == 0
@@ -0,0 +1,68 @@
+from typing import List, Optional
+from bson import ObjectId
+from ..changefeed.derived import (
+    LEADERBOARDS_COLLECTION, NOVEL_INDEX_COLLECTION, POPULAR_LEADERBOARD, SIMILAR_COLLECTION,
+    TAG_CATALOG_COLLECTION, search_index_terms,
+)
+from ..core import invalidation
+from ..core.cache import create_cache, MISSING
+from ..core.config import settings
+from ..core.resilience import max_time_ms
+from ..database.mongodb import mongodb
+
+# 派生集合的读取（DERIVED_DATA_ENABLED时使用），集合由 python -m app.changefeed 维护。
+# 派生数据变化时消费进程会发布失效事件，这里的缓存可以保存较长时间
+derived_cache = create_cache("derived", settings.DERIVED_CACHE_SIZE, settings.DERIVED_CACHE_TTL)
+invalidation.subscribe(invalidation.TAGS, lambda keys: derived_cache.pop("tags"))
+invalidation.subscribe(invalidation.POPULAR, lambda keys: derived_cache.pop("popular"))
+invalidation.subscribe(invalidation.SIMILAR, invalidation.cache_invalidator(derived_cache, lambda key: ("similar", key)))
+
+# 搜索词索引最多返回的候选小说数，超过时说明关键词太常见，直接用正则扫描
+SEARCH_CANDIDATE_LIMIT = 5000
+
+
+async def load_tags() -> Optional[List[str]]:
+    """标签目录，尚未生成时返回None"""
+    tags = derived_cache.get("tags")
+    if tags is MISSING:
+        cursor = mongodb.db[TAG_CATALOG_COLLECTION].find({}, {"_id": 1}, max_time_ms=max_time_ms()).sort("_id", 1)
+        tags = [doc["_id"] async for doc in cursor] or None
+        derived_cache.set("tags", tags)
+    return tags
+
+
+async def load_popular_ids() -> Optional[List[str]]:
+    """热门榜的小说ID（按阅读量降序），尚未生成时返回None"""
+    novel_ids = derived_cache.get("popular")
+    if novel_ids is MISSING:
+        board = await mongodb.db[LEADERBOARDS_COLLECTION].find_one({"_id": POPULAR_LEADERBOARD}, max_time_ms=max_time_ms())
+        novel_ids = [str(entry["novelId"]) for entry in board["entries"]] if board else None
+        derived_cache.set("popular", novel_ids)
+    return novel_ids
+
+
+async def load_similar_ids(novel_id: str) -> Optional[List[str]]:
+    """相似小说ID（按相似度降序），尚未计算时返回None"""
+    novel_ids = derived_cache.get(("similar", novel_id))
+    if novel_ids is MISSING:
+        doc = await mongodb.db[SIMILAR_COLLECTION].find_one({"_id": ObjectId(novel_id)}, max_time_ms=max_time_ms())
+        novel_ids = [str(similar_id) for similar_id in doc["similar"]] if doc else None
+        derived_cache.set(("similar", novel_id), novel_ids)
+    return novel_ids
+
+
+async def search_candidates(search: str) -> Optional[List[ObjectId]]:
+    """
+    用搜索词索引找出可能匹配的小说ID，调用方仍需用正则精确匹配；
+    关键词不能使用索引或候选太多时返回None
+    """
+    terms = search_index_terms(search)
+    if terms is None:
+        return None
+    cursor = mongodb.db[NOVEL_INDEX_COLLECTION].find(
+        {"terms": {"$all": terms}}, {"_id": 1}, max_time_ms=max_time_ms()
+    ).limit(SEARCH_CANDIDATE_LIMIT + 1)
+    candidates = [doc["_id"] async for doc in cursor]
+    if len(candidates) > SEARCH_CANDIDATE_LIMIT:
+        return None
+    return candidates
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from ..core import invalidation
+from ..core.cache import create_cache, MISSING
+from ..core.config import settings
+from ..core.resilience import max_time_ms
+from ..database.mongodb import mongodb
+
+logger = logging.getLogger(__name__)
+
+# 小说摘要（NovelListItem）需要的字段，不读取章节和评论
+NOVEL_SUMMARY_PROJECTION = {
+    "title": 1, "author": 1, "tags": 1, "publication_status": 1,
+    "cover": 1, "description": 1, "updateTime": 1, "meta": 1,
+}
+
+# 列表、热门和推荐中排除被爬虫标记为近似重复的小说（详情页仍可访问）
+CANONICAL_FILTER = {"duplicateOf": {"$exists": False}}
+
+# 进程内各请求共享的小说摘要缓存，不存在的小说也缓存为None，避免反复查询
+novel_summary_cache = create_cache("novel_summary", settings.NOVEL_SUMMARY_CACHE_SIZE, settings.NOVEL_SUMMARY_CACHE_TTL)
+invalidation.subscribe(invalidation.NOVELS, invalidation.cache_invalidator(novel_summary_cache))
+
+# 不存在的小说只缓存几秒，新写入的小说很快就能查到
+MISSING_NOVEL_TTL = 5.0
+
+
+def to_list_item(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """把小说文档转换成列表项，简介只保留前100个字符"""
+    description = doc.get("description", "")
+    return {
+        "_id": str(doc["_id"]),
+        "title": doc["title"],
+        "author": doc["author"],
+        "tags": doc["tags"],
+        "publication_status": doc["publication_status"],
+        "cover": doc["cover"],
+        "description": description[:100] + "..." if len(description) > 100 else description,
+        "updateTime": doc["updateTime"],
+        "meta": doc["meta"],
+    }
+
+
+class NovelLoader:
+    """
+    按请求创建的小说摘要批量加载器
+    同一事件循环轮次内的load调用会被合并成一次$in查询，重复的ID只查一次，结果按调用顺序返回；
+    查询前先查novel_summary_cache，查到的结果写回缓存。
+    返回的摘要与缓存共享同一个字典，调用方不要修改
+    """
+
+    def __init__(self):
+        # 本请求内已加载的结果
+        self._results: Dict[str, Optional[Dict[str, Any]]] = {}
+        # 等待下一次批量查询的ID -> Future
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._dispatch_scheduled = False
+        self.batches = 0
+
+    async def load(self, novel_id: str) -> Optional[Dict[str, Any]]:
+        """加载单个小说摘要，小说不存在或ID无效时返回None"""
+        if novel_id in self._results:
+            return self._results[novel_id]
+        summary = novel_summary_cache.get(novel_id)
+        if summary is not MISSING:
+            self._results[novel_id] = summary
+            return summary
+
+        future = self._pending.get(novel_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[novel_id] = future
+            if not self._dispatch_scheduled:
+                # 等当前轮次内的其他load调用都登记后再统一查询
+                self._dispatch_scheduled = True
+                loop.call_soon(self._dispatch)
+        return await future
+
+    async def load_many(self, novel_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """批量加载，返回与novel_ids一一对应的列表"""
+        return list(await asyncio.gather(*(self.load(novel_id) for novel_id in novel_ids)))
+
+    def _dispatch(self):
+        self._dispatch_scheduled = False
+        batch, self._pending = self._pending, {}
+        if batch:
+            asyncio.ensure_future(self._fetch(batch))
+
+    async def _fetch(self, batch: Dict[str, asyncio.Future]):
+        self.batches += 1
+        object_ids = [ObjectId(novel_id) for novel_id in batch if ObjectId.is_valid(novel_id)]
+        try:
+            found = {}
+            if object_ids:
+                cursor = mongodb.novels.find(
+                    {"_id": {"$in": object_ids}}, NOVEL_SUMMARY_PROJECTION, max_time_ms=max_time_ms()
+                )
+                found = {str(doc["_id"]): to_list_item(doc) async for doc in cursor}
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for novel_id, future in batch.items():
+            summary = found.get(novel_id)
+            self._results[novel_id] = summary
+            novel_summary_cache.set(novel_id, summary, None if summary is not None else MISSING_NOVEL_TTL)
+            if not future.done():
+                future.set_result(summary)
+
+
+def get_novel_loader() -> NovelLoader:
+    """FastAPI依赖：同一请求内的多个依赖共享一个加载器"""
+    return NovelLoader()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Query, Path, Body, Depends
+from fastapi import APIRouter, HTTPException, Query, Path, Body, Depends, Response
 from typing import List, Optional
 from datetime import datetime
 from ..models.novel import (
@@ -9,6 +9,13 @@ from ..models.novel import (
 )
 from ..database.mongodb import mongodb
 from ..core.config import settings
+from ..core.compression import chapter_content
+from ..core import invalidation
+from ..core.resilience import (
+    DatabaseUnavailable, ResponseCache, deadline_scope, guarded, max_time_ms, max_time_option
+)
+from .loaders import CANONICAL_FILTER, NOVEL_SUMMARY_PROJECTION, NovelLoader, get_novel_loader, to_list_item
+from . import derived
 from bson import ObjectId
 import logging
 import random
@@ -16,9 +23,28 @@ import random
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# 可缓存接口的响应缓存：数据库变慢或断路器断开时返回旧响应，路由名对应 ROUTE_DEADLINES_MS 中的查询期限
+novel_list_cache = ResponseCache("novel_list", "novel_list")
+novel_detail_cache = ResponseCache("novel_detail", "novel_detail")
+chapter_cache = ResponseCache("chapter", "chapter")
+tags_cache = ResponseCache("tags", "tags")
+popular_cache = ResponseCache("popular", "popular")
+
+# 变更流发布的失效事件只把响应标记为过期，数据库不可用时仍可返回
+invalidation.subscribe(invalidation.NOVELS, lambda keys: novel_list_cache.expire())
+invalidation.subscribe(invalidation.NOVELS, novel_detail_cache.expire)
+invalidation.subscribe(invalidation.CHAPTERS, novel_detail_cache.expire)
+invalidation.subscribe(
+    invalidation.CHAPTERS,
+    lambda keys: chapter_cache.expire() if keys is None else chapter_cache.expire_where(lambda key: key[0] in set(keys))
+)
+invalidation.subscribe(invalidation.TAGS, lambda keys: tags_cache.expire())
+invalidation.subscribe(invalidation.POPULAR, lambda keys: popular_cache.expire())
+
 
 @router.get("/novels", response_model=NovelListResponse)
 async def get_novels(
+    response: Response,
     page: int = Query(1, ge=1, description="页码"),
     limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE, description="每页数量"),
     tags: Optional[str] = Query(None, description="标签筛选，多个标签用逗号分隔"),
@@ -29,7 +55,7 @@ async def get_novels(
     skip = (page - 1) * limit
     
     # 构建查询条件
-    query = {}
+    query = dict(CANONICAL_FILTER)
     
     # 标签筛选
     if tags:
@@ -47,73 +73,65 @@ async def get_novels(
             {"author": {"$regex": search, "$options": "i"}}
         ]
     
-    # 查询总数
-    total = await mongodb.novels.count_documents(query)
-    
-    # 查询小说列表
-    cursor = mongodb.novels.find(query).skip(skip).limit(limit).sort("updateTime", -1)
-    
-    # 构建响应数据
-    novels = []
-    async for novel in cursor:
-        # 确保 _id 是字符串
-        novel["_id"] = str(novel["_id"])
-        
-        # 构建列表项
-        novel_item = {
-            "_id": novel["_id"],
-            "title": novel["title"],
-            "author": novel["author"],
-            "tags": novel["tags"],
-            "publication_status": novel["publication_status"],
-            "cover": novel["cover"],
-            "description": novel["description"][:100] + "..." if len(novel["description"]) > 100 else novel["description"],
-            "updateTime": novel["updateTime"],
-            "meta": novel["meta"]
+    async def load():
+        # 先用派生的搜索词索引缩小范围，正则只在候选小说上匹配
+        if search and settings.DERIVED_DATA_ENABLED:
+            candidates = await derived.search_candidates(search)
+            if candidates is not None:
+                query["_id"] = {"$in": candidates}
+
+        # 查询总数
+        total = await mongodb.novels.count_documents(query, **max_time_option())
+
+        # 查询小说列表（只取列表项需要的字段，不读取章节内容）
+        cursor = mongodb.novels.find(
+            query, NOVEL_SUMMARY_PROJECTION, max_time_ms=max_time_ms()
+        ).skip(skip).limit(limit).sort("updateTime", -1)
+
+        # 构建响应数据
+        novels = [to_list_item(novel) async for novel in cursor]
+
+        return {
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "novels": novels
         }
-        novels.append(novel_item)
-    
-    return {
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "novels": novels
-    }
+
+    return await novel_list_cache.get((page, limit, tags, publication_status, search), load, response)
 
 
 @router.get("/novels/popular", response_model=RecommendationResponse)
 async def get_popular_novels(
-    limit: int = Query(10, ge=1, le=20, description="返回数量")
+    response: Response,
+    limit: int = Query(10, ge=1, le=20, description="返回数量"),
+    loader: NovelLoader = Depends(get_novel_loader)
 ):
     """获取热门小说"""
-    # 基于阅读量排序
-    cursor = mongodb.novels.find().sort("meta.readCount", -1).limit(limit)
-    
-    # 收集热门小说
-    popular_novels = []
-    async for doc in cursor:
-        # 确保 _id 是字符串
-        doc["_id"] = str(doc["_id"])
-        
-        # 构建热门项
-        novel = {
-            "_id": doc["_id"],
-            "title": doc["title"],
-            "author": doc["author"],
-            "tags": doc["tags"],
-            "publication_status": doc["publication_status"],
-            "cover": doc["cover"],
-            "description": doc["description"][:100] + "..." if len(doc["description"]) > 100 else doc["description"],
-            "updateTime": doc["updateTime"],
-            "meta": doc["meta"]
-        }
-        popular_novels.append(novel)
-    
-    return {"recommendations": popular_novels}
+    async def load():
+        # 优先读取变更流维护的热门榜
+        if settings.DERIVED_DATA_ENABLED:
+            novel_ids = await derived.load_popular_ids()
+            if novel_ids is not None:
+                summaries = await loader.load_many(novel_ids[:limit])
+                return {"recommendations": [summary for summary in summaries if summary is not None]}
+
+        # 基于阅读量排序
+        cursor = mongodb.novels.find(
+            CANONICAL_FILTER, NOVEL_SUMMARY_PROJECTION, max_time_ms=max_time_ms()
+        ).sort("meta.readCount", -1).limit(limit)
+
+        # 收集热门小说
+        popular_novels = [to_list_item(doc) async for doc in cursor]
+
+        return {"recommendations": popular_novels}
+
+    return await popular_cache.get(limit, load, response)
 
 
 @router.get("/novels/{novel_id}", response_model=NovelDetailResponse)
 async def get_novel_detail(
+    response: Response,
     novel_id: str = Path(..., description="小说ID")
 ):
     """获取小说详情"""
@@ -123,43 +141,47 @@ async def get_novel_detail(
     except:
         raise HTTPException(status_code=400, detail="无效的小说ID格式")
     
-    # 查询小说
-    novel = await mongodb.novels.find_one({"_id": object_id})
-    
-    if not novel:
-        raise HTTPException(status_code=404, detail="小说不存在")
-    
-    # 确保 _id 是字符串
-    novel["_id"] = str(novel["_id"])
-    
-    # 只返回章节的ID和标题
-    chapters = []
-    for chapter in novel["chapters"]:
-        chapters.append({
-            "chapterId": chapter["chapterId"],
-            "title": chapter["title"]
-        })
-    
-    # 构建响应数据
-    novel_detail = {
-        "_id": novel["_id"],
-        "title": novel["title"],
-        "author": novel["author"],
-        "tags": novel["tags"],
-        "publication_status": novel["publication_status"],
-        "cover": novel["cover"],
-        "description": novel["description"],
-        "createTime": novel["createTime"],
-        "updateTime": novel["updateTime"],
-        "chapters": chapters,
-        "meta": novel["meta"]
-    }
-    
-    return novel_detail
+    async def load():
+        # 查询小说
+        novel = await mongodb.novels.find_one({"_id": object_id}, max_time_ms=max_time_ms())
+
+        if not novel:
+            raise HTTPException(status_code=404, detail="小说不存在")
+
+        # 确保 _id 是字符串
+        novel["_id"] = str(novel["_id"])
+
+        # 只返回章节的ID和标题
+        chapters = []
+        for chapter in novel["chapters"]:
+            chapters.append({
+                "chapterId": chapter["chapterId"],
+                "title": chapter["title"]
+            })
+
+        # 构建响应数据
+        novel_detail = {
+            "_id": novel["_id"],
+            "title": novel["title"],
+            "author": novel["author"],
+            "tags": novel["tags"],
+            "publication_status": novel["publication_status"],
+            "cover": novel["cover"],
+            "description": novel["description"],
+            "createTime": novel["createTime"],
+            "updateTime": novel["updateTime"],
+            "chapters": chapters,
+            "meta": novel["meta"]
+        }
+
+        return novel_detail
+
+    return await novel_detail_cache.get(novel_id, load, response)
 
 
 @router.get("/novels/{novel_id}/chapters/{chapter_id}", response_model=ChapterDetailResponse)
 async def get_chapter_detail(
+    response: Response,
     novel_id: str = Path(..., description="小说ID"),
     chapter_id: str = Path(..., description="章节ID")
 ):
@@ -170,72 +192,89 @@ async def get_chapter_detail(
     except:
         raise HTTPException(status_code=400, detail="无效的小说ID格式")
     
-    # 查询小说
-    novel = await mongodb.novels.find_one({"_id": object_id})
-    
-    if not novel:
-        raise HTTPException(status_code=404, detail="小说不存在")
-    
-    # 查找章节
-    chapter = None
-    chapter_index = -1
-    
-    for i, ch in enumerate(novel["chapters"]):
-        if ch["chapterId"] == chapter_id:
-            chapter = ch
-            chapter_index = i
-            break
-    
-    if not chapter:
-        raise HTTPException(status_code=404, detail="章节不存在")
-    
-    # 确定前一章和后一章
-    prev_chapter = None
-    next_chapter = None
-    
-    if chapter_index > 0:
-        prev_chapter = novel["chapters"][chapter_index - 1]["chapterId"]
-    
-    if chapter_index < len(novel["chapters"]) - 1:
-        next_chapter = novel["chapters"][chapter_index + 1]["chapterId"]
-    
-    # 构建响应数据
-    chapter_detail = {
-        "chapterId": chapter["chapterId"],
-        "title": chapter["title"],
-        "content": chapter["content"],
-        "publishTime": chapter["publishTime"],
-        "wordCount": chapter["wordCount"],
-        "prevChapter": prev_chapter,
-        "nextChapter": next_chapter
-    }
+    async def load():
+        # 查询小说
+        novel = await mongodb.novels.find_one({"_id": object_id}, max_time_ms=max_time_ms())
+
+        if not novel:
+            raise HTTPException(status_code=404, detail="小说不存在")
+
+        # 查找章节
+        chapter = None
+        chapter_index = -1
+
+        for i, ch in enumerate(novel["chapters"]):
+            if ch["chapterId"] == chapter_id:
+                chapter = ch
+                chapter_index = i
+                break
+
+        if not chapter:
+            raise HTTPException(status_code=404, detail="章节不存在")
+
+        # 确定前一章和后一章
+        prev_chapter = None
+        next_chapter = None
+
+        if chapter_index > 0:
+            prev_chapter = novel["chapters"][chapter_index - 1]["chapterId"]
+
+        if chapter_index < len(novel["chapters"]) - 1:
+            next_chapter = novel["chapters"][chapter_index + 1]["chapterId"]
+
+        # 构建响应数据
+        chapter_detail = {
+            "chapterId": chapter["chapterId"],
+            "title": chapter["title"],
+            "content": chapter_content(chapter),
+            "publishTime": chapter["publishTime"],
+            "wordCount": chapter["wordCount"],
+            "prevChapter": prev_chapter,
+            "nextChapter": next_chapter
+        }
+        return chapter_detail
+
+    chapter_detail = await chapter_cache.get((novel_id, chapter_id), load, response)
     
-    # 更新阅读计数
-    await mongodb.novels.update_one(
-        {"_id": object_id},
-        {"$inc": {"meta.readCount": 1}}
-    )
+    # 更新阅读计数（数据库不可用时不计数，不影响返回章节）
+    try:
+        with deadline_scope("read_count"):
+            await guarded(lambda: mongodb.novels.update_one(
+                {"_id": object_id},
+                {"$inc": {"meta.readCount": 1}}
+            ))
+    except DatabaseUnavailable as e:
+        logger.debug(f"阅读计数未更新: {novel_id}, 错误: {e}")
     
     return chapter_detail
 
 
 @router.get("/tags", response_model=TagsResponse)
-async def get_tags():
+async def get_tags(response: Response):
     """获取所有标签"""
-    # 聚合查询所有标签
-    pipeline = [
-        {"$unwind": "$tags"},
-        {"$group": {"_id": "$tags"}},
-        {"$sort": {"_id": 1}}
-    ]
-    
-    cursor = mongodb.novels.aggregate(pipeline)
-    
-    tags = []
-    async for doc in cursor:
-        tags.append(doc["_id"])
-    
-    return {"tags": tags}
+    async def load():
+        # 优先读取变更流维护的标签目录
+        if settings.DERIVED_DATA_ENABLED:
+            tags = await derived.load_tags()
+            if tags is not None:
+                return {"tags": tags}
+
+        # 聚合查询所有标签
+        pipeline = [
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags"}},
+            {"$sort": {"_id": 1}}
+        ]
+
+        cursor = mongodb.novels.aggregate(pipeline, **max_time_option())
+
+        tags = []
+        async for doc in cursor:
+            tags.append(doc["_id"])
+
+        return {"tags": tags}
+
+    return await tags_cache.get("tags", load, response)
 
 
 @router.post("/novels/{novel_id}/read", response_model=ReadCountResponse)
@@ -250,19 +289,21 @@ async def increment_read_count(
         raise HTTPException(status_code=400, detail="无效的小说ID格式")
     
     # 更新阅读计数
-    result = await mongodb.novels.update_one(
-        {"_id": object_id},
-        {"$inc": {"meta.readCount": 1}}
-    )
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="小说不存在")
-    
-    # 获取更新后的阅读计数
-    novel = await mongodb.novels.find_one(
-        {"_id": object_id},
-        {"meta.readCount": 1}
-    )
+    with deadline_scope("read_count"):
+        result = await guarded(lambda: mongodb.novels.update_one(
+            {"_id": object_id},
+            {"$inc": {"meta.readCount": 1}}
+        ))
+    
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="小说不存在")
+    
+        # 获取更新后的阅读计数
+        novel = await guarded(lambda: mongodb.novels.find_one(
+            {"_id": object_id},
+            {"meta.readCount": 1},
+            max_time_ms=max_time_ms()
+        ))
     
     return {
         "success": True,
@@ -283,19 +324,21 @@ async def like_novel(
         raise HTTPException(status_code=400, detail="无效的小说ID格式")
     
     # 更新点赞计数
-    result = await mongodb.novels.update_one(
-        {"_id": object_id},
-        {"$inc": {"meta.likeCount": 1}}
-    )
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="小说不存在")
-    
-    # 获取更新后的点赞计数
-    novel = await mongodb.novels.find_one(
-        {"_id": object_id},
-        {"meta.likeCount": 1}
-    )
+    with deadline_scope("like"):
+        result = await guarded(lambda: mongodb.novels.update_one(
+            {"_id": object_id},
+            {"$inc": {"meta.likeCount": 1}}
+        ))
+    
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="小说不存在")
+    
+        # 获取更新后的点赞计数
+        novel = await guarded(lambda: mongodb.novels.find_one(
+            {"_id": object_id},
+            {"meta.likeCount": 1},
+            max_time_ms=max_time_ms()
+        ))
     
     return {
         "success": True,
@@ -324,13 +367,14 @@ async def add_comment(
     }
     
     # 更新评论计数并添加评论
-    result = await mongodb.novels.update_one(
-        {"_id": object_id},
-        {
-            "$inc": {"meta.commentCount": 1},
-            "$push": {"comments": new_comment}
-        }
-    )
+    with deadline_scope("add_comment"):
+        result = await guarded(lambda: mongodb.novels.update_one(
+            {"_id": object_id},
+            {
+                "$inc": {"meta.commentCount": 1},
+                "$push": {"comments": new_comment}
+            }
+        ))
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="小说不存在")
@@ -358,10 +402,12 @@ async def get_comments(
         raise HTTPException(status_code=400, detail="无效的小说ID格式")
     
     # 查询小说
-    novel = await mongodb.novels.find_one(
-        {"_id": object_id},
-        {"comments": 1, "meta.commentCount": 1}
-    )
+    with deadline_scope("comments"):
+        novel = await guarded(lambda: mongodb.novels.find_one(
+            {"_id": object_id},
+            {"comments": 1, "meta.commentCount": 1},
+            max_time_ms=max_time_ms()
+        ))
     
     if not novel:
         raise HTTPException(status_code=404, detail="小说不存在")
@@ -386,7 +432,8 @@ async def get_comments(
 @router.get("/novels/{novel_id}/recommendations", response_model=RecommendationResponse)
 async def get_recommendations(
     novel_id: str = Path(..., description="小说ID"),
-    limit: int = Query(5, ge=1, le=10, description="返回数量")
+    limit: int = Query(5, ge=1, le=10, description="返回数量"),
+    loader: NovelLoader = Depends(get_novel_loader)
 ):
     """获取推荐小说"""
     try:
@@ -395,54 +442,57 @@ async def get_recommendations(
     except:
         raise HTTPException(status_code=400, detail="无效的小说ID格式")
     
-    # 查询当前小说的标签
-    novel = await mongodb.novels.find_one(
-        {"_id": object_id},
-        {"tags": 1}
-    )
-    
-    if not novel:
-        raise HTTPException(status_code=404, detail="小说不存在")
-    
-    # 基于标签查询相似小说
-    tags = novel.get("tags", [])
-    
-    if not tags:
-        # 如果没有标签，返回随机小说
-        cursor = mongodb.novels.find(
-            {"_id": {"$ne": object_id}}
-        ).limit(limit * 3)  # 获取更多，然后随机选择
-    else:
-        # 基于标签查询
-        cursor = mongodb.novels.find(
-            {
-                "_id": {"$ne": object_id},
-                "tags": {"$in": tags}
-            }
-        ).limit(limit * 3)  # 获取更多，然后随机选择
-    
-    # 收集推荐小说
-    recommendations = []
-    async for doc in cursor:
-        # 确保 _id 是字符串
-        doc["_id"] = str(doc["_id"])
-        
-        # 构建推荐项
-        recommendation = {
-            "_id": doc["_id"],
-            "title": doc["title"],
-            "author": doc["author"],
-            "tags": doc["tags"],
-            "publication_status": doc["publication_status"],
-            "cover": doc["cover"],
-            "description": doc["description"][:100] + "..." if len(doc["description"]) > 100 else doc["description"],
-            "updateTime": doc["updateTime"],
-            "meta": doc["meta"]
-        }
-        recommendations.append(recommendation)
-    
-    # 随机选择指定数量的推荐
-    if len(recommendations) > limit:
-        recommendations = random.sample(recommendations, limit)
-    
-    return {"recommendations": recommendations} 
\ No newline at end of file
+    async def load():
+        # 优先使用变更流维护的相似小说列表，尚未计算时按标签查询
+        if settings.DERIVED_DATA_ENABLED:
+            similar_ids = await derived.load_similar_ids(novel_id)
+            if similar_ids is not None:
+                summaries = await loader.load_many(similar_ids[:limit * 3])
+                recommendations = [summary for summary in summaries if summary is not None]
+                if len(recommendations) > limit:
+                    recommendations = random.sample(recommendations, limit)
+                return {"recommendations": recommendations}
+
+        # 查询当前小说的标签
+        novel = await mongodb.novels.find_one(
+            {"_id": object_id},
+            {"tags": 1},
+            max_time_ms=max_time_ms()
+        )
+
+        if not novel:
+            raise HTTPException(status_code=404, detail="小说不存在")
+
+        # 基于标签查询相似小说
+        tags = novel.get("tags", [])
+
+        if not tags:
+            # 如果没有标签，返回随机小说
+            cursor = mongodb.novels.find(
+                {"_id": {"$ne": object_id}, **CANONICAL_FILTER},
+                NOVEL_SUMMARY_PROJECTION,
+                max_time_ms=max_time_ms()
+            ).limit(limit * 3)  # 获取更多，然后随机选择
+        else:
+            # 基于标签查询
+            cursor = mongodb.novels.find(
+                {
+                    "_id": {"$ne": object_id},
+                    "tags": {"$in": tags},
+                    **CANONICAL_FILTER
+                },
+                NOVEL_SUMMARY_PROJECTION,
+                max_time_ms=max_time_ms()
+            ).limit(limit * 3)  # 获取更多，然后随机选择
+
+        # 收集推荐小说
+        recommendations = [to_list_item(doc) async for doc in cursor]
+
+        # 随机选择指定数量的推荐
+        if len(recommendations) > limit:
+            recommendations = random.sample(recommendations, limit)
+
+        return {"recommendations": recommendations}
+
+    with deadline_scope("recommendations"):
+        return await guarded(load) 
\ No newline at end of file
@@ -1,41 +1,62 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Body, Path
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Path, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
-from ..models.user import UserCreate, User, Token, UserInDB
-from ..core.auth import get_password_hash, verify_password, create_access_token, get_current_user
+from ..models.user import (
+    UserCreate, User, Token, UserInDB, Principal,
+    ReadingHistoryCreate, ReadingHistoryListResponse, FavoriteListResponse
+)
+from ..core.auth import hash_password, verify_and_update_password, create_access_token, get_current_user, invalidate_principal
 from ..core.config import settings
+from ..core.reading_history import reading_history_buffer
+from .loaders import NovelLoader, get_novel_loader
 from ..database.mongodb import mongodb
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+import asyncio
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# 读取用户资料时排除旧版本遗留在用户文档中的大数组
+PROFILE_PROJECTION = {"favoriteNovels": 0, "readingHistory": 0}
+
+async def count_user_items(user_id: str) -> Dict[str, int]:
+    """统计用户的收藏数和阅读历史数（两个索引查询并发执行）"""
+    favorite_count, history_count = await asyncio.gather(
+        mongodb.get_favorite_collection().count_documents({"userId": user_id}),
+        mongodb.get_reading_history_collection().count_documents({"userId": user_id}),
+    )
+    return {"favoriteCount": favorite_count, "readingHistoryCount": history_count}
+
+async def hydrate_novels(items: List[Dict[str, Any]], loader: NovelLoader) -> List[Dict[str, Any]]:
+    """用最新的小说信息填充记录中的标题、作者和封面，小说已删除时保留原值"""
+    summaries = await loader.load_many([item["novelId"] for item in items])
+    for item, novel in zip(items, summaries):
+        if novel:
+            item["title"] = novel["title"]
+            item["author"] = novel["author"]
+            item["coverImage"] = novel["cover"]
+    return items
+
+def duplicate_user_detail(error: DuplicateKeyError) -> str:
+    """把唯一索引冲突转换成对应的错误提示"""
+    details = error.details or {}
+    fields = details.get("keyPattern") or details.get("keyValue") or {}
+    if "email" in fields or "email_unique" in details.get("errmsg", ""):
+        return "邮箱已被注册"
+    return "用户名已存在"
+
 @router.post("/register", response_model=User, status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate):
     """
     注册新用户
     """
-    # 检查用户名是否已存在
     user_collection = mongodb.get_user_collection()
-    existing_user = await user_collection.find_one({"username": user.username})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="用户名已存在"
-        )
-    
-    # 检查邮箱是否已存在
-    existing_email = await user_collection.find_one({"email": user.email})
-    if existing_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="邮箱已被注册"
-        )
     
     # 创建新用户
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     
     # 使用model_validate创建用户模型
     user_data = user.model_dump()
@@ -44,23 +65,22 @@ async def register_user(user: UserCreate):
     
     user_in_db = UserInDB.model_validate(user_data)
     
-    # 保存到数据库（不包含id字段，让MongoDB自动生成）
-    user_dict = user_in_db.model_dump(exclude={"id"})
-    new_user = await user_collection.insert_one(user_dict)
-    
-    # 获取创建的用户
-    created_user = await user_collection.find_one({"_id": new_user.inserted_id})
-    
-    # 更新user_id字段为MongoDB生成的_id
-    await user_collection.update_one(
-        {"_id": new_user.inserted_id},
-        {"$set": {"user_id": str(new_user.inserted_id)}}
-    )
+    # 预先生成_id，user_id随同一次插入写入；用户名和邮箱的唯一性由唯一索引保证
+    # 收藏和阅读历史存放在独立集合，用户文档中不再保存这两个数组
+    user_dict = user_in_db.model_dump(exclude={"id", "favoriteNovels", "readingHistory"})
+    user_dict["_id"] = ObjectId()
+    user_dict["user_id"] = str(user_dict["_id"])
+    try:
+        await user_collection.insert_one(user_dict)
+    except DuplicateKeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=duplicate_user_detail(e)
+        )
     
     # 返回用户信息（不含密码）
-    created_user["id"] = str(created_user["_id"])
-    created_user["user_id"] = str(created_user["_id"])
-    return User.model_validate(created_user)
+    user_dict["id"] = user_dict["user_id"]
+    return User.model_validate(user_dict)
 
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -69,107 +89,206 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     """
     # 验证用户
     user_collection = mongodb.get_user_collection()
-    user = await user_collection.find_one({"username": form_data.username})
+    user = await user_collection.find_one({"username": form_data.username}, PROFILE_PROJECTION)
     
-    if not user or not verify_password(form_data.password, user["password"]):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update_password(form_data.password, user["password"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 更新最后登录时间
-    await user_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"lastLoginTime": datetime.utcnow()}}
+    # 更新最后登录时间，哈希参数已过时则顺便写回新哈希
+    update = {"lastLoginTime": datetime.utcnow()}
+    if new_hash:
+        update["password"] = new_hash
+    user["id"] = str(user["_id"])
+    _, counts = await asyncio.gather(
+        user_collection.update_one({"_id": user["_id"]}, {"$set": update}),
+        count_user_items(user["id"]),
     )
     
     # 创建访问令牌
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["username"]},
+        data={"sub": user["username"], "ver": user.get("tokenVersion", 0)},
         expires_delta=access_token_expires
     )
     
-    # 添加id字段
-    user["id"] = str(user["_id"])
-    
-    # 确保favoriteNovels字段是字符串列表
-    if "favoriteNovels" in user:
-        if not isinstance(user["favoriteNovels"], list):
-            user["favoriteNovels"] = []
-        else:
-            # 确保所有元素都是字符串
-            user["favoriteNovels"] = [str(item) if item is not None else "" for item in user["favoriteNovels"]]
-    
-    # 返回令牌和用户信息
+    # 返回令牌和精简的用户信息
+    user.setdefault("user_id", user["id"])
+    user.update(counts)
     return Token(
         access_token=access_token,
         token_type="bearer",
         user=User.model_validate(user)
     )
 
+@router.get("/profile", response_model=User)
+async def get_profile(current_user: Principal = Depends(get_current_user)):
+    """
+    获取当前用户资料，收藏和阅读历史只返回数量
+    """
+    user_collection = mongodb.get_user_collection()
+    user, counts = await asyncio.gather(
+        user_collection.find_one({"_id": ObjectId(current_user.id)}, {**PROFILE_PROJECTION, "password": 0}),
+        count_user_items(current_user.id),
+    )
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户不存在")
+    
+    user["id"] = current_user.id
+    user.setdefault("user_id", current_user.id)
+    user.update(counts)
+    return User.model_validate(user)
+
+@router.post("/logout")
+async def logout(current_user: Principal = Depends(get_current_user)):
+    """
+    退出登录：递增令牌版本，使该用户已签发的所有令牌失效
+    """
+    user_collection = mongodb.get_user_collection()
+    await user_collection.update_one(
+        {"_id": ObjectId(current_user.id)},
+        {"$inc": {"tokenVersion": 1}}
+    )
+    await invalidate_principal(current_user.username)
+    return {"success": True}
+
 @router.post("/favorite/{novel_id}")
 async def toggle_favorite_novel(
     novel_id: str = Path(..., description="小说ID"),
-    novel_info: Dict[str, Any] = Body(..., description="小说信息"),
-    current_user: User = Depends(get_current_user)
+    novel_info: Optional[Dict[str, Any]] = Body(None, description="小说信息（兼容旧客户端，已不再使用）"),
+    favorite: Optional[bool] = Query(None, description="指定目标状态；传入时重复请求结果相同，不传则切换"),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     收藏或取消收藏小说
+    收藏关系单独存放在favorites集合，(userId, novelId)唯一索引保证不会重复收藏
     """
-    user_collection = mongodb.get_user_collection()
-    user_id = current_user.id
+    favorite_collection = mongodb.get_favorite_collection()
+    key = {"userId": current_user.id, "novelId": novel_id}
     
-    # 检查小说是否已被收藏
-    user_data = await user_collection.find_one({"_id": ObjectId(user_id)})
-    
-    # 检查favoriteNovels字段是否存在，如果不存在则初始化为空列表
-    favorite_novels = user_data.get("favoriteNovels", [])
+    if favorite is None:
+        # 切换：能删除说明原来已收藏
+        result = await favorite_collection.delete_one(key)
+        if result.deleted_count:
+            return {"isFavorite": False}
+        favorite = True
+    elif not favorite:
+        await favorite_collection.delete_one(key)
+        return {"isFavorite": False}
     
-    # 确保favorite_novels是字符串列表
-    if not isinstance(favorite_novels, list):
-        favorite_novels = []
+    # 添加收藏，并发请求或重试撞上唯一索引时按已收藏处理
+    try:
+        await favorite_collection.insert_one({**key, "createTime": datetime.utcnow()})
+    except DuplicateKeyError:
+        pass
+    return {"isFavorite": True}
+
+@router.get("/favorites", response_model=FavoriteListResponse)
+async def get_favorites(
+    page: int = Query(1, ge=1, description="页码"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE, description="每页数量"),
+    current_user: Principal = Depends(get_current_user),
+    loader: NovelLoader = Depends(get_novel_loader)
+):
+    """
+    分页获取收藏列表，按收藏时间倒序，小说信息通过一次批量查询补全
+    """
+    favorite_collection = mongodb.get_favorite_collection()
+    query = {"userId": current_user.id}
+    total = await favorite_collection.count_documents(query)
+    cursor = favorite_collection.find(query, {"_id": 0, "novelId": 1, "createTime": 1}).sort("createTime", -1).skip((page - 1) * limit).limit(limit)
+    favorites = [{"novelId": doc["novelId"], "favoriteTime": doc["createTime"]} async for doc in cursor]
     
-    # 确保所有元素都是字符串
-    favorite_novels = [str(item) for item in favorite_novels if item is not None]
+    return {
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "favorites": await hydrate_novels(favorites, loader)
+    }
+
+@router.get("/favorite/status")
+async def check_favorite_statuses(
+    novel_ids: str = Query(..., description="小说ID，多个用逗号分隔"),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    批量检查小说是否已被收藏，用于列表页显示收藏状态
+    """
+    ids = list(dict.fromkeys(item.strip() for item in novel_ids.split(",") if item.strip()))
+    if len(ids) > settings.MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一次最多查询{settings.MAX_BATCH_IDS}本小说"
+        )
     
-    is_favorite = novel_id in favorite_novels
+    # 只读索引即可得到结果
+    favorite_collection = mongodb.get_favorite_collection()
+    cursor = favorite_collection.find(
+        {"userId": current_user.id, "novelId": {"$in": ids}},
+        {"_id": 0, "novelId": 1}
+    )
+    favorited = {doc["novelId"] async for doc in cursor}
     
-    if is_favorite:
-        # 如果已收藏，则取消收藏
-        await user_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$pull": {"favoriteNovels": novel_id}}
-        )
-        return {"isFavorite": False}
-    else:
-        # 如果未收藏，则添加收藏
-        # 确保novel_id是字符串
-        await user_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$push": {"favoriteNovels": str(novel_id)}}
-        )
-        return {"isFavorite": True}
+    return {"statuses": {novel_id: novel_id in favorited for novel_id in ids}}
 
 @router.get("/favorite/status/{novel_id}")
 async def check_favorite_status(
     novel_id: str = Path(..., description="小说ID"),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     检查小说是否已被收藏
     """
-    user_collection = mongodb.get_user_collection()
-    user_id = current_user.id
-    
-    # 查询用户数据
-    user_data = await user_collection.find_one({"_id": ObjectId(user_id)})
+    favorite_collection = mongodb.get_favorite_collection()
+    favorite = await favorite_collection.find_one(
+        {"userId": current_user.id, "novelId": novel_id},
+        {"_id": 1}
+    )
     
-    # 检查favoriteNovels字段是否存在，如果不存在则初始化为空列表
-    favorite_novels = user_data.get("favoriteNovels", [])
+    return {"isFavorite": favorite is not None}
+
+@router.post("/reading-history", status_code=status.HTTP_202_ACCEPTED)
+async def save_reading_history(
+    history: ReadingHistoryCreate,
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    保存阅读进度
+    写入先进入缓冲区，同一本小说在一个刷新周期内的多次更新合并为一次写入
+    """
+    entry = history.model_dump()
+    entry["lastReadTime"] = datetime.utcnow()
+    reading_history_buffer.record(current_user.id, history.novelId, entry)
+    return {"success": True}
+
+@router.get("/reading-history", response_model=ReadingHistoryListResponse)
+async def get_reading_history(
+    page: int = Query(1, ge=1, description="页码"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE, description="每页数量"),
+    current_user: Principal = Depends(get_current_user),
+    loader: NovelLoader = Depends(get_novel_loader)
+):
+    """
+    分页获取阅读历史，按最后阅读时间倒序
+    """
+    # 先写出本进程中该用户尚未落库的记录，保证刚读过的小说能立即看到
+    await reading_history_buffer.flush(current_user.id)
     
-    # 检查小说ID是否在收藏列表中
-    is_favorite = novel_id in favorite_novels
+    history_collection = mongodb.get_reading_history_collection()
+    query = {"userId": current_user.id}
+    total = await history_collection.count_documents(query)
+    cursor = history_collection.find(query, {"_id": 0, "userId": 0}).sort("lastReadTime", -1).skip((page - 1) * limit).limit(limit)
+    history = [doc async for doc in cursor]
     
-    return {"isFavorite": is_favorite} 
\ No newline at end of file
+    return {
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "history": await hydrate_novels(history, loader)
+    }
@@ -0,0 +1,17 @@
+"""
+变更流消费：维护派生数据并向API worker发布缓存失效事件
+
+爬虫直接写MongoDB，API进程不知道小说、章节、标签何时变化。本进程消费novels集合的变更流：
+- 增量维护派生集合：novel_index（影子文档和搜索词）、tag_catalog、leaderboards、novel_similar
+- 把变化写入capped集合cache_invalidations，每个API worker跟随读取，使对应的缓存条目失效
+- 恢复令牌保存在changefeed_state集合，重启后继续；令牌失效时全量重建
+整个集群只运行一个消费进程。需要副本集或分片集群（见 System/mongodb_cluster.ps1）
+
+用法:
+    python -m app.changefeed run
+    python -m app.changefeed rebuild --similar
+API读取派生集合需设置 DERIVED_DATA_ENABLED=true（应先运行过一次消费进程或rebuild）
+"""
+from .consumer import ChangeFeedConsumer, classify
+from .derived import DerivedData, search_index_terms, search_terms
+from .publisher import InvalidationPublisher
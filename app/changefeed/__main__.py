@@ -0,0 +1,48 @@
+import argparse
+import json
+import logging
+import signal
+from pymongo import MongoClient
+from ..core.config import settings
+from . import ChangeFeedConsumer, DerivedData, InvalidationPublisher
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m app.changefeed", description="变更流消费与派生数据维护")
+    parser.add_argument("command", choices=["run", "rebuild"])
+    parser.add_argument("--mongodb-url", default=settings.MONGODB_URL)
+    parser.add_argument("--database", default=settings.DATABASE_NAME)
+    parser.add_argument("--batch-size", type=int, default=500, help="每批合并处理的变更事件数")
+    parser.add_argument("--max-wait", type=float, default=0.5, help="凑一批事件最多等待的秒数")
+    parser.add_argument("--similar", action="store_true", help="rebuild时同时重新计算所有相似列表")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    client = MongoClient(args.mongodb_url)
+    db = client[args.database]
+    derived = DerivedData(db, settings.LEADERBOARD_SIZE, settings.SIMILAR_NOVELS_SIZE)
+    publisher = InvalidationPublisher(db, settings.CACHE_INVALIDATIONS_COLLECTION, settings.CACHE_INVALIDATIONS_SIZE_MB)
+    try:
+        if args.command == "rebuild":
+            derived.ensure_indexes()
+            publisher.prepare()
+            publisher.publish(derived.rebuild(similar=args.similar))
+            print(json.dumps({"published": publisher.published}))
+            return
+        consumer = ChangeFeedConsumer(db, derived, publisher, batch_size=args.batch_size, max_wait=args.max_wait)
+        # 收到SIGTERM时处理完当前批次、保存令牌后退出
+        signal.signal(signal.SIGTERM, lambda *_: consumer.stop())
+        try:
+            consumer.run()
+        except KeyboardInterrupt:
+            pass
+        print(json.dumps(consumer.stats()))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
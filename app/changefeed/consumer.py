@@ -0,0 +1,185 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from pymongo.errors import OperationFailure
+from ..api.loaders import NOVEL_SUMMARY_PROJECTION
+from ..core import invalidation
+from .derived import DerivedData
+from .publisher import InvalidationPublisher
+
+logger = logging.getLogger(__name__)
+
+# 服务端已没有恢复点之后的oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+# 这些事件之后变更流失效，需要重建派生数据后重新打开
+INVALIDATING_OPERATIONS = {"invalidate", "drop", "rename", "dropDatabase"}
+
+# 变更的分类
+SUMMARY = "summary"     # 列表项/详情中的字段
+CHAPTERS = "chapters"   # 章节目录或正文
+STATS = "stats"         # 阅读计数
+DELETED = "deleted"
+
+# 列表项和详情显示的顶层字段，以及影响是否显示的重复标记
+SUMMARY_FIELDS = set(NOVEL_SUMMARY_PROJECTION) | {"duplicateOf", "createTime"}
+
+# 只保留分类需要的信息：更新事件的字段名列表代替字段值，不传输章节正文和fullDocument
+WATCH_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete", *sorted(INVALIDATING_OPERATIONS)]}}},
+    {"$addFields": {"changedFields": {"$concatArrays": [
+        {"$map": {"input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}},
+                  "in": "$$this.k"}},
+        {"$ifNull": ["$updateDescription.removedFields", []]},
+        {"$map": {"input": {"$ifNull": ["$updateDescription.truncatedArrays", []]}, "in": "$$this.field"}},
+    ]}}},
+    {"$project": {"updateDescription": 0, "fullDocument": 0}},
+]
+
+
+def classify(event: Dict[str, Any]) -> Set[str]:
+    """
+    按变更的字段分类
+    阅读计数每次读章节都会变，只影响热门榜，不使小说摘要缓存失效（由缓存TTL兜底）；
+    评论和爬虫状态字段不影响任何缓存
+    """
+    operation = event["operationType"]
+    if operation == "delete":
+        return {DELETED}
+    if operation in ("insert", "replace"):
+        return {SUMMARY, CHAPTERS, STATS}
+    kinds = set()
+    for field in event.get("changedFields", []):
+        top = field.split(".", 1)[0]
+        if top == "chapters":
+            kinds.add(CHAPTERS)
+        elif field == "meta.readCount":
+            kinds.add(STATS)
+        elif top == "meta" and field != "meta":
+            # 点赞数、评论数
+            kinds.add(SUMMARY)
+        elif top == "meta":
+            kinds.update((SUMMARY, STATS))
+        elif top in SUMMARY_FIELDS:
+            kinds.add(SUMMARY)
+    return kinds
+
+
+class ChangeFeedConsumer:
+    """
+    消费novels集合的变更流：更新派生数据，并把缓存失效事件发布给所有API worker
+    - 每批事件处理完后把恢复令牌保存在changefeed_state集合，重启后从令牌继续，至少处理一次
+    - 没有令牌（第一次运行）或令牌对应的oplog已被覆盖时，先记下当前操作时间，全量重建派生数据，
+      再从该时间打开变更流，重建期间的变更会被重放，派生数据的更新是幂等的
+    - 集合被删除或改名时变更流失效，同样重建后重新打开
+    需要副本集或分片集群（mongos），单机mongod不支持变更流
+    """
+
+    def __init__(self, db, derived: DerivedData, publisher: InvalidationPublisher, name: str = "novels",
+                 batch_size: int = 500, max_wait: float = 0.5, state_collection: str = "changefeed_state"):
+        self.db = db
+        self.collection = db["novels"]
+        self.derived = derived
+        self.publisher = publisher
+        self.name = name
+        self.batch_size = batch_size
+        # 凑一批事件最多等待的秒数
+        self.max_wait = max_wait
+        self.state = db[state_collection]
+        self.stopped = False
+        # 统计信息
+        self.events = 0
+        self.batches = 0
+        self.rebuilds = 0
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        self.derived.ensure_indexes()
+        self.publisher.prepare()
+        state = self.state.find_one({"_id": self.name}) or {}
+        token = state.get("resumeToken")
+        start_time = None if token else self.rebuild()
+        while not self.stopped:
+            try:
+                token = self._consume(token, start_time)
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAM_HISTORY_LOST:
+                    raise
+                logger.warning(f"恢复令牌之后的变更已不在oplog中，重建派生数据: {e}")
+                token = None
+            if token is None and not self.stopped:
+                start_time = self.rebuild()
+
+    def _consume(self, token: Any, start_time: Any) -> Any:
+        """消费变更流直到停止或变更流失效，返回最后保存的令牌（失效时返回None）"""
+        with self.collection.watch(WATCH_PIPELINE, resume_after=token,
+                                   start_at_operation_time=None if token else start_time,
+                                   batch_size=self.batch_size,
+                                   max_await_time_ms=int(self.max_wait * 1000)) as stream:
+            logger.info(f"变更流已打开: {'从恢复令牌继续' if token else '从重建时间开始'}")
+            while stream.alive and not self.stopped:
+                events = self._read_batch(stream)
+                if any(event["operationType"] in INVALIDATING_OPERATIONS for event in events):
+                    logger.warning("novels集合被删除或改名，变更流已失效")
+                    self.process([event for event in events if event["operationType"] not in INVALIDATING_OPERATIONS])
+                    self.state.delete_one({"_id": self.name})
+                    return None
+                if events:
+                    self.process(events)
+                if stream.resume_token is not None and stream.resume_token != token:
+                    token = stream.resume_token
+                    self._save(token)
+        return token
+
+    def _read_batch(self, stream) -> List[Dict[str, Any]]:
+        events = []
+        deadline = time.monotonic() + self.max_wait
+        while len(events) < self.batch_size and time.monotonic() < deadline:
+            event = stream.try_next()
+            if event is None:
+                break
+            events.append(event)
+        return events
+
+    def process(self, events: List[Dict[str, Any]]):
+        """合并一批事件：每本小说只读取一次当前状态，每个主题只发布一次"""
+        changes: Dict[Any, Set[str]] = defaultdict(set)
+        for event in events:
+            changes[event["documentKey"]["_id"]].update(classify(event))
+        topics: Dict[str, Optional[Set[str]]] = defaultdict(set)
+        for novel_id, kinds in changes.items():
+            if kinds & {SUMMARY, DELETED}:
+                topics[invalidation.NOVELS].add(str(novel_id))
+            if kinds & {CHAPTERS, DELETED}:
+                topics[invalidation.CHAPTERS].add(str(novel_id))
+        derived_topics = self.derived.apply(
+            novel_id for novel_id, kinds in changes.items() if kinds & {SUMMARY, STATS, DELETED}
+        )
+        for topic, keys in derived_topics.items():
+            existing = topics.get(topic, set())
+            topics[topic] = None if keys is None or existing is None else existing | keys
+        self.publisher.publish(topics)
+        self.events += len(events)
+        self.batches += 1
+
+    def rebuild(self) -> Any:
+        """全量重建派生数据，返回重建前的操作时间，变更流从该时间打开"""
+        operation_time = self.db.command("ping").get("operationTime")
+        if operation_time is None:
+            raise RuntimeError("无法获取操作时间，变更流需要副本集或分片集群")
+        self.publisher.publish(self.derived.rebuild())
+        self.rebuilds += 1
+        return operation_time
+
+    def _save(self, token: Any):
+        self.state.update_one(
+            {"_id": self.name},
+            {"$set": {"resumeToken": token, "updateTime": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {"events": self.events, "batches": self.batches, "rebuilds": self.rebuilds}
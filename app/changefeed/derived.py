@@ -0,0 +1,259 @@
+import logging
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, DeleteOne, ReplaceOne, UpdateOne
+from ..core import invalidation
+
+logger = logging.getLogger(__name__)
+
+# 派生集合，由变更流消费进程维护，API在 DERIVED_DATA_ENABLED 时读取
+NOVEL_INDEX_COLLECTION = "novel_index"        # 小说的影子文档：摘要字段、阅读量、搜索词
+TAG_CATALOG_COLLECTION = "tag_catalog"        # 标签 -> 小说数
+LEADERBOARDS_COLLECTION = "leaderboards"      # 榜单，_id为榜单名
+SIMILAR_COLLECTION = "novel_similar"          # 小说ID -> 相似小说ID列表
+POPULAR_LEADERBOARD = "popular"
+
+# 影子文档需要从novels读取的字段
+SOURCE_PROJECTION = {"title": 1, "author": 1, "tags": 1, "meta.readCount": 1, "duplicateOf": 1}
+
+# 正则元字符，包含这些字符的搜索词不能用搜索词索引缩小范围
+_REGEX_SPECIAL = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+def search_terms(text: str) -> List[str]:
+    """
+    文本的小写二元组（相邻两个字符），单个字符的文本返回它本身
+    子串匹配的必要条件是子串的所有二元组都出现在原文中，因此可以用 terms $all 缩小正则搜索的范围
+    """
+    text = text.lower()
+    if len(text) < 2:
+        return [text] if text.strip() else []
+    return sorted({text[i:i + 2] for i in range(len(text) - 1) if text[i:i + 2].strip()})
+
+
+def search_index_terms(search: str) -> Optional[List[str]]:
+    """搜索关键词对应的索引词，关键词太短或包含正则语法时返回None（只能全表正则匹配）"""
+    if len(search) < 2 or _REGEX_SPECIAL.search(search):
+        return None
+    return search_terms(search) or None
+
+
+def build_index_entry(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """由小说文档生成影子文档"""
+    title = doc.get("title", "")
+    author = doc.get("author", "")
+    return {
+        "_id": doc["_id"],
+        "title": title,
+        "author": author,
+        "tags": list(doc.get("tags", [])),
+        "readCount": doc.get("meta", {}).get("readCount", 0),
+        "duplicate": "duplicateOf" in doc,
+        "terms": sorted(set(search_terms(title)) | set(search_terms(author))),
+    }
+
+
+def jaccard(a: Iterable[str], b: Iterable[str]) -> float:
+    a, b = set(a), set(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class DerivedData:
+    """
+    增量维护由novels派生的数据：
+    - novel_index：每本小说一个影子文档（标题、作者、标签、阅读量、是否重复、搜索词），
+      保存上次处理时的状态，新旧影子文档的差异决定其他派生数据怎样更新
+    - tag_catalog：标签的小说数，按标签增减$inc，数量为0的标签删除
+    - leaderboards.popular：按阅读量排序的前leaderboard_size本小说（不含重复小说）
+    - novel_similar：按标签Jaccard相似度排序的前similar_size本小说
+    apply只读取变化的小说的当前状态，重复处理同一事件（消费进程重启后重放）得到相同结果。
+    返回值是需要发布的失效主题：{主题: 变化的键集合，None表示全部}
+    """
+
+    def __init__(self, db, leaderboard_size: int = 100, similar_size: int = 30,
+                 similar_candidates: int = 500, max_similar_refresh: int = 200):
+        self.novels = db["novels"]
+        self.index = db[NOVEL_INDEX_COLLECTION]
+        self.tag_catalog = db[TAG_CATALOG_COLLECTION]
+        self.leaderboards = db[LEADERBOARDS_COLLECTION]
+        self.similar = db[SIMILAR_COLLECTION]
+        self.leaderboard_size = leaderboard_size
+        self.similar_size = similar_size
+        # 计算相似列表时按阅读量取的候选小说数
+        self.similar_candidates = similar_candidates
+        # 每批最多重新计算的受影响的相似列表数，超出的删除，由API回退到按标签查询
+        self.max_similar_refresh = max_similar_refresh
+
+    def ensure_indexes(self):
+        self.index.create_index([("terms", ASCENDING)], name="terms")
+        self.index.create_index([("duplicate", ASCENDING), ("readCount", DESCENDING)], name="duplicate_read_count")
+        self.index.create_index([("tags", ASCENDING), ("readCount", DESCENDING)], name="tags_read_count")
+        self.similar.create_index([("similar", ASCENDING)], name="similar")
+
+    def apply(self, novel_ids: Iterable[ObjectId]) -> Dict[str, Optional[Set[str]]]:
+        """按小说当前状态更新派生数据，novels中已不存在的小说按删除处理"""
+        novel_ids = list(novel_ids)
+        if not novel_ids:
+            return {}
+        current = {
+            doc["_id"]: build_index_entry(doc)
+            for doc in self.novels.find({"_id": {"$in": novel_ids}}, SOURCE_PROJECTION)
+        }
+        previous = {doc["_id"]: doc for doc in self.index.find({"_id": {"$in": novel_ids}})}
+
+        operations = []
+        tag_delta: Counter = Counter()
+        tags_changed: List[ObjectId] = []
+        removed: List[ObjectId] = []
+        for novel_id in novel_ids:
+            old, new = previous.get(novel_id), current.get(novel_id)
+            if old is not None:
+                tag_delta.subtract(old["tags"])
+            if new is not None:
+                tag_delta.update(new["tags"])
+                new["updateTime"] = datetime.utcnow()
+                operations.append(ReplaceOne({"_id": novel_id}, new, upsert=True))
+            elif old is not None:
+                operations.append(DeleteOne({"_id": novel_id}))
+            if new is None or new["duplicate"]:
+                removed.append(novel_id)
+            elif old is None or old["tags"] != new["tags"] or old["duplicate"]:
+                tags_changed.append(novel_id)
+        if operations:
+            self.index.bulk_write(operations, ordered=False)
+
+        topics: Dict[str, Optional[Set[str]]] = {}
+        if self._apply_tag_delta(tag_delta):
+            topics[invalidation.TAGS] = None
+        if self._update_leaderboard(novel_ids, current):
+            topics[invalidation.POPULAR] = None
+        similar_keys = self._update_similar(tags_changed, removed)
+        if similar_keys:
+            topics[invalidation.SIMILAR] = similar_keys
+        return topics
+
+    def _apply_tag_delta(self, delta: Counter) -> bool:
+        """更新标签计数，返回标签集合是否变化（新增或删除了标签）"""
+        delta = {tag: count for tag, count in delta.items() if count}
+        if not delta:
+            return False
+        result = self.tag_catalog.bulk_write(
+            [UpdateOne({"_id": tag}, {"$inc": {"count": count}}, upsert=True) for tag, count in delta.items()],
+            ordered=False,
+        )
+        deleted = self.tag_catalog.delete_many({"_id": {"$in": list(delta)}, "count": {"$lte": 0}}).deleted_count
+        return bool(result.upserted_count or deleted)
+
+    def _update_leaderboard(self, novel_ids: List[ObjectId], current: Dict[ObjectId, Dict[str, Any]],
+                            refill: bool = False) -> bool:
+        """合并变化的小说到热门榜，返回榜单是否变化"""
+        board = self.leaderboards.find_one({"_id": POPULAR_LEADERBOARD}) or {"entries": []}
+        entries = {entry["novelId"]: entry["readCount"] for entry in board["entries"]}
+        for novel_id in set(novel_ids):
+            new = current.get(novel_id)
+            if novel_id in entries and (new is None or new["duplicate"] or new["readCount"] < entries[novel_id]):
+                # 榜上的小说被删除或阅读量下降，榜外的下一名可能是任何小说，从影子集合重新取
+                refill = True
+            entries.pop(novel_id, None)
+            if new is not None and not new["duplicate"]:
+                entries[novel_id] = new["readCount"]
+
+        if refill:
+            cursor = self.index.find({"duplicate": False}, {"readCount": 1}).sort("readCount", -1).limit(self.leaderboard_size)
+            ranked = [(doc["_id"], doc["readCount"]) for doc in cursor]
+        else:
+            ranked = sorted(entries.items(), key=lambda item: item[1], reverse=True)[:self.leaderboard_size]
+
+        new_entries = [{"novelId": novel_id, "readCount": read_count} for novel_id, read_count in ranked]
+        if new_entries == board["entries"]:
+            return False
+        self.leaderboards.replace_one(
+            {"_id": POPULAR_LEADERBOARD},
+            {"entries": new_entries, "updateTime": datetime.utcnow()},
+            upsert=True,
+        )
+        return True
+
+    def _update_similar(self, tags_changed: List[ObjectId], removed: List[ObjectId]) -> Set[str]:
+        """更新相似列表，返回列表发生变化的小说ID"""
+        changed: Set[str] = set()
+        if removed:
+            self.similar.delete_many({"_id": {"$in": removed}})
+            changed.update(str(novel_id) for novel_id in removed)
+        # 包含被删除、标签变化的小说的列表需要重新计算
+        affected = set(tags_changed) | set(removed)
+        stale = set()
+        if affected:
+            stale = {doc["_id"] for doc in self.similar.find({"similar": {"$in": list(affected)}}, {"_id": 1})}
+            stale -= set(removed)
+        refresh = list(set(tags_changed) | stale)
+        overflow = refresh[self.max_similar_refresh:]
+        if overflow:
+            self.similar.delete_many({"_id": {"$in": overflow}})
+            changed.update(str(novel_id) for novel_id in overflow)
+        for novel_id in refresh[:self.max_similar_refresh]:
+            self.compute_similar(novel_id)
+            changed.add(str(novel_id))
+        return changed
+
+    def compute_similar(self, novel_id: ObjectId):
+        """在同标签、阅读量最高的候选小说中按标签Jaccard相似度取前similar_size本"""
+        entry = self.index.find_one({"_id": novel_id}, {"tags": 1, "duplicate": 1})
+        if entry is None or entry["duplicate"] or not entry["tags"]:
+            self.similar.delete_one({"_id": novel_id})
+            return
+        candidates = self.index.find(
+            {"_id": {"$ne": novel_id}, "tags": {"$in": entry["tags"]}, "duplicate": False},
+            {"tags": 1, "readCount": 1},
+        ).sort("readCount", -1).limit(self.similar_candidates)
+        scored = sorted(
+            ((jaccard(entry["tags"], doc["tags"]), doc["readCount"], doc["_id"]) for doc in candidates),
+            key=lambda item: (item[0], item[1]),
+            reverse=True,
+        )
+        self.similar.replace_one(
+            {"_id": novel_id},
+            {"similar": [novel_id for _, _, novel_id in scored[:self.similar_size]], "updateTime": datetime.utcnow()},
+            upsert=True,
+        )
+
+    def rebuild(self, similar: bool = False, batch_size: int = 1000) -> Dict[str, Optional[Set[str]]]:
+        """
+        从novels全量重建影子集合、标签目录和热门榜
+        相似列表默认只清空（API回退到按标签查询），之后随小说变化逐步计算；similar=True时全部重新计算
+        """
+        started = datetime.utcnow()
+        operations = []
+        total = 0
+        for doc in self.novels.find({}, SOURCE_PROJECTION).batch_size(batch_size):
+            entry = build_index_entry(doc)
+            entry["updateTime"] = started
+            operations.append(ReplaceOne({"_id": entry["_id"]}, entry, upsert=True))
+            if len(operations) >= batch_size:
+                self.index.bulk_write(operations, ordered=False)
+                total += len(operations)
+                operations = []
+        if operations:
+            self.index.bulk_write(operations, ordered=False)
+            total += len(operations)
+        # 本次没有写到的影子文档对应的小说已被删除
+        self.index.delete_many({"updateTime": {"$lt": started}})
+
+        self.index.aggregate([
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+            {"$out": TAG_CATALOG_COLLECTION},
+        ])
+        self._update_leaderboard([], {}, refill=True)
+        self.similar.delete_many({})
+        if similar:
+            for doc in self.index.find({"duplicate": False}, {"_id": 1}):
+                self.compute_similar(doc["_id"])
+        logger.info(f"派生数据重建完成: {total} 本小说")
+        return {topic: None for topic in (invalidation.NOVELS, invalidation.CHAPTERS, invalidation.TAGS,
+                                          invalidation.POPULAR, invalidation.SIMILAR)}
@@ -0,0 +1,55 @@
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationPublisher:
+    """
+    把失效事件写入固定大小（capped）的集合，各API worker用tailable游标读取（见 app.core.invalidation）
+    事件带连续的序号，worker据此发现漏读的事件；序号从集合中最后一个事件继续，同一时间只能有一个发布者
+    """
+
+    def __init__(self, db, collection: str, size_mb: int = 16, max_keys: int = 1000):
+        self.db = db
+        self.name = collection
+        self.size_mb = size_mb
+        # 单个事件最多携带的键数，超出的拆成多个事件
+        self.max_keys = max_keys
+        self.collection = db[collection]
+        self.seq = 0
+        self.published = 0
+
+    def prepare(self):
+        """创建capped集合（已存在时保留），并从最后一个事件继续编号"""
+        try:
+            self.db.create_collection(self.name, capped=True, size=self.size_mb * 1024 * 1024)
+            logger.info(f"创建失效事件集合: {self.name}")
+        except CollectionInvalid:
+            pass
+        # API worker发布的事件不带序号
+        last = self.collection.find_one({"seq": {"$exists": True}}, sort=[("$natural", -1)])
+        self.seq = last.get("seq", 0) if last else 0
+
+    def publish(self, topics: Dict[str, Optional[Iterable[str]]]):
+        """topics: {主题: 变化的键，None表示该主题下的全部数据}"""
+        events = []
+        for topic, keys in topics.items():
+            if keys is None:
+                events.append({"topic": topic, "keys": None})
+                continue
+            keys = sorted(keys)
+            for start in range(0, len(keys), self.max_keys):
+                events.append({"topic": topic, "keys": keys[start:start + self.max_keys]})
+        if not events:
+            return
+        now = datetime.utcnow()
+        for event in events:
+            self.seq += 1
+            event["seq"] = self.seq
+            event["time"] = now
+        # 有序写入，保证_id和seq的顺序一致
+        self.collection.insert_many(events, ordered=True)
+        self.published += len(events)
@@ -0,0 +1,186 @@
+import atexit
+import collections
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict
+from .config import settings
+
+ACCESS_LOGGER_NAME = "app.access"
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    只在调用方线程里做入队的日志处理器
+    队列满时丢弃记录并计数，保证事件循环不会因为stderr写阻塞而卡住
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 默认实现会在调用方线程里格式化消息并复制记录，这里推迟到监听线程再做，
+        # 只把异常信息提前转成文本（traceback对象不能跨线程长期持有）
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_route_levels(spec: str) -> Dict[str, int]:
+    """解析 "/health=DEBUG,/api/novels/{novel_id}=WARNING" 形式的按路由日志级别配置"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        route, level = item.rsplit("=", 1)
+        levels[route.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+class AccessLogger:
+    """
+    结构化访问日志
+    每个请求只生成一条记录，支持采样和按路由设置级别；错误和慢请求不参与采样。
+    事件循环侧只把记录追加到内存缓冲区，由后台线程定时批量格式化成JSON行并一次性写出
+    """
+
+    def __init__(self, stream=None):
+        self.logger = logging.getLogger(ACCESS_LOGGER_NAME)
+        self.enabled = settings.ACCESS_LOG_ENABLED
+        self.sample_rate = settings.ACCESS_LOG_SAMPLE_RATE
+        self.slow_seconds = settings.ACCESS_LOG_SLOW_MS / 1000
+        self.route_levels = parse_route_levels(settings.ACCESS_LOG_ROUTE_LEVELS)
+        self.max_buffer = settings.LOG_QUEUE_SIZE
+        self.flush_interval = settings.ACCESS_LOG_FLUSH_INTERVAL
+        self.stream = stream
+        self._buffer = collections.deque()
+        self._stop = threading.Event()
+        self._writer = None
+        # 统计信息，用于衡量日志本身的开销
+        self.logged = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.batches = 0
+        self.log_seconds = 0.0
+
+    def log(self, request, route: str, status_code: int, process_time: float):
+        """记录一次请求，在中间件中响应生成后调用"""
+        if not self.enabled:
+            return
+        started = time.perf_counter()
+        level = self.route_levels.get(route, logging.INFO)
+        if status_code >= 500:
+            level = max(level, logging.ERROR)
+        elif process_time >= self.slow_seconds:
+            level = max(level, logging.WARNING)
+        elif not self.logger.isEnabledFor(level):
+            return
+        elif self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        client = request.client
+        self._buffer.append((time.time(), level, {
+            "method": request.method,
+            "path": request.scope["path"],
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(process_time * 1000, 3),
+            "client": client.host if client else None,
+        }))
+        self.logged += 1
+        self.log_seconds += time.perf_counter() - started
+
+    def start(self):
+        """启动后台写线程"""
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run, name="access-log-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """停止写线程并写出剩余记录"""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+            self._writer = None
+        self.flush()
+
+    def flush(self):
+        """把缓冲区中的记录一次性写出"""
+        buffer = self._buffer
+        if not buffer:
+            return
+        lines = []
+        while buffer:
+            created, level, entry = buffer.popleft()
+            entry["level"] = logging.getLevelName(level)
+            entry["time"] = datetime.fromtimestamp(created, timezone.utc).isoformat()
+            lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+        stream = self.stream or sys.stderr
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except (OSError, ValueError):
+            self.dropped += len(lines)
+        self.batches += 1
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """返回访问日志统计"""
+        return {
+            "logged": self.logged,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "buffered": len(self._buffer),
+            "batches": self.batches,
+            "log_seconds": self.log_seconds,
+            "avg_log_us": self.log_seconds / self.logged * 1e6 if self.logged else 0.0,
+        }
+
+
+def setup_logging():
+    """
+    配置日志：应用日志经QueueHandler入队，由QueueListener的后台线程格式化并写stderr；
+    访问日志由AccessLogger单独批量写出
+    """
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers = [queue_handler]
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    access_logger.start()
+    return listener
+
+
+access_logger = AccessLogger()
@@ -1,27 +1,63 @@
+import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from ..models.user import TokenData, User
+from ..models.user import TokenData, Principal
 from ..core.config import settings
+from ..core import invalidation
+from ..core.cache import create_cache
+from ..core.passwords import PasswordHasher
 from ..database.mongodb import mongodb
 
-# 密码哈希工具
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# 密码哈希工具（调整BCRYPT_ROUNDS后，旧哈希会在用户下次登录时重新计算）
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# 密码计算线程池，请求处理中一律使用它的异步方法
+password_hasher = PasswordHasher("bcrypt", pwd_context, settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
 
 # OAuth2 密码流
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_PREFIX}/users/login")
 
-# 密码验证
+# 已认证用户缓存，键为(用户名, 令牌版本)
+principal_cache = create_cache("principal", settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
+
+
+def _drop_principals(usernames: Optional[List[str]]):
+    """删除这些用户的缓存，None表示全部"""
+    if usernames is None:
+        principal_cache.clear()
+        return
+    names = set(usernames)
+    principal_cache.invalidate_where(lambda key: key[0] in names)
+
+
+# 其他worker上的退出登录、角色变更经失效事件集合通知到本worker
+invalidation.subscribe(invalidation.PRINCIPALS, _drop_principals)
+
+# 鉴权只需要这些字段
+PRINCIPAL_PROJECTION = {"_id": 1, "username": 1, "roles": 1, "isActive": 1, "tokenVersion": 1}
+
+# 密码验证（同步版本，会阻塞调用线程，供脚本和测试使用）
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
-# 密码哈希
+# 密码哈希（同步版本，会阻塞调用线程，供脚本和测试使用）
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# 密码哈希（在线程池中计算，不阻塞事件循环）
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+# 密码验证，哈希参数过时时一并返回新哈希
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
 # 创建访问令牌
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -33,8 +69,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+# 使某个用户在所有worker上的缓存失效（资料、角色变更或退出登录，数据库更新之后调用）
+async def invalidate_principal(username: str):
+    try:
+        await invalidation.publish(invalidation.PRINCIPALS, [username])
+    except Exception as e:
+        # 本worker已经失效；其他worker最多在PRINCIPAL_CACHE_TTL内继续使用缓存
+        logger.error(f"发布用户缓存失效事件失败: {username}, 错误: {e}")
+
 # 解析令牌
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无效的身份凭证",
@@ -46,18 +90,32 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(username=username, version=payload.get("ver", 0))
     except JWTError:
         raise credentials_exception
     
-    # 从数据库获取用户
+    # 先查缓存
+    cache_key = (token_data.username, token_data.version)
+    principal = principal_cache.get(cache_key, None)
+    if principal is not None:
+        return principal
+    
+    # 从数据库获取用户（只取鉴权需要的字段）
     user_collection = mongodb.get_user_collection()
-    user = await user_collection.find_one({"username": token_data.username})
+    user = await user_collection.find_one({"username": token_data.username}, PRINCIPAL_PROJECTION)
     if user is None:
         raise credentials_exception
     
-    # 添加id字段
-    user["id"] = str(user["_id"])
+    # 令牌版本与数据库不一致，说明令牌已被注销
+    if user.get("tokenVersion", 0) != token_data.version:
+        raise credentials_exception
     
-    # 返回用户对象
-    return User.model_validate(user) 
\ No newline at end of file
+    principal = Principal(
+        id=str(user["_id"]),
+        username=user["username"],
+        roles=user.get("roles", ["user"]),
+        isActive=user.get("isActive", True),
+        tokenVersion=user.get("tokenVersion", 0),
+    )
+    principal_cache.set(cache_key, principal)
+    return principal
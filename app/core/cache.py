@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from .metrics import register_stats_source
+
+# 未命中时get返回的哨兵值，用于区分缓存的None
+MISSING = object()
+
+
+class TTLCache:
+    """
+    进程内的LRU + TTL缓存
+    只在事件循环线程中使用，不加锁；超过maxsize时淘汰最久未使用的条目，过期条目在读取时清除
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = MISSING) -> Any:
+        """读取未过期的条目，不计入命中统计，也不改变淘汰顺序"""
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        """删除单个条目"""
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """删除所有键满足条件的条目（遍历整个缓存，只用于低频的失效操作）"""
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+            self.invalidations += 1
+
+    def keys(self) -> List[Hashable]:
+        return list(self._data)
+
+    def clear(self):
+        self.invalidations += len(self._data)
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# 缓存名 -> 缓存实例，供统一失效和监控使用
+caches: Dict[str, TTLCache] = {}
+
+
+def create_cache(name: str, maxsize: int, ttl: float) -> TTLCache:
+    """创建并登记一个缓存，统计信息会出现在/metrics的app_component_stat中"""
+    cache = TTLCache(name, maxsize, ttl)
+    caches[name] = cache
+    register_stats_source(f"cache:{name}", cache.stats)
+    return cache
@@ -0,0 +1,25 @@
+import zlib
+from typing import Any, Dict
+
+# 章节正文压缩后存放的字段，见 app/migrations/m0001_compress_chapter_content.py
+COMPRESSED_CONTENT_FIELD = "contentZ"
+
+
+def compress_text(text: str, level: int = 6) -> bytes:
+    return zlib.compress(text.encode("utf-8"), level)
+
+
+def decompress_text(data: bytes) -> str:
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+def chapter_content(chapter: Dict[str, Any]) -> str:
+    """
+    读取章节正文，兼容迁移前后两种结构：
+    迁移前和爬虫新写入的章节是明文content，迁移后是压缩的contentZ；两者都有时以content为准（爬虫更新过的正文）
+    """
+    content = chapter.get("content")
+    if content is not None:
+        return content
+    data = chapter.get(COMPRESSED_CONTENT_FIELD)
+    return decompress_text(data) if data is not None else ""
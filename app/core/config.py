@@ -17,15 +17,77 @@ class Settings(BaseSettings):
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "zhangzhixing")
     NOVELS_COLLECTION: str = os.getenv("NOVELS_COLLECTION", "novels")
     USERS_COLLECTION: str = os.getenv("USERS_COLLECTION", "users")
+    FAVORITES_COLLECTION: str = os.getenv("FAVORITES_COLLECTION", "favorites")
+    READING_HISTORY_COLLECTION: str = os.getenv("READING_HISTORY_COLLECTION", "reading_history")
 
     # JWT配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))  # 7天
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # 已认证用户缓存秒数
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # 修改后旧密码哈希在下次登录时自动升级
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))  # 密码计算线程数，0表示min(4, CPU核数)
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # 排队超过该数量时返回503
 
     # 分页默认值
     DEFAULT_PAGE_SIZE: int = 10
     MAX_PAGE_SIZE: int = 100
+    MAX_BATCH_IDS: int = 100  # 批量查询接口一次最多接受的ID数
+    NOVEL_SUMMARY_CACHE_TTL: float = float(os.getenv("NOVEL_SUMMARY_CACHE_TTL", "60"))  # 小说摘要缓存秒数，阅读数等统计在此期间可能不是最新
+    NOVEL_SUMMARY_CACHE_SIZE: int = int(os.getenv("NOVEL_SUMMARY_CACHE_SIZE", "20000"))
+
+    # 变更流与派生数据配置（变更流消费进程见 python -m app.changefeed）
+    CACHE_INVALIDATIONS_COLLECTION: str = os.getenv("CACHE_INVALIDATIONS_COLLECTION", "cache_invalidations")
+    CACHE_INVALIDATIONS_SIZE_MB: int = int(os.getenv("CACHE_INVALIDATIONS_SIZE_MB", "16"))  # 失效事件capped集合的大小
+    CACHE_INVALIDATION_POLL_INTERVAL: float = float(os.getenv("CACHE_INVALIDATION_POLL_INTERVAL", "1.0"))  # 没有新事件时的等待秒数
+    DERIVED_DATA_ENABLED: bool = os.getenv("DERIVED_DATA_ENABLED", "False").lower() == "true"  # 标签、热门、推荐、搜索读取派生集合
+    LEADERBOARD_SIZE: int = int(os.getenv("LEADERBOARD_SIZE", "100"))  # 热门榜保存的小说数
+    SIMILAR_NOVELS_SIZE: int = int(os.getenv("SIMILAR_NOVELS_SIZE", "30"))  # 每本小说保存的相似小说数
+    DERIVED_CACHE_TTL: float = float(os.getenv("DERIVED_CACHE_TTL", "300"))  # 派生数据缓存秒数，变化时由失效事件提前删除
+    DERIVED_CACHE_SIZE: int = int(os.getenv("DERIVED_CACHE_SIZE", "10000"))
+
+    # 数据库降级配置：查询期限（以maxTimeMS下发）、断路器、过期响应缓存
+    QUERY_DEADLINE_MS: int = int(os.getenv("QUERY_DEADLINE_MS", "1000"))  # 未单独配置的路由的查询期限
+    ROUTE_DEADLINES_MS: str = os.getenv("ROUTE_DEADLINES_MS", "novel_list=800,novel_detail=500,chapter=500,tags=1000,popular=500")  # 按路由名设置
+    DEADLINE_MARGIN_MS: int = int(os.getenv("DEADLINE_MARGIN_MS", "50"))  # 剩余时间少于该值时不再发起查询，有旧响应时直接返回旧响应
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # 连续超时或连接失败多少次后断开
+    BREAKER_RESET_TIMEOUT: float = float(os.getenv("BREAKER_RESET_TIMEOUT", "5.0"))  # 断开多少秒后放行一个探测请求
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))  # 每个可缓存接口保存的响应数
+    RESPONSE_CACHE_FRESH_TTL: float = float(os.getenv("RESPONSE_CACHE_FRESH_TTL", "10"))  # 响应在该秒数内直接返回，之后先尝试刷新
+    RESPONSE_CACHE_STALE_TTL: float = float(os.getenv("RESPONSE_CACHE_STALE_TTL", "3600"))  # 数据库不可用时最多返回多旧的响应
+
+    # 阅读历史配置
+    READING_HISTORY_MAX_ENTRIES: int = int(os.getenv("READING_HISTORY_MAX_ENTRIES", "200"))  # 每个用户最多保留的记录数
+    READING_HISTORY_FLUSH_INTERVAL: float = float(os.getenv("READING_HISTORY_FLUSH_INTERVAL", "2.0"))  # 写缓冲刷新间隔秒数
+    READING_HISTORY_MAX_PENDING: int = int(os.getenv("READING_HISTORY_MAX_PENDING", "5000"))  # 缓冲记录数超过该值时立即刷新
+
+    # 生产部署配置
+    WORKERS: int = int(os.getenv("WORKERS", "0"))  # 0表示按CPU核数自动计算
+    GRACEFUL_TIMEOUT: int = int(os.getenv("GRACEFUL_TIMEOUT", "30"))  # 关闭时等待在途请求的秒数
+    MAX_REQUESTS: int = int(os.getenv("MAX_REQUESTS", "10000"))  # 单个worker处理多少请求后滚动重启
+    MAX_REQUESTS_JITTER: int = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+    MONGODB_READY_TIMEOUT: int = int(os.getenv("MONGODB_READY_TIMEOUT", "120"))  # 等待mongos就绪的最长秒数
+
+    # 日志配置
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # 日志队列/缓冲区长度，满时丢弃
+    ACCESS_LOG_ENABLED: bool = os.getenv("ACCESS_LOG_ENABLED", "True").lower() == "true"
+    ACCESS_LOG_SAMPLE_RATE: float = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))  # 正常请求的采样比例
+    ACCESS_LOG_SLOW_MS: float = float(os.getenv("ACCESS_LOG_SLOW_MS", "500"))  # 超过该耗时的请求总是记录
+    ACCESS_LOG_ROUTE_LEVELS: str = os.getenv("ACCESS_LOG_ROUTE_LEVELS", "/health=DEBUG,/metrics=DEBUG")  # 按路由模板设置日志级别
+    ACCESS_LOG_FLUSH_INTERVAL: float = float(os.getenv("ACCESS_LOG_FLUSH_INTERVAL", "0.5"))  # 访问日志批量写出的间隔秒数
+
+    # 监控指标配置
+    METRICS_REFRESH_INTERVAL: float = float(os.getenv("METRICS_REFRESH_INTERVAL", "1.0"))  # 事件循环延迟采样和组件统计刷新间隔
+
+    # 请求剖析配置（PROFILING_ENABLED为假时不挂载中间件）
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+    PROFILING_TOKEN: str = os.getenv("PROFILING_TOKEN", "")  # 管理员通过X-Profile请求头携带的令牌，为空时禁用手动触发
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))  # 随机采样比例
+    PROFILING_ROUTES: str = os.getenv("PROFILING_ROUTES", "")  # 总是剖析的路由模板，逗号分隔
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "profiles")  # 剖析结果保存目录
+    PROFILING_BACKEND: str = os.getenv("PROFILING_BACKEND", "auto")  # auto/pyinstrument/cprofile，auto在安装了pyinstrument时使用它
+    PROFILING_INTERVAL: float = float(os.getenv("PROFILING_INTERVAL", "0.001"))  # pyinstrument采样间隔秒数
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+from .cache import TTLCache
+from .config import settings
+from .metrics import register_stats_source
+from ..database.mongodb import mongodb
+
+logger = logging.getLogger(__name__)
+
+# 变更事件的主题，由变更流消费进程（app/changefeed）发布
+NOVELS = "novels"        # 小说的摘要字段变化、新增或删除，keys为小说ID
+CHAPTERS = "chapters"    # 章节目录或正文变化，keys为小说ID
+TAGS = "tags"            # 标签目录变化
+POPULAR = "popular"      # 热门榜变化
+SIMILAR = "similar"      # 相似小说列表变化，keys为小说ID
+# 由API worker发布的主题
+PRINCIPALS = "principals"  # 用户的令牌版本或角色变化（退出登录等），keys为用户名
+
+# 处理函数的参数为变化的键列表，None表示该主题下的所有数据都可能变化
+Handler = Callable[[Optional[List[str]]], None]
+
+_subscribers: Dict[str, List[Handler]] = defaultdict(list)
+
+
+def subscribe(topic: str, handler: Handler):
+    """登记某个主题的失效处理函数，在事件循环线程中调用"""
+    _subscribers[topic].append(handler)
+
+
+def cache_invalidator(cache: TTLCache, key: Callable[[str], Any] = lambda value: value) -> Handler:
+    """把变化的键映射为缓存键并删除，没有给出键时清空整个缓存"""
+    def handler(keys: Optional[List[str]]):
+        if keys is None:
+            cache.clear()
+            return
+        for value in keys:
+            cache.pop(key(value))
+    return handler
+
+
+def dispatch(topic: str, keys: Optional[List[str]]):
+    for handler in _subscribers.get(topic, ()):
+        try:
+            handler(keys)
+        except Exception as e:
+            logger.error(f"缓存失效处理失败: {topic}, 错误: {e}")
+
+
+async def ensure_collection():
+    """创建失效事件的capped集合（已存在时不变），向不存在的集合写入会建成普通集合，tailable游标无法读取"""
+    try:
+        await mongodb.db.create_collection(settings.CACHE_INVALIDATIONS_COLLECTION, capped=True,
+                                           size=settings.CACHE_INVALIDATIONS_SIZE_MB * 1024 * 1024)
+    except CollectionInvalid:
+        pass
+
+
+async def publish(topic: str, keys: Optional[List[str]]):
+    """
+    由API worker发布失效事件：先在本worker处理，再写入失效事件集合通知其他worker
+    事件不带序号，不影响变更流消费进程事件的序号连续性检查
+    """
+    dispatch(topic, keys)
+    await ensure_collection()
+    await mongodb.db[settings.CACHE_INVALIDATIONS_COLLECTION].insert_one(
+        {"topic": topic, "keys": keys, "time": datetime.utcnow()}
+    )
+
+
+class InvalidationListener:
+    """
+    缓存失效事件的接收端，每个worker进程一个
+    变更流消费进程（以及调用publish的API worker）把失效事件写入固定大小（capped）的cache_invalidations集合，
+    各worker用tailable游标跟随读取，按主题调用登记的处理函数，所有worker都能收到同样的事件。
+    消费进程的事件带连续的序号，发现序号跳跃（worker落后太多、事件已被覆盖）时按全部失效处理
+    """
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = None
+        self._last_seq: Optional[int] = None
+        # 统计信息
+        self.received = 0
+        self.gaps = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        collection = mongodb.db[settings.CACHE_INVALIDATIONS_COLLECTION]
+        positioned = False
+        while True:
+            try:
+                if not positioned:
+                    await ensure_collection()
+                    # 只处理启动之后的事件，启动时缓存本来就是空的
+                    latest = await collection.find_one({}, sort=[("$natural", -1)])
+                    if latest is not None:
+                        self._last_id = latest["_id"]
+                    numbered = await collection.find_one({"seq": {"$exists": True}}, sort=[("$natural", -1)])
+                    if numbered is not None:
+                        self._last_seq = numbered["seq"]
+                    positioned = True
+                query = {"_id": {"$gt": self._last_id}} if self._last_id is not None else {}
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for event in cursor:
+                        self.apply(event)
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"读取缓存失效事件失败: {e}")
+            # 集合尚未创建或游标失效时稍后重新打开
+            await asyncio.sleep(self.poll_interval)
+
+    def apply(self, event: Dict[str, Any]):
+        self.received += 1
+        seq = event.get("seq")
+        if self._last_seq is not None and seq is not None and seq > self._last_seq + 1:
+            self.gaps += 1
+            logger.warning(f"缓存失效事件序号从 {self._last_seq} 跳到 {seq}，清空所有订阅的缓存")
+            for topic in list(_subscribers):
+                dispatch(topic, None)
+        else:
+            dispatch(event["topic"], event.get("keys"))
+        self._last_id = event["_id"]
+        if seq is not None:
+            self._last_seq = seq
+
+    def stats(self) -> Dict[str, int]:
+        return {"received": self.received, "gaps": self.gaps, "errors": self.errors}
+
+
+# 全局实例，在应用启动时start
+invalidation_listener = InvalidationListener(settings.CACHE_INVALIDATION_POLL_INTERVAL)
+register_stats_source("cache_invalidation", invalidation_listener.stats)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Dict
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+)
+from pymongo import monitoring
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 多worker部署时，gunicorn启动前设置该环境变量，各进程把指标写入共享目录，由抓取请求汇总
+MULTIPROCESS_MODE = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP请求处理耗时",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "正在处理中的HTTP请求数",
+    multiprocess_mode="livesum",
+)
+
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB命令耗时",
+    ["collection", "command"],
+    buckets=LATENCY_BUCKETS,
+)
+
+MONGO_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "MongoDB命令失败次数",
+    ["collection", "command"],
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "事件循环调度延迟（定时任务实际唤醒时间与预期的差值）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+COMPONENT_STAT = Gauge(
+    "app_component_stat",
+    "缓存、写缓冲等内部组件的统计值",
+    ["component", "stat"],
+    multiprocess_mode="all",
+)
+
+# 组件名 -> 返回统计字典的函数
+_stats_sources: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+
+def register_stats_source(component: str, source: Callable[[], Dict[str, float]]):
+    """
+    注册一个统计来源（如缓存、计数写缓冲），后台任务会定期把它的返回值写入app_component_stat
+    """
+    _stats_sources[component] = source
+
+
+def refresh_component_stats():
+    """把所有已注册组件的统计值同步到指标"""
+    for component, source in _stats_sources.items():
+        try:
+            stats = source()
+        except Exception as e:
+            logger.warning(f"读取组件统计失败: {component}, 错误: {e}")
+            continue
+        for stat, value in stats.items():
+            COMPONENT_STAT.labels(component, stat).set(value)
+
+
+def observe_request(method: str, route: str, status_code: int, process_time: float):
+    """记录一次HTTP请求的耗时"""
+    REQUEST_LATENCY.labels(method, route, str(status_code)).observe(process_time)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    通过pymongo的命令监听记录每条命令的耗时，按集合和命令名区分
+    回调在驱动的线程中执行，这里只做字典操作和指标记录
+    """
+
+    # 握手、心跳和认证命令不计入
+    IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        name = event.command_name
+        if name in self.IGNORED_COMMANDS:
+            return
+        # 大多数命令的第一个字段值就是集合名，getMore的集合名在collection字段中
+        collection = event.command.get("collection") if name == "getMore" else event.command.get(name)
+        if not isinstance(collection, str):
+            collection = "-"
+        self._pending[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+async def monitor_runtime(interval: float = settings.METRICS_REFRESH_INTERVAL):
+    """
+    后台任务：测量事件循环延迟并刷新组件统计
+    sleep(interval)实际唤醒时间超出interval的部分就是事件循环被阻塞的时间
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - start - interval, 0.0))
+        refresh_component_stats()
+
+
+def render_metrics():
+    """生成Prometheus文本格式的指标，返回(内容, Content-Type)"""
+    refresh_component_stats()
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
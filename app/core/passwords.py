@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from .metrics import register_stats_source
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_count() -> int:
+    """默认线程数：不超过4，避免密码计算占满所有CPU影响其他请求"""
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class PasswordHasher:
+    """
+    在专用线程池中执行bcrypt哈希和校验，避免阻塞事件循环
+    bcrypt计算时会释放GIL，多个线程可以真正并行。
+    同时执行的计算数等于线程数，排队数超过max_pending时直接返回503，
+    登录洪峰时宁可拒绝一部分请求，也不让排队时间无限增长
+    """
+
+    def __init__(self, name: str, context: CryptContext, workers: int, max_pending: int):
+        self.name = name
+        self.context = context
+        self.workers = workers or default_worker_count()
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 统计信息
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        register_stats_source(f"password:{name}", self.stats)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"password-{self.name}")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.workers + self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="服务繁忙，请稍后重试",
+                headers={"Retry-After": "1"},
+            )
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                self.wait_seconds += started - submitted
+                self.run_seconds += finished - started
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), task)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        """计算密码哈希"""
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """校验密码"""
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        校验密码，并在哈希参数（算法、轮数）已过时时返回新哈希
+        返回(是否正确, 新哈希或None)，调用方负责把新哈希写回数据库
+        """
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, float]:
+        """返回线程池统计"""
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_wait_ms": self.wait_seconds / self.completed * 1000 if self.completed else 0.0,
+            "avg_run_ms": self.run_seconds / self.completed * 1000 if self.completed else 0.0,
+        }
@@ -0,0 +1,180 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from typing import List, Optional, Pattern, Tuple
+from .config import settings
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # pragma: no cover - pyinstrument是可选依赖
+    PyinstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_OUTPUT_HEADER = b"x-profile-output"
+
+
+def compile_route_patterns(spec: str) -> List[Pattern]:
+    """把逗号分隔的路由模板（如 /api/novels/{novel_id}）编译成匹配请求路径的正则"""
+    patterns = []
+    for template in spec.split(","):
+        template = template.strip()
+        if not template:
+            continue
+        regex = re.sub(r"\\{[^/]+?\\}", "[^/]+", re.escape(template))
+        patterns.append(re.compile(f"^{regex}$"))
+    return patterns
+
+
+class _RequestProfiler:
+    """对单个请求的一次采样，优先使用pyinstrument，未安装时退回cProfile"""
+
+    def __init__(self, backend: str):
+        if backend == "pyinstrument" or (backend == "auto" and PyinstrumentProfiler is not None):
+            # async_mode=enabled会把await等待的时间（如Motor查询）归到发起await的调用栈上
+            self.profiler = PyinstrumentProfiler(interval=settings.PROFILING_INTERVAL, async_mode="enabled")
+            self.kind = "pyinstrument"
+        else:
+            # cProfile按线程统计，同一时间在事件循环上运行的其他请求也会被计入
+            self.profiler = cProfile.Profile()
+            self.kind = "cprofile"
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.kind == "pyinstrument":
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def render(self) -> Tuple[bytes, str]:
+        """返回(内容, Content-Type)，用于直接返回给调用方"""
+        if self.kind == "pyinstrument":
+            return self.profiler.output_html().encode("utf-8"), "text/html; charset=utf-8"
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(50)
+        return stream.getvalue().encode("utf-8"), "text/plain; charset=utf-8"
+
+    def save(self, directory: str, name: str) -> str:
+        """保存到磁盘，pyinstrument保存HTML，cProfile保存可用pstats/snakeviz打开的.prof文件"""
+        os.makedirs(directory, exist_ok=True)
+        if self.kind == "pyinstrument":
+            path = os.path.join(directory, f"{name}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.profiler.output_html())
+        else:
+            path = os.path.join(directory, f"{name}.prof")
+            self.profiler.dump_stats(path)
+        return path
+
+
+class ProfilingMiddleware:
+    """
+    按需对单个请求做性能剖析的ASGI中间件
+    触发方式：
+    - 请求头 X-Profile 等于 PROFILING_TOKEN（管理员手动触发），X-Profile-Output: inline 时直接返回剖析结果
+    - 按 PROFILING_SAMPLE_RATE 随机采样
+    - 请求路径匹配 PROFILING_ROUTES 中的路由模板
+    采样和路由触发的结果只写入 PROFILING_DIR。
+    只有 PROFILING_ENABLED 为真时才会挂载，关闭时没有任何额外开销
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.token = settings.PROFILING_TOKEN.encode("utf-8")
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.routes = compile_route_patterns(settings.PROFILING_ROUTES)
+        self.directory = settings.PROFILING_DIR
+        self.backend = settings.PROFILING_BACKEND
+        # 同一时间只剖析一个请求，避免多个采样器互相干扰
+        self._active = False
+        self._sequence = itertools.count(1)
+
+    def _is_admin(self, scope) -> Tuple[bool, bool]:
+        """返回(是否携带有效的剖析令牌, 是否要求直接返回结果)"""
+        token = None
+        inline = False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                token = value
+            elif name == PROFILE_OUTPUT_HEADER:
+                inline = value.lower() == b"inline"
+        if token is None or not self.token:
+            return False, False
+        is_admin = hmac.compare_digest(token, self.token)
+        return is_admin, is_admin and inline
+
+    def _should_profile(self, scope) -> Tuple[bool, bool, bool]:
+        """返回(是否剖析, 是否为管理员触发, 是否直接返回结果)"""
+        is_admin, inline = self._is_admin(scope)
+        if is_admin:
+            return True, True, inline
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True, False, False
+        path = scope["path"]
+        for pattern in self.routes:
+            if pattern.match(path):
+                return True, False, False
+        return False, False, False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active:
+            await self.app(scope, receive, send)
+            return
+        should_profile, is_admin, inline = self._should_profile(scope)
+        if not should_profile:
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        profiler = _RequestProfiler(self.backend)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{scope['path'].strip('/').replace('/', '_') or 'root'}-{os.getpid()}-{next(self._sequence)}"
+
+        async def send_with_header(message):
+            # 告诉管理员剖析结果保存的文件名
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-profile-id", name.encode("utf-8")))
+            await send(message)
+
+        async def discard(message):
+            # 直接返回剖析结果时丢弃原始响应
+            pass
+
+        if inline:
+            app_send = discard
+        elif is_admin:
+            app_send = send_with_header
+        else:
+            app_send = send
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, app_send)
+        finally:
+            profiler.stop()
+            self._active = False
+
+        if inline:
+            body, content_type = profiler.render()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", content_type.encode("ascii")), (b"content-length", str(len(body)).encode("ascii"))],
+            })
+            await send({"type": "http.response.body", "body": body})
+        else:
+            path = await asyncio.get_running_loop().run_in_executor(None, profiler.save, self.directory, name)
+            logger.info(f"请求剖析结果已保存: {path}")
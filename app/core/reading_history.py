@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .config import settings
+from .metrics import register_stats_source
+from ..database.mongodb import mongodb
+
+logger = logging.getLogger(__name__)
+
+# 唯一索引冲突的错误码
+DUPLICATE_KEY = 11000
+# 同时进行的裁剪数，一次刷新可能涉及几千个用户
+TRIM_CONCURRENCY = 32
+
+
+class ReadingHistoryBuffer:
+    """
+    阅读历史写缓冲
+    同一用户同一本小说在一个刷新周期内的多次更新（快速翻页、滚动）只保留最后一次，
+    由后台任务每隔flush_interval秒用一次bulk_write批量写入；
+    写入后每个用户最多保留max_entries条记录，超出的按阅读时间从旧到新删除。
+    缓冲只在进程内，进程被强制杀死时最多丢失一个刷新周期的记录
+    """
+
+    def __init__(self, flush_interval: float, max_entries: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.max_pending = max_pending
+        # (userId, novelId) -> 最新的记录
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # 缓冲区过大时提前触发的刷新，同一时间只保留一个
+        self._flush_task: Optional[asyncio.Task] = None
+        # 在事件循环中首次刷新时创建（Python 3.9的Lock创建时会绑定当前事件循环）
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # 统计信息
+        self.recorded = 0
+        self.coalesced = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.trimmed = 0
+        register_stats_source("reading_history", self.stats)
+
+    def record(self, user_id: str, novel_id: str, entry: Dict[str, Any]):
+        """记录一次阅读进度，entry中必须包含lastReadTime"""
+        key = (user_id, novel_id)
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = entry
+        self.recorded += 1
+        if len(self._pending) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            # 缓冲区过大时提前刷新，不等下一个周期；已有刷新在进行时不重复创建，之后的记录由下次刷新写入
+            self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self, user_id: Optional[str] = None):
+        """把缓冲的记录写入数据库，指定user_id时只写该用户的记录"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if user_id is None:
+                batch, self._pending = self._pending, {}
+            else:
+                batch = {key: self._pending.pop(key) for key in [key for key in self._pending if key[0] == user_id]}
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch: Dict[Tuple[str, str], Dict[str, Any]]):
+        keys = list(batch)
+        operations = []
+        for user_id, novel_id in keys:
+            entry = batch[(user_id, novel_id)]
+            # 只覆盖更旧的记录：多个worker的刷新顺序不确定，已有更新的记录时过滤条件不匹配，
+            # upsert撞上唯一索引后忽略即可
+            operations.append(UpdateOne(
+                {"userId": user_id, "novelId": novel_id, "lastReadTime": {"$lt": entry["lastReadTime"]}},
+                {"$set": entry},
+                upsert=True,
+            ))
+
+        collection = mongodb.get_reading_history_collection()
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            failed = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY]
+            if failed:
+                self.flush_errors += 1
+                logger.error(f"阅读历史写入部分失败: {len(failed)}/{len(operations)}, 首个错误: {failed[0].get('errmsg')}")
+                # 与整批失败一样，失败的记录放回缓冲区等下一个周期重试
+                for error in failed:
+                    key = keys[error["index"]]
+                    self._pending.setdefault(key, batch[key])
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+        except Exception as e:
+            # 写入失败时把记录放回缓冲区（已有更新记录的键除外），等下一个周期重试
+            self.flush_errors += 1
+            logger.error(f"阅读历史写入失败，{len(batch)} 条记录等待重试, 错误: {e}")
+            for key, entry in batch.items():
+                self._pending.setdefault(key, entry)
+            return
+
+        self.flushes += 1
+        self.written += len(operations)
+
+        # 只有新增了记录的用户才可能超出上限
+        await self._trim_users({keys[index][0] for index in upserted})
+
+    async def _trim_users(self, user_ids: Set[str]):
+        """先用一次聚合找出记录数超过max_entries的用户，再并发裁剪这些用户"""
+        if not user_ids:
+            return
+        collection = mongodb.get_reading_history_collection()
+        cursor = collection.aggregate([
+            {"$match": {"userId": {"$in": list(user_ids)}}},
+            {"$group": {"_id": "$userId", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": self.max_entries}}},
+        ])
+        over = [doc["_id"] async for doc in cursor]
+        for start in range(0, len(over), TRIM_CONCURRENCY):
+            await asyncio.gather(*(self._trim(user_id) for user_id in over[start:start + TRIM_CONCURRENCY]))
+
+    async def _trim(self, user_id: str):
+        """删除该用户超出max_entries的旧记录"""
+        collection = mongodb.get_reading_history_collection()
+        cursor = collection.find({"userId": user_id}, {"_id": 1}).sort("lastReadTime", -1).skip(self.max_entries)
+        stale = [doc["_id"] async for doc in cursor]
+        if stale:
+            result = await collection.delete_many({"_id": {"$in": stale}})
+            self.trimmed += result.deleted_count
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # shield：stop()取消任务时不中断正在进行的写入
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                logger.error(f"阅读历史刷新失败: {e}")
+
+    def start(self):
+        """启动后台刷新任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并写出剩余记录，应在关闭数据库连接前调用"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """返回写缓冲统计"""
+        return {
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "trimmed": self.trimmed,
+        }
+
+
+reading_history_buffer = ReadingHistoryBuffer(
+    settings.READING_HISTORY_FLUSH_INTERVAL,
+    settings.READING_HISTORY_MAX_ENTRIES,
+    settings.READING_HISTORY_MAX_PENDING,
+)
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, TypeVar
+from fastapi import HTTPException, Response
+from pymongo.errors import ConnectionFailure, ExecutionTimeout
+from .cache import create_cache, MISSING
+from .config import settings
+from .metrics import register_stats_source
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 视为数据库不可用的错误：服务端maxTimeMS超时、网络超时、连接失败、选不到可用节点、客户端等待超时
+UNAVAILABLE_ERRORS = (ExecutionTimeout, ConnectionFailure, asyncio.TimeoutError)
+
+
+class DatabaseUnavailable(Exception):
+    """断路器断开、查询期限将到或查询超时，由应用统一转换为503"""
+
+
+def parse_route_deadlines(spec: str) -> Dict[str, float]:
+    """解析 "novel_list=800,chapter=500" 形式的按路由查询期限（毫秒），返回秒数"""
+    deadlines = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        route, milliseconds = item.rsplit("=", 1)
+        deadlines[route.strip()] = float(milliseconds) / 1000
+    return deadlines
+
+
+ROUTE_DEADLINES = parse_route_deadlines(settings.ROUTE_DEADLINES_MS)
+
+
+def route_deadline(route: str) -> float:
+    return ROUTE_DEADLINES.get(route, settings.QUERY_DEADLINE_MS / 1000)
+
+
+# 当前请求（或后台刷新任务）的截止时间，time.monotonic()时钟
+_deadline: ContextVar[Optional[float]] = ContextVar("query_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(route: str):
+    """在路由的查询期限内执行，已在更早的期限内时保留更早的期限"""
+    expires_at = time.monotonic() + route_deadline(route)
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """当前期限的剩余秒数，没有期限时返回None"""
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def max_time_ms() -> Optional[int]:
+    """传给查询的maxTimeMS，没有期限时返回None（不限制）"""
+    seconds = remaining()
+    return None if seconds is None else max(1, int(seconds * 1000))
+
+
+def max_time_option() -> Dict[str, int]:
+    """count_documents、aggregate等命令的maxTimeMS参数（这些命令不接受None）"""
+    milliseconds = max_time_ms()
+    return {} if milliseconds is None else {"maxTimeMS": milliseconds}
+
+
+class CircuitBreaker:
+    """
+    数据库断路器
+    - 关闭：正常放行，连续failure_threshold次不可用错误后断开
+    - 断开：直接拒绝，不再占用连接和等待超时；reset_timeout秒后进入半开
+    - 半开：只放行一个探测请求，成功则关闭，失败则重新断开
+    只在事件循环线程中使用，不加锁
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        # 统计信息
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self._probing = False
+        self.failures = 0
+        if self.state != self.CLOSED:
+            logger.info("数据库断路器恢复关闭")
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            if self.state == self.CLOSED:
+                logger.warning(f"数据库连续 {self.failures} 次超时或连接失败，断路器断开")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.opened += 1
+
+    def release(self):
+        """操作被取消、没有结果时释放探测名额"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "open": float(self.state != self.CLOSED),
+            "failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+db_breaker = CircuitBreaker(settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_TIMEOUT)
+register_stats_source("mongo_breaker", db_breaker.stats)
+
+
+async def guarded(operation: Callable[[], Awaitable[T]]) -> T:
+    """
+    经断路器执行一次数据库操作，operation中的查询应传入max_time_ms()
+    客户端最多等到期限后再多等DEADLINE_MARGIN（让服务端的maxTimeMS错误先返回），
+    不可用错误计入断路器并转换为DatabaseUnavailable；其他错误说明数据库有响应，按成功处理
+    """
+    seconds = remaining()
+    margin = settings.DEADLINE_MARGIN_MS / 1000
+    if seconds is not None and seconds < margin:
+        raise DatabaseUnavailable("查询期限将到")
+    if not db_breaker.allow():
+        raise DatabaseUnavailable("数据库断路器已断开")
+    try:
+        if seconds is None:
+            result = await operation()
+        else:
+            result = await asyncio.wait_for(operation(), seconds + margin)
+    except UNAVAILABLE_ERRORS as e:
+        db_breaker.record_failure()
+        raise DatabaseUnavailable(f"数据库操作超时或连接失败: {e!r}") from e
+    except asyncio.CancelledError:
+        db_breaker.release()
+        raise
+    except Exception:
+        db_breaker.record_success()
+        raise
+    db_breaker.record_success()
+    return result
+
+
+class ResponseCache:
+    """
+    可缓存接口的stale-while-revalidate响应缓存
+    - 新鲜（fresh_ttl内且未被失效事件标记）的响应直接返回
+    - 否则在路由期限内重新加载；有旧响应时最多等到期限前DEADLINE_MARGIN，
+      断路器断开、查询超时、期限将到或刷新出错（如分片切换时的OperationFailure）时返回旧响应
+      （响应头 X-Cache-Status: stale）并保留条目，加载在后台继续并更新缓存
+    - 没有旧响应时加载失败原样抛出（DatabaseUnavailable转换为503）
+    - 旧响应最多保留stale_ttl秒；失效事件只把条目标记为过期，旧响应仍可在数据库不可用时使用
+    加载函数抛出的HTTPException（如404）说明数据已不存在，删除缓存的响应并原样抛出
+    """
+
+    def __init__(self, name: str, route: str, maxsize: int = settings.RESPONSE_CACHE_SIZE,
+                 fresh_ttl: float = settings.RESPONSE_CACHE_FRESH_TTL,
+                 stale_ttl: float = settings.RESPONSE_CACHE_STALE_TTL):
+        self.route = route
+        self.fresh_ttl = fresh_ttl
+        # 值为 [加载时间, 响应]，加载时间置0表示已失效
+        self.cache = create_cache(f"response:{name}", maxsize, stale_ttl)
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        # 统计信息
+        self.stale_served = 0
+        self.refresh_failures = 0
+        register_stats_source(f"swr:{name}", self.stats)
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[T]], response: Optional[Response] = None) -> T:
+        entry = self.cache.get(key)
+        if entry is not MISSING and time.monotonic() - entry[0] < self.fresh_ttl:
+            return entry[1]
+        task = self._refresh(key, load)
+        if entry is MISSING:
+            return await asyncio.shield(task)
+
+        wait = route_deadline(self.route) - settings.DEADLINE_MARGIN_MS / 1000
+        done, _ = await asyncio.wait({task}, timeout=max(wait, 0))
+        if task in done and (task.exception() is None or isinstance(task.exception(), HTTPException)):
+            return task.result()
+        self.stale_served += 1
+        if response is not None:
+            response.headers["X-Cache-Status"] = "stale"
+        return entry[1]
+
+    def _refresh(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """同一个键同时只有一个加载任务，任务使用自己的期限，不受发起请求提前返回的影响"""
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, load))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return task
+
+    async def _load(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        with deadline_scope(self.route):
+            try:
+                value = await guarded(load)
+            except HTTPException:
+                self.cache.pop(key)
+                raise
+        self.cache.set(key, [time.monotonic(), value])
+        return value
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        self._refreshing.pop(key, None)
+        # 提前返回旧响应的请求不会读取任务结果，在这里取出异常，避免未读取异常的警告
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None and not isinstance(error, HTTPException):
+            self.refresh_failures += 1
+            if not isinstance(error, DatabaseUnavailable):
+                logger.warning(f"刷新缓存的响应失败: {error!r}")
+
+    def expire(self, keys: Optional[Iterable[Hashable]] = None):
+        """把条目标记为过期（下次请求先尝试刷新），None表示全部条目"""
+        for key in self.cache.keys() if keys is None else keys:
+            entry = self.cache.peek(key)
+            if entry is not MISSING:
+                entry[0] = 0.0
+
+    def expire_where(self, predicate: Callable[[Hashable], bool]):
+        self.expire([key for key in self.cache.keys() if predicate(key)])
+
+    def stats(self) -> Dict[str, float]:
+        return {"stale_served": self.stale_served, "refresh_failures": self.refresh_failures,
+                "refreshing": len(self._refreshing)}
@@ -0,0 +1,25 @@
+from starlette.requests import Request
+
+# 未匹配到任何路由时使用的标签，避免把原始路径（含ID）写进日志和指标
+UNMATCHED_ROUTE = "<unmatched>"
+
+# endpoint函数 -> 路由模板的缓存
+_route_templates = {}
+
+
+def get_route_template(request: Request) -> str:
+    """
+    返回请求匹配到的路由模板，如 /api/novels/{novel_id}
+    必须在路由处理之后调用（中间件中call_next返回后），此时scope里才有endpoint
+    """
+    endpoint = request.scope.get("endpoint")
+    if endpoint is None:
+        return UNMATCHED_ROUTE
+    template = _route_templates.get(endpoint)
+    if template is None:
+        for route in request.app.routes:
+            route_endpoint = getattr(route, "endpoint", None)
+            if route_endpoint is not None:
+                _route_templates[route_endpoint] = route.path
+        template = _route_templates.get(endpoint, UNMATCHED_ROUTE)
+    return template
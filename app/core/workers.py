@@ -0,0 +1,19 @@
+from uvicorn.workers import UvicornWorker
+
+
+class ProductionUvicornWorker(UvicornWorker):
+    """
+    生产环境使用的gunicorn worker
+    固定使用uvloop事件循环和httptools解析器，关闭访问日志和文件监听
+    """
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "access_log": False,
+    }
+
+
+def child_exit(server, worker):
+    """gunicorn钩子：worker退出后清理它在多进程指标目录中的实时数据"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,23 +1,63 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 from ..core.config import settings
+from ..core.metrics import mongo_command_metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 启动时确保存在的索引：集合属性名 -> [(索引键, 选项)]
+# 注意：分片集合上的唯一索引必须以分片键为前缀，users集合依赖username/email唯一索引，应保持不分片
+INDEXES = {
+    "users": [
+        ([("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+    ],
+    "favorites": [
+        ([("userId", ASCENDING), ("novelId", ASCENDING)], {"name": "user_novel_unique", "unique": True}),
+        ([("userId", ASCENDING), ("createTime", DESCENDING)], {"name": "user_create_time"}),
+    ],
+    "reading_history": [
+        ([("userId", ASCENDING), ("novelId", ASCENDING)], {"name": "user_novel_unique", "unique": True}),
+        ([("userId", ASCENDING), ("lastReadTime", DESCENDING)], {"name": "user_last_read_time"}),
+    ],
+}
+
 class MongoDB:
     client: AsyncIOMotorClient = None
     db = None
     novels = None
     users = None
+    favorites = None
+    reading_history = None
 
     async def connect_to_database(self):
         """连接到MongoDB数据库"""
         logger.info("连接到MongoDB...")
-        self.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        self.client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[mongo_command_metrics])
         self.db = self.client[settings.DATABASE_NAME]
         self.novels = self.db[settings.NOVELS_COLLECTION]
         self.users = self.db[settings.USERS_COLLECTION]
+        self.favorites = self.db[settings.FAVORITES_COLLECTION]
+        self.reading_history = self.db[settings.READING_HISTORY_COLLECTION]
         logger.info("连接到MongoDB成功")
+        await self.ensure_indexes()
+
+    async def ensure_indexes(self):
+        """
+        创建INDEXES中声明的索引，已存在时为空操作
+        注册和收藏依赖唯一索引防止重复，唯一索引建不起来（通常是已有重复数据）时抛出异常使启动失败
+        """
+        for attr, indexes in INDEXES.items():
+            collection = getattr(self, attr)
+            for keys, options in indexes:
+                try:
+                    await collection.create_index(keys, **options)
+                except OperationFailure as e:
+                    logger.error(f"创建索引失败: {collection.name}.{options['name']}, 错误: {e}")
+                    if options.get("unique"):
+                        raise
 
     async def close_database_connection(self):
         """关闭MongoDB连接"""
@@ -34,5 +74,13 @@ class MongoDB:
         """获取用户集合"""
         return self.users
 
+    def get_favorite_collection(self):
+        """获取收藏集合"""
+        return self.favorites
+
+    def get_reading_history_collection(self):
+        """获取阅读历史集合"""
+        return self.reading_history
+
 
 mongodb = MongoDB() 
\ No newline at end of file
@@ -1,19 +1,24 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+import asyncio
 import logging
 import time
 from .core.config import settings
+from .core.access_log import setup_logging, access_logger
+from .core.routing import get_route_template
+from .core import metrics
+from .core.profiling import ProfilingMiddleware
+from .core.auth import password_hasher
+from .core.reading_history import reading_history_buffer
+from .core.invalidation import invalidation_listener
+from .core.resilience import DatabaseUnavailable
 from .database.mongodb import mongodb
 from .api import novels
 from .api.users import router as users_router  # 直接导入用户路由
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# 配置日志（经队列由后台线程写出）
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -34,22 +39,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按需剖析单个请求（默认关闭，关闭时不挂载）
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # 添加请求处理时间中间件
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    # 添加日志记录请求路径
-    logger.info(f"收到请求: {request.method} {request.url.path}")
-    
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
+    start_time = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+    except Exception:
+        # 未处理的异常由外层中间件转成500，这里只补一条访问日志和指标
+        process_time = time.perf_counter() - start_time
+        route = get_route_template(request)
+        access_logger.log(request, route, 500, process_time)
+        metrics.observe_request(request.method, route, 500, process_time)
+        raise
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+    process_time = time.perf_counter() - start_time
     response.headers["X-Process-Time"] = str(process_time)
-    
-    # 添加日志记录响应状态码
-    logger.info(f"响应状态码: {response.status_code}")
-    
+
+    # 每个请求只记录一条结构化访问日志，并按路由模板记录耗时
+    route = get_route_template(request)
+    access_logger.log(request, route, response.status_code, process_time)
+    metrics.observe_request(request.method, route, response.status_code, process_time)
+
     return response
 
+# 数据库断路器断开或查询超时，且没有可返回的旧响应
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    logger.warning(f"数据库不可用: {request.url.path}, 原因: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "服务繁忙，请稍后重试"}, headers={"Retry-After": "1"})
+
 # 启动事件
 @app.on_event("startup")
 async def startup_db_client():
@@ -59,9 +84,23 @@ async def startup_db_client():
     for route in app.routes:
         logger.info(f"路由: {route.path} - 方法: {route.methods}")
 
+# 启动运行时指标采集（事件循环延迟、组件统计）
+@app.on_event("startup")
+async def start_runtime_metrics():
+    metrics.register_stats_source("access_log", access_logger.stats)
+    app.state.runtime_metrics_task = asyncio.create_task(metrics.monitor_runtime())
+    reading_history_buffer.start()
+    # 接收变更流消费进程发布的缓存失效事件
+    invalidation_listener.start()
+
 # 关闭事件
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.runtime_metrics_task.cancel()
+    await invalidation_listener.stop()
+    password_hasher.shutdown()
+    # 先写出缓冲的阅读历史，再关闭数据库连接
+    await reading_history_buffer.stop()
     await mongodb.close_database_connection()
 
 # 注册路由
@@ -77,4 +116,10 @@ async def root():
 # 健康检查
 @app.get("/health")
 async def health():
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok"} 
+
+# Prometheus指标
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    content, content_type = metrics.render_metrics()
+    return Response(content=content, media_type=content_type)
\ No newline at end of file
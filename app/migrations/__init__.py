@@ -0,0 +1,37 @@
+"""
+在线文档结构迁移
+
+每个迁移是一个带版本号的Migration子类，按版本号顺序执行：
+- 运行器按_id范围分批扫描、限速写回，检查点保存在migrations集合，中断后继续
+- 写回带并发修改检测，不会覆盖爬虫或API在迁移期间的写入
+- 迁移期间新旧结构共存，读取端必须兼容两种结构（如 app.core.compression.chapter_content）
+- 支持试运行（dry-run）和迁移后的抽样校验（verify）
+
+用法:
+    python -m app.migrations status
+    python -m app.migrations run --dry-run
+    python -m app.migrations run --version 1 --batch-size 200 --rate 500 --pause-factor 1
+    python -m app.migrations verify --sample 2000
+
+新增迁移：在本目录添加 mNNNN_<name>.py，实现Migration子类并加入下面的MIGRATIONS
+"""
+from typing import List
+from .base import SCHEMA_VERSION_FIELD, Migration
+from .m0001_compress_chapter_content import CompressChapterContent
+from .runner import MigrationRunner, Throttle
+
+MIGRATIONS: List[Migration] = sorted([
+    CompressChapterContent(),
+], key=lambda migration: migration.version)
+
+assert len({migration.version for migration in MIGRATIONS}) == len(MIGRATIONS), "迁移版本号重复"
+
+
+def get_migrations(version: int = 0) -> List[Migration]:
+    """指定版本时只返回该版本的迁移，否则返回全部"""
+    if not version:
+        return list(MIGRATIONS)
+    selected = [migration for migration in MIGRATIONS if migration.version == version]
+    if not selected:
+        raise ValueError(f"不存在版本为 {version} 的迁移")
+    return selected
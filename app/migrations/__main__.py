@@ -0,0 +1,51 @@
+import argparse
+import json
+import logging
+import sys
+from pymongo import MongoClient
+from ..core.config import settings
+from . import MigrationRunner, Throttle, get_migrations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m app.migrations", description="在线文档结构迁移")
+    parser.add_argument("command", choices=["status", "run", "verify"])
+    parser.add_argument("--version", type=int, default=0, help="只处理该版本的迁移，默认按顺序处理全部")
+    parser.add_argument("--mongodb-url", default=settings.MONGODB_URL)
+    parser.add_argument("--database", default=settings.DATABASE_NAME)
+    parser.add_argument("--batch-size", type=int, default=500, help="每批扫描和写回的文档数")
+    parser.add_argument("--rate", type=float, default=0, help="每秒最多处理的文档数，0表示不限制")
+    parser.add_argument("--pause-factor", type=float, default=0.5, help="每批写入后额外休眠 写入耗时×该系数")
+    parser.add_argument("--max-passes", type=int, default=3, help="有冲突的文档最多重新扫描的轮数")
+    parser.add_argument("--dry-run", action="store_true", help="只读取和生成更新，不写入")
+    parser.add_argument("--restart", action="store_true", help="忽略检查点，从头扫描")
+    parser.add_argument("--sample", type=int, default=1000, help="verify抽样检查的文档数")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    client = MongoClient(args.mongodb_url)
+    runner = MigrationRunner(client[args.database], args.batch_size, Throttle(args.rate, args.pause_factor),
+                             args.max_passes)
+    failed = False
+    try:
+        for migration in get_migrations(args.version):
+            if args.command == "status":
+                result = runner.status(migration)
+            elif args.command == "run":
+                result = {"migration": str(migration), "counts": runner.run(migration, args.dry_run, args.restart)}
+            else:
+                result = runner.verify(migration, args.sample)
+                failed = failed or bool(result["remaining"] or result["problems"])
+                result["problems"] = result["problems"][:20]
+            print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        client.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
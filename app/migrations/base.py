@@ -0,0 +1,41 @@
+from typing import Any, Dict, List, Optional
+
+# 文档结构版本字段：迁移完成的文档写入对应的版本号
+SCHEMA_VERSION_FIELD = "schemaVersion"
+
+
+class Migration:
+    """
+    一个版本化的文档迁移，子类需要设置version、name、collection并实现migrate
+    运行器按_id顺序分批读取尚未迁移的文档（schemaVersion小于version或不存在），
+    对每个文档调用migrate生成更新，附加 schemaVersion=version 后写回。
+    写回时的过滤条件包含guard(doc)：读取之后文档被其他进程（爬虫、API）修改过时更新不生效，
+    该文档保持未迁移状态，在下一轮扫描中重新处理，不会覆盖并发写入。
+    迁移期间应用必须能同时读取新旧两种结构
+    """
+
+    version: int = 0
+    name: str = ""
+    collection: str = ""
+    description: str = ""
+    # migrate需要读取的字段，None表示整个文档
+    projection: Optional[Dict[str, Any]] = None
+
+    def pending_filter(self) -> Dict[str, Any]:
+        """尚未迁移的文档"""
+        return {SCHEMA_VERSION_FIELD: {"$not": {"$gte": self.version}}}
+
+    def migrate(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """返回更新文档（可以为空，只更新版本号）"""
+        raise NotImplementedError
+
+    def guard(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """写回时附加的过滤条件，用于检测读取后的并发修改"""
+        return {}
+
+    def verify(self, doc: Dict[str, Any]) -> List[str]:
+        """检查一个已迁移的文档，返回发现的问题"""
+        return []
+
+    def __str__(self):
+        return f"{self.version:04d}_{self.name}"
@@ -0,0 +1,57 @@
+import zlib
+from typing import Any, Dict, List
+from bson import Binary
+from ..core.compression import COMPRESSED_CONTENT_FIELD, compress_text, decompress_text
+from .base import Migration
+
+
+class CompressChapterContent(Migration):
+    """
+    章节正文zlib压缩后存入contentZ并删除content
+    详情页和章节页都会读取整个小说文档，压缩后文档体积约减半，WiredTiger缓存能容纳更多小说，网络传输也更少。
+    读取端用 app.core.compression.chapter_content 兼容两种结构；爬虫仍写入明文content，
+    因此迁移后新增的章节是明文的，再次运行本迁移不会处理它们（文档已是新版本），两种结构会长期共存
+    """
+
+    version = 1
+    name = "compress_chapter_content"
+    collection = "novels"
+    description = "章节正文压缩存储到contentZ"
+    projection = {"chapters": 1, "crawl.lastSyncTime": 1}
+    # 太短的正文压缩后反而更大
+    min_bytes = 256
+
+    def migrate(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        set_fields = {}
+        unset_fields = {}
+        for index, chapter in enumerate(doc.get("chapters", [])):
+            content = chapter.get("content")
+            if not isinstance(content, str) or len(content.encode("utf-8")) < self.min_bytes:
+                continue
+            set_fields[f"chapters.{index}.{COMPRESSED_CONTENT_FIELD}"] = Binary(compress_text(content))
+            unset_fields[f"chapters.{index}.content"] = ""
+        if not set_fields:
+            return {}
+        return {"$set": set_fields, "$unset": unset_fields}
+
+    def guard(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        # 爬虫每次同步都会更新crawl.lastSyncTime，并发追加章节还会改变数组长度
+        return {
+            "chapters": {"$size": len(doc.get("chapters", []))},
+            "crawl.lastSyncTime": doc.get("crawl", {}).get("lastSyncTime"),
+        }
+
+    def verify(self, doc: Dict[str, Any]) -> List[str]:
+        problems = []
+        for chapter in doc.get("chapters", []):
+            data = chapter.get(COMPRESSED_CONTENT_FIELD)
+            if data is None:
+                continue
+            try:
+                content = decompress_text(data)
+            except (zlib.error, UnicodeDecodeError) as e:
+                problems.append(f"{chapter.get('chapterId')}: 压缩正文无法解码: {e}")
+                continue
+            if "wordCount" in chapter and len(content) != chapter["wordCount"]:
+                problems.append(f"{chapter.get('chapterId')}: 字数 {len(content)} 与wordCount {chapter['wordCount']} 不一致")
+        return problems
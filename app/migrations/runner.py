@@ -0,0 +1,175 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from bson import MinKey
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .base import SCHEMA_VERSION_FIELD, Migration
+
+logger = logging.getLogger(__name__)
+
+# 迁移状态
+RUNNING = "running"
+DONE = "done"
+
+
+class Throttle:
+    """
+    限制迁移对线上集群的压力
+    - rate: 每秒最多处理的文档数，0表示不限制
+    - pause_factor: 每批写入后额外休眠 写入耗时×pause_factor，集群变慢时迁移自动放慢
+    """
+
+    def __init__(self, rate: float = 0, pause_factor: float = 0):
+        self.rate = rate
+        self.pause_factor = pause_factor
+        self.slept = 0.0
+
+    def wait(self, documents: int, elapsed: float, write_seconds: float):
+        delay = write_seconds * self.pause_factor
+        if self.rate > 0:
+            delay = max(delay, documents / self.rate - elapsed)
+        if delay > 0:
+            time.sleep(delay)
+            self.slept += delay
+
+
+class MigrationRunner:
+    """
+    在线运行迁移：按_id范围分批扫描尚未迁移的文档，逐批无序写回，不锁集合、不停服务
+    - 每批写完后把最后一个_id作为检查点保存在migrations集合，中断后从检查点继续
+    - 写回时被guard拦下（文档在读取后被并发修改）的文档记为冲突，扫描到末尾后从头再扫一轮，
+      只会读到仍未迁移的文档，直到没有冲突或达到max_passes
+    - dry_run只读取和生成更新，不写入任何数据（包括检查点）
+    每批都是一次独立的范围查询，不依赖长时间打开的游标，分片集群上chunk迁移时也能正常继续
+    """
+
+    def __init__(self, db, batch_size: int = 500, throttle: Optional[Throttle] = None, max_passes: int = 3,
+                 state_collection: str = "migrations"):
+        self.db = db
+        self.batch_size = batch_size
+        self.throttle = throttle or Throttle()
+        self.max_passes = max_passes
+        self.state = db[state_collection]
+
+    def status(self, migration: Migration) -> Dict[str, Any]:
+        """迁移的保存状态和仍未迁移的文档数"""
+        state = self.state.find_one({"_id": migration.version}) or {}
+        return {
+            "migration": str(migration),
+            "state": state.get("state", "pending"),
+            "counts": state.get("counts", {}),
+            "remaining": self.db[migration.collection].count_documents(migration.pending_filter()),
+        }
+
+    def run(self, migration: Migration, dry_run: bool = False, restart: bool = False) -> Dict[str, int]:
+        collection = self.db[migration.collection]
+        state = None if dry_run or restart else self.state.find_one({"_id": migration.version})
+        if state and state.get("state") == DONE:
+            logger.info(f"迁移 {migration} 已完成，跳过")
+            return state.get("counts", {})
+        counts = dict(state["counts"]) if state else {"scanned": 0, "migrated": 0, "conflicts": 0}
+        last_id = state["lastId"] if state else MinKey()
+        current_pass = state.get("pass", 1) if state else 1
+        if state:
+            logger.info(f"迁移 {migration} 从检查点继续: 第 {current_pass} 轮, _id > {last_id}")
+        elif not dry_run:
+            self._save(migration, RUNNING, MinKey(), 1, counts, started=True)
+
+        while True:
+            pass_conflicts = 0
+            while True:
+                started = time.perf_counter()
+                query = {"_id": {"$gt": last_id}, **migration.pending_filter()}
+                batch = list(collection.find(query, migration.projection).sort("_id", 1).limit(self.batch_size))
+                if not batch:
+                    break
+                operations = self._build_operations(migration, batch)
+                if dry_run and counts["scanned"] == 0:
+                    preview = {op: sorted(fields)[:10] for op, fields in migration.migrate(batch[0]).items()}
+                    logger.info(f"试运行 {migration}，第一个文档 {batch[0]['_id']} 的更新字段: {preview}")
+                write_started = time.perf_counter()
+                matched = len(operations) if dry_run else self._write(collection, operations)
+                write_seconds = time.perf_counter() - write_started
+
+                conflicts = len(operations) - matched
+                counts["scanned"] += len(batch)
+                counts["migrated"] += matched
+                counts["conflicts"] += conflicts
+                pass_conflicts += conflicts
+                last_id = batch[-1]["_id"]
+                if not dry_run:
+                    self._save(migration, RUNNING, last_id, current_pass, counts)
+                self.throttle.wait(len(batch), time.perf_counter() - started, write_seconds)
+            logger.info(f"迁移 {migration} 第 {current_pass} 轮完成: {counts}")
+
+            if dry_run or pass_conflicts == 0 or current_pass >= self.max_passes:
+                break
+            current_pass += 1
+            last_id = MinKey()
+            if not dry_run:
+                self._save(migration, RUNNING, last_id, current_pass, counts)
+
+        if not dry_run:
+            if pass_conflicts:
+                # 下次运行从头扫描剩下的冲突文档
+                self._save(migration, RUNNING, MinKey(), current_pass + 1, counts)
+                logger.warning(f"迁移 {migration} 在 {current_pass} 轮后仍有冲突的文档，请重新运行")
+            else:
+                self._save(migration, DONE, last_id, current_pass, counts, finished=True)
+            remaining = collection.count_documents(migration.pending_filter())
+            if remaining:
+                # 迁移期间新写入的文档仍是旧结构，由兼容读取处理，需要时用restart重新运行
+                logger.info(f"迁移 {migration} 完成后又有 {remaining} 个旧结构的文档")
+        return counts
+
+    def _build_operations(self, migration: Migration, batch: List[Dict[str, Any]]) -> List[UpdateOne]:
+        operations = []
+        for doc in batch:
+            update = {key: dict(value) for key, value in migration.migrate(doc).items()}
+            update.setdefault("$set", {})[SCHEMA_VERSION_FIELD] = migration.version
+            query = {"_id": doc["_id"], **migration.pending_filter(), **migration.guard(doc)}
+            operations.append(UpdateOne(query, update))
+        return operations
+
+    def _write(self, collection, operations: List[UpdateOne]) -> int:
+        """无序批量写回，返回匹配（成功迁移）的文档数"""
+        try:
+            return collection.bulk_write(operations, ordered=False).matched_count
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", [])[:5]:
+                logger.error(f"迁移写入失败: {error.get('errmsg')}")
+            return e.details.get("nMatched", 0)
+
+    def _save(self, migration: Migration, state: str, last_id: Any, current_pass: int, counts: Dict[str, int],
+              started: bool = False, finished: bool = False):
+        fields = {
+            "name": migration.name,
+            "collection": migration.collection,
+            "state": state,
+            "lastId": last_id,
+            "pass": current_pass,
+            "counts": counts,
+            "updateTime": datetime.utcnow(),
+        }
+        if started:
+            fields["startTime"] = fields["updateTime"]
+        if finished:
+            fields["finishTime"] = fields["updateTime"]
+        self.state.update_one({"_id": migration.version}, {"$set": fields}, upsert=True)
+
+    def verify(self, migration: Migration, sample: int = 1000) -> Dict[str, Any]:
+        """检查是否还有未迁移的文档，并抽样检查已迁移的文档"""
+        collection = self.db[migration.collection]
+        remaining = collection.count_documents(migration.pending_filter())
+        problems = []
+        checked = 0
+        cursor = collection.aggregate([
+            {"$match": {SCHEMA_VERSION_FIELD: {"$gte": migration.version}}},
+            {"$sample": {"size": sample}},
+        ])
+        for doc in cursor:
+            checked += 1
+            problems += [f"{doc['_id']}: {problem}" for problem in migration.verify(doc)]
+        return {"migration": str(migration), "remaining": remaining, "checked": checked, "problems": problems}
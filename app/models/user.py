@@ -65,6 +65,7 @@ class UserInDB(UserBase):
     readingHistory: List[str] = Field(default_factory=list)
     roles: List[str] = Field(default_factory=lambda: ["user"])
     isActive: bool = True
+    tokenVersion: int = 0  # 令牌版本，退出登录等操作递增后，旧令牌全部失效
     
     model_config = ConfigDict(
         populate_by_name=True,
@@ -86,8 +87,9 @@ class User(BaseModel):
     avatar: Optional[str] = ""
     createTime: datetime
     lastLoginTime: Optional[datetime] = None
-    favoriteNovels: List[str] = Field(default_factory=list)
-    readingHistory: List[str] = Field(default_factory=list)
+    # 收藏和阅读历史只返回数量，列表通过分页接口获取
+    favoriteCount: int = 0
+    readingHistoryCount: int = 0
     roles: List[str]
     isActive: bool = True
     
@@ -97,8 +99,60 @@ class User(BaseModel):
         json_encoders={ObjectId: str}
     )
 
+class Principal(BaseModel):
+    """
+    鉴权使用的精简用户信息
+    只包含授权判断需要的字段，由get_current_user短期缓存，避免每个请求读取并解析完整的用户文档
+    """
+    id: str
+    username: str
+    roles: List[str] = Field(default_factory=lambda: ["user"])
+    isActive: bool = True
+    tokenVersion: int = 0
+
+class ReadingHistoryCreate(BaseModel):
+    """
+    阅读器上报的阅读进度
+    """
+    novelId: str
+    chapterId: str
+    title: Optional[str] = None
+    author: Optional[str] = None
+    chapterTitle: Optional[str] = None
+    coverImage: Optional[str] = None
+    scrollPosition: float = Field(0.0, ge=0.0, le=1.0, description="章节内的阅读位置，0为开头，1为末尾")
+
+class ReadingHistoryItem(ReadingHistoryCreate):
+    """
+    返回给客户端的阅读历史记录
+    """
+    lastReadTime: datetime
+
+class ReadingHistoryListResponse(BaseModel):
+    total: int
+    page: int
+    limit: int
+    history: List[ReadingHistoryItem]
+
+class FavoriteItem(BaseModel):
+    """
+    返回给客户端的收藏记录，小说信息取自novels集合
+    """
+    novelId: str
+    title: Optional[str] = None
+    author: Optional[str] = None
+    coverImage: Optional[str] = None
+    favoriteTime: datetime
+
+class FavoriteListResponse(BaseModel):
+    total: int
+    page: int
+    limit: int
+    favorites: List[FavoriteItem]
+
 class TokenData(BaseModel):
     username: Optional[str] = None
+    version: int = 0
     
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,22 @@
+import pytest
+from pymongo import MongoClient
+from benchmarks.local_mongod import LocalMongod
+
+
+@pytest.fixture(scope="session")
+def mongod():
+    """临时启动的本地mongod，本机没有mongod时跳过需要数据库的测试"""
+    if not LocalMongod.available():
+        pytest.skip("找不到mongod，跳过需要数据库的测试")
+    with LocalMongod() as server:
+        yield server
+
+
+@pytest.fixture
+def mongo_db(mongod):
+    client = MongoClient(mongod.url)
+    client.drop_database("app_test")
+    try:
+        yield client["app_test"]
+    finally:
+        client.close()
@@ -0,0 +1,66 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import CollectionInvalid
+from app.api import users
+from app.core import invalidation
+from app.core.auth import create_access_token, get_current_user, principal_cache
+from app.database.mongodb import mongodb
+
+
+class FakeUsers:
+    """只有一个用户的用户集合"""
+
+    def __init__(self):
+        self.user = {"_id": ObjectId(), "username": "reader", "roles": ["user"], "isActive": True, "tokenVersion": 0}
+
+    async def find_one(self, query, projection=None):
+        return dict(self.user) if query.get("username") == self.user["username"] else None
+
+    async def update_one(self, query, update):
+        self.user["tokenVersion"] += update["$inc"]["tokenVersion"]
+
+
+class FakeEvents:
+    def __init__(self):
+        self.events = []
+
+    async def insert_one(self, document):
+        document["_id"] = ObjectId()
+        self.events.append(document)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.invalidations = FakeEvents()
+
+    async def create_collection(self, name, **options):
+        raise CollectionInvalid(f"collection {name} already exists")
+
+    def __getitem__(self, name):
+        return self.invalidations
+
+
+@pytest.mark.asyncio
+async def test_logout_invalidates_cached_principal_on_other_workers(monkeypatch):
+    fake_users, fake_db = FakeUsers(), FakeDatabase()
+    monkeypatch.setattr(mongodb, "users", fake_users)
+    monkeypatch.setattr(mongodb, "db", fake_db)
+    principal_cache.clear()
+    token = create_access_token({"sub": "reader", "ver": 0})
+
+    principal = await get_current_user(token)
+    await users.logout(principal)
+    # 本worker立即失效
+    with pytest.raises(HTTPException):
+        await get_current_user(token)
+
+    # 另一个worker的缓存里还有旧令牌对应的用户，收到失效事件后同样拒绝
+    principal_cache.set(("reader", 0), principal)
+    assert await get_current_user(token) is principal
+    [event] = fake_db.invalidations.events
+    assert event["topic"] == invalidation.PRINCIPALS and event["keys"] == ["reader"]
+    invalidation.InvalidationListener(poll_interval=1).apply(event)
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_user(token)
+    assert excinfo.value.status_code == 401
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from bson import ObjectId
+from app.changefeed import classify, search_index_terms, search_terms
+from app.changefeed.consumer import CHAPTERS, DELETED, STATS, SUMMARY
+from app.changefeed.derived import build_index_entry
+from app.core import invalidation
+from app.core.cache import TTLCache, MISSING
+
+
+def update_event(*fields):
+    return {"operationType": "update", "documentKey": {"_id": ObjectId()}, "changedFields": list(fields)}
+
+
+def test_classify_change_events():
+    assert classify(update_event("meta.readCount")) == {STATS}
+    assert classify(update_event("chapters.3.content", "updateTime", "crawl.lastSyncTime")) == {CHAPTERS, SUMMARY}
+    assert classify(update_event("comments", "meta.commentCount")) == {SUMMARY}
+    assert classify(update_event("crawl.etag")) == set()
+    assert classify({"operationType": "delete", "documentKey": {"_id": ObjectId()}}) == {DELETED}
+
+
+def test_search_terms_cover_substrings():
+    entry = build_index_entry({"_id": ObjectId(), "title": "斗破苍穹", "author": "天蚕土豆", "tags": ["玄幻"],
+                               "meta": {"readCount": 3}, "duplicateOf": "x"})
+    assert entry["duplicate"] and entry["readCount"] == 3
+    assert set(search_index_terms("破苍穹")) <= set(entry["terms"])
+    assert search_terms("AB") == ["ab"]
+    # 太短或包含正则语法的关键词不能使用索引
+    assert search_index_terms("斗") is None and search_index_terms("斗.苍") is None
+
+
+def test_listener_clears_all_subscribed_caches_on_gap(monkeypatch):
+    # 测试的订阅只登记在替换的表里，不会留给之后的测试
+    monkeypatch.setattr(invalidation, "_subscribers", defaultdict(list))
+    novels, tags = TTLCache("novels", 10, 60), TTLCache("tags", 10, 60)
+    invalidation.subscribe("test_novels", invalidation.cache_invalidator(novels))
+    invalidation.subscribe("test_tags", invalidation.cache_invalidator(tags))
+    novels.set("a", 1)
+    novels.set("b", 2)
+    tags.set("tags", ["玄幻"])
+    listener = invalidation.InvalidationListener(poll_interval=1)
+
+    listener.apply({"_id": ObjectId(), "seq": 1, "topic": "test_novels", "keys": ["a"]})
+    assert novels.get("a") is MISSING and novels.get("b") == 2 and tags.get("tags") == ["玄幻"]
+
+    listener.apply({"_id": ObjectId(), "seq": 3, "topic": "test_novels", "keys": ["b"]})
+    assert listener.gaps == 1 and len(novels) == 0 and len(tags) == 0
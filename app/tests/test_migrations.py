@@ -0,0 +1,122 @@
+import pytest
+from bson import ObjectId
+from app.core.compression import chapter_content
+from app.migrations import MIGRATIONS, Migration, MigrationRunner, Throttle, get_migrations
+from app.migrations.m0001_compress_chapter_content import CompressChapterContent
+
+
+def test_compress_chapter_content_roundtrip():
+    migration = CompressChapterContent()
+    long_text = "长安城的晨鼓刚刚敲过。" * 50
+    doc = {
+        "_id": ObjectId(),
+        "chapters": [
+            {"chapterId": "ch_001", "content": long_text, "wordCount": len(long_text)},
+            {"chapterId": "ch_002", "content": "短章", "wordCount": 2},
+        ],
+        "crawl": {"lastSyncTime": None},
+    }
+    update = migration.migrate(doc)
+    assert list(update["$unset"]) == ["chapters.0.content"]
+    assert migration.guard(doc) == {"chapters": {"$size": 2}, "crawl.lastSyncTime": None}
+
+    # 迁移后的章节和未迁移的章节都能读取
+    migrated = {"chapterId": "ch_001", "contentZ": update["$set"]["chapters.0.contentZ"], "wordCount": len(long_text)}
+    assert chapter_content(migrated) == long_text
+    assert chapter_content(doc["chapters"][1]) == "短章"
+    assert migration.verify({"chapters": [migrated, doc["chapters"][1]]}) == []
+    assert migration.verify({"chapters": [dict(migrated, wordCount=1)]})
+
+
+def test_migrations_are_ordered():
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == sorted(versions) and get_migrations(1)[0].version == 1
+
+
+class MarkItems(Migration):
+    """测试用迁移：给文档加上migrated标记；racing中的文档每次被读取后都被“并发修改”一次"""
+
+    version = 1
+    name = "mark_items"
+    collection = "items"
+
+    def __init__(self, db, racing=None):
+        self.db = db
+        self.racing = dict(racing or {})
+
+    def migrate(self, doc):
+        if self.racing.get(doc["_id"], 0) > 0:
+            self.racing[doc["_id"]] -= 1
+            self.db.items.update_one({"_id": doc["_id"]}, {"$inc": {"rev": 1}})
+        return {"$set": {"migrated": True}}
+
+    def guard(self, doc):
+        return {"rev": doc["rev"]}
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptAfter(Throttle):
+    """写完指定批数后中断迁移"""
+
+    def __init__(self, batches):
+        super().__init__()
+        self.batches = batches
+
+    def wait(self, documents, elapsed, write_seconds):
+        self.batches -= 1
+        if self.batches == 0:
+            raise Interrupted()
+
+
+def insert_items(db, count=10):
+    db.items.insert_many([{"_id": index, "rev": 0} for index in range(1, count + 1)])
+
+
+def test_runner_resumes_from_checkpoint(mongo_db):
+    insert_items(mongo_db)
+    migration = MarkItems(mongo_db)
+    with pytest.raises(Interrupted):
+        MigrationRunner(mongo_db, batch_size=3, throttle=InterruptAfter(2)).run(migration)
+    state = mongo_db.migrations.find_one({"_id": 1})
+    assert state["state"] == "running" and state["lastId"] == 6 and state["counts"]["migrated"] == 6
+
+    # 检查点之前的文档不再扫描：把第2个文档恢复成未迁移，继续运行后它仍未迁移
+    mongo_db.items.update_one({"_id": 2}, {"$unset": {"schemaVersion": ""}})
+    counts = MigrationRunner(mongo_db, batch_size=3).run(migration)
+    assert counts == {"scanned": 10, "migrated": 10, "conflicts": 0}
+    assert mongo_db.migrations.find_one({"_id": 1})["state"] == "done"
+    assert [doc["_id"] for doc in mongo_db.items.find(migration.pending_filter())] == [2]
+
+
+def test_runner_rescans_conflicts(mongo_db):
+    insert_items(mongo_db)
+    migration = MarkItems(mongo_db, racing={4: 1})
+    counts = MigrationRunner(mongo_db, batch_size=3).run(migration)
+    # 第4个文档在读取后被修改，写回不生效，第二轮重新读取后迁移成功
+    assert counts == {"scanned": 11, "migrated": 10, "conflicts": 1}
+    state = mongo_db.migrations.find_one({"_id": 1})
+    assert state["state"] == "done" and state["pass"] == 2
+    assert mongo_db.items.count_documents({"migrated": True, "schemaVersion": 1}) == 10
+    assert mongo_db.items.find_one({"_id": 4})["rev"] == 1
+
+
+def test_runner_stops_after_max_passes(mongo_db):
+    insert_items(mongo_db)
+    migration = MarkItems(mongo_db, racing={4: 5})
+    counts = MigrationRunner(mongo_db, batch_size=3, max_passes=2).run(migration)
+    assert counts == {"scanned": 11, "migrated": 9, "conflicts": 2}
+    # 仍有冲突：保存为未完成，下次运行从头扫描剩下的文档
+    state = mongo_db.migrations.find_one({"_id": 1})
+    assert state["state"] == "running" and state["pass"] == 3
+    assert [doc["_id"] for doc in mongo_db.items.find(migration.pending_filter())] == [4]
+
+
+def test_dry_run_writes_nothing(mongo_db):
+    insert_items(mongo_db)
+    counts = MigrationRunner(mongo_db, batch_size=3).run(MarkItems(mongo_db), dry_run=True)
+    assert counts == {"scanned": 10, "migrated": 10, "conflicts": 0}
+    assert mongo_db.migrations.count_documents({}) == 0
+    assert mongo_db.items.count_documents({"migrated": True}) == 0
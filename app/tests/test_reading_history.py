@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.core.reading_history import ReadingHistoryBuffer
+from app.database.mongodb import mongodb
+
+
+@pytest.mark.asyncio
+async def test_record_keeps_single_pending_flush(monkeypatch):
+    buffer = ReadingHistoryBuffer(flush_interval=60, max_entries=10, max_pending=2)
+    batches = []
+
+    async def write(batch):
+        await asyncio.sleep(0.01)
+        batches.append(batch)
+
+    monkeypatch.setattr(buffer, "_write", write)
+    for index in range(20):
+        buffer.record("user", f"novel{index}", {"lastReadTime": datetime.utcnow()})
+    first = buffer._flush_task
+    assert first is not None
+    await first
+    # 一连串超过阈值的记录只触发一次提前刷新，刷新时写入已缓冲的全部记录
+    assert len(batches) == 1 and len(batches[0]) == 20
+
+    buffer.record("user", "novel20", {"lastReadTime": datetime.utcnow()})
+    buffer.record("user", "novel21", {"lastReadTime": datetime.utcnow()})
+    assert buffer._flush_task is not first
+    await buffer._flush_task
+    assert len(batches) == 2
+
+
+class FakeHistory:
+    """第一条写入失败、第二条新增记录的阅读历史集合，u2的记录数超过上限"""
+
+    def __init__(self):
+        self.trimmed_users = []
+
+    async def bulk_write(self, operations, ordered=True):
+        raise BulkWriteError({
+            "writeErrors": [{"index": 0, "code": 2, "errmsg": "bad value"}],
+            "upserted": [{"index": 1, "_id": ObjectId()}],
+        })
+
+    async def _over_limit(self):
+        yield {"_id": "u2", "count": 11}
+
+    def aggregate(self, pipeline):
+        return self._over_limit()
+
+    def find(self, query, projection):
+        self.trimmed_users.append(query["userId"])
+        return EmptyCursor()
+
+
+class EmptyCursor:
+    def sort(self, *args):
+        return self
+
+    def skip(self, count):
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+@pytest.mark.asyncio
+async def test_failed_rows_are_requeued_and_only_users_over_limit_trimmed(monkeypatch):
+    buffer = ReadingHistoryBuffer(flush_interval=60, max_entries=10, max_pending=100)
+    history = FakeHistory()
+    monkeypatch.setattr(mongodb, "reading_history", history)
+    buffer.record("u1", "n1", {"lastReadTime": datetime.utcnow()})
+    buffer.record("u2", "n2", {"lastReadTime": datetime.utcnow()})
+    await buffer.flush()
+    assert list(buffer._pending) == [("u1", "n1")] and buffer.flush_errors == 1
+    assert history.trimmed_users == ["u2"]
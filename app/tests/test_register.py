@@ -0,0 +1,54 @@
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from app.api import users
+from app.database.mongodb import mongodb
+from app.models.user import UserCreate
+
+
+class DuplicateUsers:
+    """insert_one总是报告指定唯一索引冲突的用户集合"""
+
+    def __init__(self, index: str, field: str):
+        self.error = DuplicateKeyError(
+            f"E11000 duplicate key error collection: test.users index: {index}",
+            11000,
+            {"errmsg": f"E11000 duplicate key error index: {index}", "keyPattern": {field: 1}, "keyValue": {field: "x"}},
+        )
+
+    async def insert_one(self, document):
+        raise self.error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("index, field, detail", [
+    ("email_unique", "email", "邮箱已被注册"),
+    ("username_unique", "username", "用户名已存在"),
+])
+async def test_register_duplicate_user(monkeypatch, index, field, detail):
+    async def fast_hash(password):
+        return "hashed"
+
+    monkeypatch.setattr(users, "hash_password", fast_hash)
+    monkeypatch.setattr(mongodb, "users", DuplicateUsers(index, field))
+    user = UserCreate(username="testuser", email="test@example.com", password="testpassword123")
+    with pytest.raises(HTTPException) as excinfo:
+        await users.register_user(user)
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == detail
+
+
+class FailingIndexes:
+    """create_index总是失败的集合"""
+    name = "test"
+
+    async def create_index(self, keys, **options):
+        raise OperationFailure("E11000 duplicate key error", 11000)
+
+
+@pytest.mark.asyncio
+async def test_startup_fails_without_unique_indexes(monkeypatch):
+    for attr in ("users", "favorites", "reading_history"):
+        monkeypatch.setattr(mongodb, attr, FailingIndexes())
+    with pytest.raises(OperationFailure):
+        await mongodb.ensure_indexes()
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from app.core.resilience import CircuitBreaker, DatabaseUnavailable, ResponseCache, db_breaker
+
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # reset_timeout后只放行一个探测请求
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_response_cache_serves_stale_and_refreshes_in_background():
+    cache = ResponseCache("test_swr", "test_swr", fresh_ttl=60)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return {"version": len(calls)}
+
+    assert await cache.get("key", load) == {"version": 1}
+    assert await cache.get("key", load) == {"version": 1} and len(calls) == 1
+
+    async def failing_load():
+        raise ExecutionTimeout("operation exceeded time limit", 50)
+
+    # 过期后数据库超时：返回旧响应
+    cache.expire()
+    try:
+        assert await cache.get("key", failing_load) == {"version": 1}
+        assert cache.stale_served == 1
+    finally:
+        db_breaker.record_success()
+
+    # 刷新成功后缓存更新
+    assert await cache.get("key", load) == {"version": 2}
+
+    # 没有旧响应时抛出DatabaseUnavailable
+    with pytest.raises(DatabaseUnavailable):
+        await cache.get("other", failing_load)
+    db_breaker.record_success()
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_response_cache_keeps_stale_entry_on_refresh_error():
+    cache = ResponseCache("test_swr_error", "test_swr_error", fresh_ttl=60)
+
+    async def load():
+        return {"version": 1}
+
+    async def failing_load():
+        raise OperationFailure("cursor not found during shard failover", 43)
+
+    assert await cache.get("key", load) == {"version": 1}
+    cache.expire()
+    # 数据库有响应但查询出错：返回旧响应，保留条目
+    assert await cache.get("key", failing_load) == {"version": 1}
+    await asyncio.sleep(0)
+    assert cache.stale_served == 1 and cache.refresh_failures == 1
+    assert await cache.get("key", failing_load) == {"version": 1}
+    assert cache.stale_served == 2
+
+    # 没有旧响应时原样抛出
+    with pytest.raises(OperationFailure):
+        await cache.get("other", failing_load)
+    await asyncio.sleep(0)
@@ -55,8 +55,8 @@ async def test_register_user():
         assert "id" in response_data
         assert "user_id" in response_data
         assert response_data["id"] == response_data["user_id"]  # id和user_id应该相同
-        assert "favoriteNovels" in response_data
-        assert "readingHistory" in response_data
+        assert response_data["favoriteCount"] == 0
+        assert response_data["readingHistoryCount"] == 0
         assert "roles" in response_data
         assert "isActive" in response_data
         
@@ -0,0 +1,134 @@
+"""
+API性能基准测试
+
+在进程内通过ASGI直接调用FastAPI应用（不经过网络），数据库默认使用临时启动的本地mongod。
+
+用法:
+    python -m benchmarks --scenarios browse,read --concurrency 20 --duration 30
+    python -m benchmarks --save main                 # 保存为基线 benchmarks/baselines/main.json
+    python -m benchmarks --compare main --threshold 0.15   # 与基线对比，回归时退出码为1
+    python -m benchmarks --mongodb-url mongodb://localhost:27017   # 使用已有的MongoDB
+"""
+import argparse
+import asyncio
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+import httpx
+from pymongo import MongoClient
+from .local_mongod import LocalMongod
+from .corpus import seed_corpus
+from .scenarios import SCENARIOS, Recorder
+from .report import summarize, print_report, save_baseline, load_baseline, compare
+
+logger = logging.getLogger("benchmarks")
+
+BENCH_DATABASE = "novel_benchmark"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="小说应用API性能基准测试")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景: " + ",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=10, help="并发虚拟用户数")
+    parser.add_argument("--duration", type=float, default=10, help="每个场景的测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2, help="每个场景正式测量前的预热时长（秒）")
+    parser.add_argument("--mongodb-url", default=None, help="使用已有的MongoDB，不指定时临时启动本地mongod")
+    parser.add_argument("--novels", type=int, default=200, help="生成的小说数量")
+    parser.add_argument("--chapters", type=int, default=20, help="每本小说的章节数")
+    parser.add_argument("--users", type=int, default=50, help="生成的用户数量")
+    parser.add_argument("--save", default=None, help="把结果保存为指定名称的基线")
+    parser.add_argument("--compare", default=None, help="与指定名称的基线对比")
+    parser.add_argument("--threshold", type=float, default=0.15, help="回归阈值，0.15表示允许15%%的退化")
+    return parser.parse_args()
+
+
+async def run_scenario(client, ctx, scenario, concurrency: int, duration: float, warmup: float):
+    """用concurrency个虚拟用户循环执行场景，预热阶段的数据丢弃"""
+    async def virtual_user(recorder, deadline):
+        while time.perf_counter() < deadline:
+            await scenario(client, ctx, recorder)
+
+    if warmup > 0:
+        warmup_deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(virtual_user(Recorder(), warmup_deadline) for _ in range(concurrency)))
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(virtual_user(recorder, deadline) for _ in range(concurrency)))
+    return summarize(recorder.samples, recorder.errors, time.perf_counter() - started)
+
+
+async def run_benchmarks(args, mongodb_url: str):
+    from app.core.config import settings
+    settings.MONGODB_URL = mongodb_url
+    settings.DATABASE_NAME = BENCH_DATABASE
+    from app.main import app
+    from app.core.access_log import access_logger
+
+    # 访问日志照常生成和格式化，但不写到终端
+    access_logger.stream = open(os.devnull, "w", encoding="utf-8")
+
+    logger.info("写入基准测试数据...")
+    sync_client = MongoClient(mongodb_url)
+    try:
+        ctx = seed_corpus(sync_client[BENCH_DATABASE], novels=args.novels, chapters=args.chapters, users=args.users)
+    finally:
+        sync_client.close()
+
+    results = {}
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name in args.scenarios.split(","):
+                name = name.strip()
+                logger.info(f"运行场景: {name}")
+                results[name] = await run_scenario(client, ctx, SCENARIOS[name], args.concurrency, args.duration, args.warmup)
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    unknown = [name for name in args.scenarios.split(",") if name.strip() not in SCENARIOS]
+    if unknown:
+        sys.exit(f"未知场景: {', '.join(unknown)}")
+
+    if args.mongodb_url:
+        results = asyncio.run(run_benchmarks(args, args.mongodb_url))
+    else:
+        with LocalMongod() as mongod:
+            results = asyncio.run(run_benchmarks(args, mongod.url))
+
+    print_report(results)
+
+    if args.save:
+        path = save_baseline(args.save, results, {
+            "time": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "novels": args.novels,
+            "chapters": args.chapters,
+        })
+        print(f"\n基线已保存: {path}")
+
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.threshold)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项性能回归（阈值 {args.threshold:.0%}）:")
+            for item in regressions:
+                print(f"  - {item}")
+            sys.exit(1)
+        print(f"\n与基线 {args.compare} 相比未发现回归（阈值 {args.threshold:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
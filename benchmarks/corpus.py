@@ -0,0 +1,41 @@
+from typing import Dict
+from app.core.auth import get_password_hash
+from app.core.config import settings
+from .datagen import CorpusGenerator, TAGS
+
+
+def seed_corpus(db, novels: int = 200, chapters: int = 20, chapter_length: int = 2000,
+                users: int = 50, password: str = "benchpassword", seed: int = 42) -> Dict:
+    """
+    清空并写入基准测试数据，返回场景需要用到的上下文
+    db为pymongo的同步Database对象；文档由datagen生成，与大规模测试使用同一套分布
+    """
+    generator = CorpusGenerator(novels, users, seed=seed, chapters_median=chapters, chapters_sigma=0.3,
+                                max_chapters=chapters * 3, chapter_length=chapter_length, max_comments=200)
+    # 基准测试使用专用的库，清空全部集合（收藏、阅读历史、派生数据、失效事件等），上次运行的数据不会带到本次
+    for name in db.list_collection_names():
+        if not name.startswith("system."):
+            db.drop_collection(name)
+    novel_docs = [generator.novel(idx) for idx in range(novels)]
+    for start in range(0, len(novel_docs), 100):
+        db.novels.insert_many(novel_docs[start:start + 100], ordered=False)
+    # 所有用户共用一个密码哈希，避免准备阶段大量计算bcrypt
+    password_hash = get_password_hash(password)
+    user_docs = [generator.user(idx, password_hash) for idx in range(users)]
+    db.users.insert_many(user_docs, ordered=False)
+    # 收藏和阅读历史与应用一样写入独立的集合
+    for idx in range(users):
+        favorites, history = generator.user_activity(idx)
+        if favorites:
+            db[settings.FAVORITES_COLLECTION].insert_many(favorites, ordered=False)
+        if history:
+            db[settings.READING_HISTORY_COLLECTION].insert_many(history, ordered=False)
+    return {
+        "novels": [
+            {"id": str(doc["_id"]), "chapters": [ch["chapterId"] for ch in doc["chapters"]], "title": doc["title"]}
+            for doc in novel_docs
+        ],
+        "users": [{"username": doc["username"], "password": password, "id": str(doc["_id"])} for doc in user_docs],
+        "tags": TAGS,
+        "search_terms": [doc["title"][:2] for doc in novel_docs[:50]] + [doc["author"][:1] for doc in novel_docs[:50]],
+    }
@@ -0,0 +1,106 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import logging
+from typing import Optional
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalMongod:
+    """
+    在临时目录中启动一个本地mongod，用于基准测试和需要真实数据库的测试
+    replica_set=True时初始化为单节点副本集（change stream等功能需要）
+
+    用法:
+        with LocalMongod() as mongod:
+            client = MongoClient(mongod.url)
+    """
+
+    def __init__(self, mongod_bin: Optional[str] = None, replica_set: bool = False, port: Optional[int] = None):
+        self.mongod_bin = mongod_bin or os.getenv("MONGOD_BIN") or shutil.which("mongod")
+        self.replica_set = replica_set
+        self.port = port or _free_port()
+        self.dbpath = None
+        self.process = None
+
+    @staticmethod
+    def available(mongod_bin: Optional[str] = None) -> bool:
+        """本机是否能找到mongod可执行文件"""
+        return bool(mongod_bin or os.getenv("MONGOD_BIN") or shutil.which("mongod"))
+
+    @property
+    def url(self) -> str:
+        if self.replica_set:
+            return f"mongodb://127.0.0.1:{self.port}/?replicaSet=rs0&directConnection=true"
+        return f"mongodb://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30):
+        if not self.mongod_bin:
+            raise RuntimeError("找不到mongod，请安装MongoDB或设置MONGOD_BIN环境变量")
+        self.dbpath = tempfile.mkdtemp(prefix="novel-mongod-")
+        command = [
+            self.mongod_bin, "--dbpath", self.dbpath, "--port", str(self.port),
+            "--bind_ip", "127.0.0.1", "--quiet", "--logpath", os.path.join(self.dbpath, "mongod.log"),
+        ]
+        if self.replica_set:
+            command += ["--replSet", "rs0"]
+        logger.info(f"启动本地mongod: 端口 {self.port}, 数据目录 {self.dbpath}")
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_ready(timeout)
+        return self
+
+    def _wait_ready(self, timeout: float):
+        client = MongoClient(f"mongodb://127.0.0.1:{self.port}", directConnection=True, serverSelectionTimeoutMS=500)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"mongod启动失败，退出码 {self.process.returncode}")
+                try:
+                    client.admin.command("ping")
+                    break
+                except PyMongoError:
+                    if time.monotonic() >= deadline:
+                        raise RuntimeError("等待本地mongod就绪超时")
+                    time.sleep(0.2)
+            if self.replica_set:
+                client.admin.command("replSetInitiate", {
+                    "_id": "rs0", "members": [{"_id": 0, "host": f"127.0.0.1:{self.port}"}]
+                })
+                # 等待节点成为primary
+                while not client.admin.command("hello").get("isWritablePrimary"):
+                    if time.monotonic() >= deadline:
+                        raise RuntimeError("等待本地副本集选出primary超时")
+                    time.sleep(0.2)
+        finally:
+            client.close()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.dbpath:
+            shutil.rmtree(self.dbpath, ignore_errors=True)
+            self.dbpath = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,136 @@
+"""
+爬虫HTML解析后端基准测试
+
+对保存的页面（默认是爬虫测试用的fixtures）逐个用已安装的解析后端提取数据，比较吞吐，
+并以bs4的结果为准检查各后端的输出是否一致；指定--workers时另外测量进程池批量解析章节的吞吐。
+
+用法:
+    python -m benchmarks.parsers
+    python -m benchmarks.parsers --pages-dir data/pages --repeat 20 --workers 4
+    python -m benchmarks.parsers --backends lxml,bs4
+
+输出不一致时退出码为1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "System"))
+
+from crawler.parsing import (  # noqa: E402
+    ParsePool, available_backends, extract_book_info, extract_book_links, extract_chapter_content, extract_toc,
+)
+
+DEFAULT_PAGES_DIR = os.path.join(ROOT_DIR, "System", "tests", "fixtures", "site")
+
+
+def load_pages(pages_dir: str) -> List[Tuple[str, str, List[Callable]]]:
+    """读取目录下所有html页面，按内容判断页面类型，返回 [(相对路径, html, 提取函数列表)]"""
+    pages = []
+    for directory, _, files in sorted(os.walk(pages_dir)):
+        for name in sorted(files):
+            if not name.endswith(".html"):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as f:
+                html = f.read()
+            if 'id="chaptercontent"' in html:
+                extractors = [extract_chapter_content]
+            elif 'class="listmain"' in html:
+                extractors = [extract_book_info, extract_toc]
+            elif 'class="hot"' in html:
+                extractors = [extract_book_links]
+            else:
+                continue
+            pages.append((os.path.relpath(path, pages_dir), html, extractors))
+    return pages
+
+
+def run_backend(backend: str, pages, repeat: int) -> Tuple[float, Dict]:
+    """返回(总耗时, {(页面, 提取函数名): 结果})"""
+    outputs = {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path, html, extractors in pages:
+            for extractor in extractors:
+                outputs[(path, extractor.__name__)] = extractor(html, backend)
+    return time.perf_counter() - started, outputs
+
+
+def run_pool(backend: str, workers: int, htmls: List[str]) -> float:
+    pool = ParsePool(backend, workers=workers, process_threshold=1)
+    try:
+        # 先启动进程，不计入耗时
+        asyncio.run(pool.parse_many(extract_chapter_content, htmls[:workers]))
+        started = time.perf_counter()
+        asyncio.run(pool.parse_many(extract_chapter_content, htmls))
+        return time.perf_counter() - started
+    finally:
+        pool.shutdown()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="爬虫HTML解析后端基准测试")
+    parser.add_argument("--pages-dir", default=DEFAULT_PAGES_DIR, help="保存的页面目录")
+    parser.add_argument("--backends", default=",".join(available_backends()), help="逗号分隔的后端")
+    parser.add_argument("--repeat", type=int, default=50, help="每个后端解析全部页面的轮数")
+    parser.add_argument("--workers", type=int, default=0, help="进程池解析的进程数，0表示不测量")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    missing = [name for name in backends if name not in available_backends()]
+    if missing:
+        sys.exit(f"解析后端未安装: {', '.join(missing)}，已安装: {', '.join(available_backends())}")
+
+    pages = load_pages(args.pages_dir)
+    if not pages:
+        sys.exit(f"{args.pages_dir} 下没有可识别的页面")
+    total_bytes = sum(len(html.encode("utf-8")) for _, html, _ in pages) * args.repeat
+    total_pages = len(pages) * args.repeat
+    print(f"页面: {len(pages)} 个, 轮数: {args.repeat}, 总数据量: {total_bytes / 1024 / 1024:.2f} MB\n")
+
+    _, expected = run_backend("bs4", pages, 1)
+    mismatches = []
+    results = {}
+    for backend in backends:
+        elapsed, outputs = run_backend(backend, pages, args.repeat)
+        results[backend] = elapsed
+        for key, value in expected.items():
+            if outputs[key] != value:
+                mismatches.append((backend, key, value, outputs[key]))
+
+    baseline = results.get("bs4")
+    print(f"{'后端':<12}{'页面/秒':>12}{'MB/秒':>10}{'单页(us)':>12}{'相对bs4':>10}")
+    for backend, elapsed in results.items():
+        speedup = f"{baseline / elapsed:.1f}x" if baseline else "-"
+        print(f"{backend:<12}{total_pages / elapsed:>12.0f}{total_bytes / elapsed / 1024 / 1024:>10.2f}"
+              f"{elapsed / total_pages * 1e6:>12.1f}{speedup:>10}")
+
+    if args.workers:
+        chapters = [html for _, html, extractors in pages if extract_chapter_content in extractors] * args.repeat
+        backend = backends[0]
+        pool_elapsed = run_pool(backend, args.workers, chapters)
+        serial_started = time.perf_counter()
+        for html in chapters:
+            extract_chapter_content(html, backend)
+        serial_elapsed = time.perf_counter() - serial_started
+        print(f"\n章节批量解析（{backend}, {len(chapters)} 页）: 单进程 {len(chapters) / serial_elapsed:.0f} 页/秒, "
+              f"{args.workers} 进程 {len(chapters) / pool_elapsed:.0f} 页/秒")
+
+    if mismatches:
+        print(f"\n{len(mismatches)} 项输出与bs4不一致:")
+        for backend, (path, name), want, got in mismatches[:10]:
+            print(f"  - {backend} {path} {name}:\n      bs4: {want!r}\n      {backend}: {got!r}")
+        sys.exit(1)
+    print("\n各后端输出与bs4一致")
+
+
+if __name__ == "__main__":
+    main()
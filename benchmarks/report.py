@@ -0,0 +1,89 @@
+import json
+import math
+import os
+from typing import Dict, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法求分位数，sorted_values需已排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(math.ceil(q / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(samples: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict:
+    """把原始耗时样本汇总为每个步骤的p50/p95/p99（毫秒）和整体吞吐"""
+    steps = {}
+    total = 0
+    for step, values in sorted(samples.items()):
+        values = sorted(values)
+        total += len(values)
+        steps[step] = {
+            "count": len(values),
+            "errors": errors.get(step, 0),
+            "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    return {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "elapsed_s": elapsed,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "steps": steps,
+    }
+
+
+def print_report(results: Dict):
+    """打印结果表格"""
+    for scenario, result in results.items():
+        print(f"\n== {scenario}: {result['requests']} 请求, {result['errors']} 错误, "
+              f"{result['throughput_rps']:.1f} req/s ==")
+        # 中文表头每个字占两列宽度，宽度参数相应减小
+        print(f"{'步骤':<26}{'次数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'错误':>6}")
+        for step, stat in result["steps"].items():
+            print(f"{step:<28}{stat['count']:>8}{stat['p50_ms']:>10.2f}{stat['p95_ms']:>10.2f}"
+                  f"{stat['p99_ms']:>10.2f}{stat['errors']:>8}")
+
+
+def baseline_path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name: str, results: Dict, meta: Optional[Dict] = None) -> str:
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta or {}, "results": results}, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_baseline(name: str) -> Dict:
+    with open(baseline_path(name), encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    与基线对比，返回回归描述列表
+    p95/p99超过基线的(1+threshold)倍，或吞吐低于基线的(1-threshold)倍，视为回归
+    """
+    regressions = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{scenario}: 吞吐 {result['throughput_rps']:.1f} < 基线 {base['throughput_rps']:.1f} req/s")
+        for step, stat in result["steps"].items():
+            base_stat = base["steps"].get(step)
+            if not base_stat:
+                continue
+            for key in ("p95_ms", "p99_ms"):
+                if base_stat[key] > 0 and stat[key] > base_stat[key] * (1 + threshold):
+                    regressions.append(f"{scenario}/{step}: {key} {stat[key]:.2f} > 基线 {base_stat[key]:.2f}")
+    return regressions
@@ -0,0 +1,75 @@
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict
+
+
+class Recorder:
+    """记录每个请求步骤的耗时和错误数"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client, step: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            self.errors[step] += 1
+            return None
+        self.samples[step].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+        return response
+
+
+async def browse(client, ctx: Dict, recorder: Recorder):
+    """浏览：列表翻页、标签、热门、详情和推荐"""
+    await recorder.request(client, "browse:list", "GET", f"/api/novels?page={random.randint(1, 5)}&limit=10")
+    await recorder.request(client, "browse:list_tag", "GET", f"/api/novels?tags={random.choice(ctx['tags'])}&limit=10")
+    await recorder.request(client, "browse:tags", "GET", "/api/tags")
+    await recorder.request(client, "browse:popular", "GET", "/api/novels/popular?limit=10")
+    novel = random.choice(ctx["novels"])
+    await recorder.request(client, "browse:detail", "GET", f"/api/novels/{novel['id']}")
+    await recorder.request(client, "browse:recommendations", "GET", f"/api/novels/{novel['id']}/recommendations")
+
+
+async def search(client, ctx: Dict, recorder: Recorder):
+    """搜索：按标题/作者关键词查询"""
+    term = random.choice(ctx["search_terms"])
+    await recorder.request(client, "search:novels", "GET", "/api/novels", params={"search": term, "limit": 10})
+
+
+async def read_chapters(client, ctx: Dict, recorder: Recorder, chapters_per_session: int = 5):
+    """连续阅读：打开详情后按顺序读若干章"""
+    novel = random.choice(ctx["novels"])
+    await recorder.request(client, "read:detail", "GET", f"/api/novels/{novel['id']}")
+    start = random.randint(0, max(len(novel["chapters"]) - chapters_per_session, 0))
+    for chapter_id in novel["chapters"][start:start + chapters_per_session]:
+        await recorder.request(client, "read:chapter", "GET", f"/api/novels/{novel['id']}/chapters/{chapter_id}")
+
+
+async def comment(client, ctx: Dict, recorder: Recorder):
+    """评论：发表评论后查看评论列表"""
+    novel = random.choice(ctx["novels"])
+    user = random.choice(ctx["users"])
+    await recorder.request(client, "comment:add", "POST", f"/api/novels/{novel['id']}/comments",
+                           json={"userId": user["id"], "content": "压测评论"})
+    await recorder.request(client, "comment:list", "GET", f"/api/novels/{novel['id']}/comments?page=1&limit=20")
+
+
+async def login(client, ctx: Dict, recorder: Recorder):
+    """登录：表单方式获取令牌"""
+    user = random.choice(ctx["users"])
+    await recorder.request(client, "login:token", "POST", "/api/users/login",
+                           data={"username": user["username"], "password": user["password"]})
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "browse": browse,
+    "search": search,
+    "read": read_chapters,
+    "comment": comment,
+    "login": login,
+}
@@ -3,26 +3,112 @@ import time
 import os
 import sys
 import signal
-import threading
-import uvicorn
+import argparse
+import multiprocessing
+import tempfile
+import urllib.request
+import urllib.error
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from app.core.config import settings
+
+BACKEND_HEALTH_URL = "http://localhost:8000/health"
 
 def run_powershell_script(script_path, command):
     """运行PowerShell脚本中的特定命令"""
     print(f"执行PowerShell脚本: {script_path} 命令: {command}")
-    
+
     # 构建PowerShell命令
     ps_command = f'powershell -File "{script_path}" -Command {command}'
-    
+
     # 执行PowerShell命令
     process = subprocess.Popen(ps_command, shell=True)
     return process
 
+def wait_for_mongodb(url=settings.MONGODB_URL, timeout=settings.MONGODB_READY_TIMEOUT, interval=1.0):
+    """探测mongos是否就绪，替代固定时长的等待"""
+    client = MongoClient(url, serverSelectionTimeoutMS=int(interval * 1000), connectTimeoutMS=int(interval * 1000))
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                hello = client.admin.command("hello")
+                # 连接的是mongos时，还要确认分片已经注册到集群
+                if hello.get("msg") != "isdbgrid" or client.admin.command("listShards").get("shards"):
+                    print("MongoDB已就绪")
+                    return True
+            except PyMongoError:
+                pass
+            if time.monotonic() >= deadline:
+                print(f"等待MongoDB就绪超时({timeout}秒)")
+                return False
+            time.sleep(interval)
+    finally:
+        client.close()
+
+def wait_for_backend(url=BACKEND_HEALTH_URL, timeout=60, interval=0.5):
+    """轮询健康检查接口，直到后端可以处理请求"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=interval) as response:
+                if response.status == 200:
+                    print("后端服务已就绪")
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(interval)
+    print(f"等待后端服务就绪超时({timeout}秒)")
+    return False
+
 def start_backend():
     """启动后端服务"""
     print("正在启动后端服务...")
     backend_process = subprocess.Popen("uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload", shell=True)
     return backend_process
 
+def get_worker_count():
+    """生产模式的worker数量，未配置时按CPU核数计算"""
+    if settings.WORKERS > 0:
+        return settings.WORKERS
+    # 异步worker每个进程即可占满一个核心，容器中按可用的CPU集合计算
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+def start_backend_production(workers):
+    """以多worker方式启动后端服务（无文件监听）"""
+    print(f"正在以生产模式启动后端服务，worker数量: {workers}")
+    if os.name == "nt":
+        # Windows上没有gunicorn和uvloop，退回到uvicorn自带的多进程模式（不支持HUP重新加载）
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "0.0.0.0", "--port", "8000",
+            "--workers", str(workers),
+            "--timeout-graceful-shutdown", str(settings.GRACEFUL_TIMEOUT),
+            "--no-access-log",
+        ]
+    else:
+        # gunicorn负责进程管理：TERM时等待在途请求处理完再退出；HUP时先启动一组新worker，
+        # 再平滑停止全部旧worker（不是逐个替换，期间worker数短暂翻倍）；
+        # max-requests加抖动让worker错开时间各自重启
+        command = [
+            sys.executable, "-m", "gunicorn", "app.main:app",
+            "--worker-class", "app.core.workers.ProductionUvicornWorker",
+            "--workers", str(workers),
+            "--bind", "0.0.0.0:8000",
+            "--graceful-timeout", str(settings.GRACEFUL_TIMEOUT),
+            "--max-requests", str(settings.MAX_REQUESTS),
+            "--max-requests-jitter", str(settings.MAX_REQUESTS_JITTER),
+            "--keep-alive", "5",
+            "--config", "python:app.core.workers",
+        ]
+    # 多进程下各worker把Prometheus指标写到共享目录，/metrics汇总所有worker的数据
+    env = os.environ.copy()
+    if "PROMETHEUS_MULTIPROC_DIR" not in env:
+        env["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="novel-metrics-")
+    return subprocess.Popen(command, env=env)
+
 def start_frontend():
     """启动前端服务"""
     print("正在启动前端服务...")
@@ -30,11 +116,11 @@ def start_frontend():
     frontend_process = subprocess.Popen("npm run dev", shell=True)
     return frontend_process
 
-def handle_exit(frontend_process, mongodb_process, backend_process):
-    """处理程序退出，确保所有进程都被终止"""
+def handle_exit(frontend_process, mongodb_process, backend_process, backend_timeout=5, reload=False):
+    """处理程序退出，确保所有进程都被终止；reload为True时把SIGHUP转发给gunicorn"""
     def signal_handler(sig, frame):
         print("\n正在关闭所有服务...")
-        
+
         # 关闭前端进程
         if frontend_process:
             frontend_process.terminate()
@@ -42,56 +128,85 @@ def handle_exit(frontend_process, mongodb_process, backend_process):
                 frontend_process.wait(timeout=5)
             except subprocess.TimeoutExpired:
                 frontend_process.kill()
-        
-        # 关闭MongoDB集群
-        if mongodb_process:
-            # 调用停止MongoDB集群的脚本
-            stop_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "System", "mongodb_cluster.ps1")
-            subprocess.run(f'powershell -File "{stop_script}" -Command "Stop-Cluster"', shell=True)
-        
-        # 关闭后端服务
+
+        # 先关闭后端服务，让worker处理完在途请求并写回缓冲数据后再停数据库
         if backend_process:
             backend_process.terminate()
             try:
-                backend_process.wait(timeout=5)
+                backend_process.wait(timeout=backend_timeout)
             except subprocess.TimeoutExpired:
                 backend_process.kill()
-        
+
+        # 关闭MongoDB集群
+        if mongodb_process:
+            # 调用停止MongoDB集群的脚本
+            stop_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "System", "mongodb_cluster.ps1")
+            subprocess.run(f'powershell -File "{stop_script}" -Command "Stop-Cluster"', shell=True)
+
         print("所有服务已关闭，程序退出")
         sys.exit(0)
-    
+
+    def reload_handler(sig, frame):
+        # 转发给gunicorn：启动新worker后平滑停止所有旧worker
+        print("\n正在重新加载后端worker...")
+        backend_process.send_signal(signal.SIGHUP)
+
     # 注册信号处理程序
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    # 开发模式下后端是shell包装的uvicorn --reload进程，HUP只会杀掉shell，不注册
+    if reload and hasattr(signal, "SIGHUP") and backend_process:
+        signal.signal(signal.SIGHUP, reload_handler)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="一键启动Novel2.0项目")
+    parser.add_argument("--prod", action="store_true", help="生产模式：多worker、无--reload、不启动前端开发服务器")
+    parser.add_argument("--workers", type=int, default=None, help="生产模式的worker数量，默认按CPU核数计算")
+    parser.add_argument("--no-cluster", action="store_true", help="不启动本地MongoDB集群，只等待已有的mongos就绪")
+    return parser.parse_args()
 
 def main():
     """主函数，启动整个应用"""
+    args = parse_args()
     print("=== 一键启动Novel2.0项目 ===")
-    
+
     # 1. 启动MongoDB集群
-    mongodb_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "System", "mongodb_cluster.ps1")
-    mongodb_process = run_powershell_script(mongodb_script, "Start-Cluster")
-    print("MongoDB集群启动中，等待30秒让集群初始化...")
-    time.sleep(50)  # 等待MongoDB集群完全启动
-    
+    mongodb_process = None
+    if not args.no_cluster:
+        mongodb_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "System", "mongodb_cluster.ps1")
+        mongodb_process = run_powershell_script(mongodb_script, "Start-Cluster")
+    print("等待MongoDB集群就绪...")
+    if not wait_for_mongodb():
+        sys.exit(1)
+
     # 2. 启动后端服务
-    backend_process = start_backend()
-    print("后端服务启动中，等待10秒让API服务初始化...")
-    time.sleep(10)  # 等待后端服务完全启动
-    
-    # 3. 启动前端服务
-    frontend_process = start_frontend()
-    print("前端服务启动中...")
-    
+    if args.prod:
+        backend_process = start_backend_production(args.workers or get_worker_count())
+    else:
+        backend_process = start_backend()
+    if not wait_for_backend():
+        backend_process.terminate()
+        sys.exit(1)
+
+    # 3. 启动前端服务（生产模式下前端使用构建产物，不启动开发服务器）
+    frontend_process = None
+    if not args.prod:
+        frontend_process = start_frontend()
+        print("前端服务启动中...")
+
     # 4. 设置退出处理
-    handle_exit(frontend_process, mongodb_process, backend_process)
-    
+    backend_timeout = settings.GRACEFUL_TIMEOUT + 5 if args.prod else 5
+    handle_exit(frontend_process, mongodb_process, backend_process, backend_timeout, reload=args.prod)
+
     print("\n=== 所有服务已启动 ===")
-    print("- 前端访问地址: http://localhost:5173")
+    if not args.prod:
+        print("- 前端访问地址: http://localhost:5173")
     print("- 后端API地址: http://localhost:8000")
     print("- API文档地址: http://localhost:8000/docs")
     print("\n按Ctrl+C可以一键关闭所有服务")
-    
+    if args.prod and hasattr(signal, "SIGHUP"):
+        print(f"向进程 {os.getpid()} 发送SIGHUP可以重新加载后端worker（先启动新worker，再停止旧worker）")
+
     # 保持主程序运行
     try:
         while True:
@@ -100,4 +215,4 @@ def main():
         pass
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -93,6 +93,11 @@ export const AuthProvider = ({ children }) => {
 
   // 退出登录
   const logout = () => {
+    // 通知服务端注销令牌，失败不影响本地退出
+    const token = localStorage.getItem('token');
+    if (token) {
+      userApi.logout(token).catch(error => console.error('注销令牌失败:', error));
+    }
     localStorage.removeItem('token');
     localStorage.removeItem('user');
     setUser(null);
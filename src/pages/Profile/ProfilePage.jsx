@@ -3,15 +3,23 @@ import { Card, Avatar, Tabs, List, Button, message, Skeleton, Empty, Typography,
 import { UserOutlined, BookOutlined, HeartOutlined, HistoryOutlined } from '@ant-design/icons';
 import { useAuth } from '../../contexts/AuthContext';
 import { useNavigate } from 'react-router-dom';
+import { novelApi } from '../../services/api';
 
 const { Title, Text } = Typography;
 
+const PAGE_SIZE = 10;
+
 const ProfilePage = () => {
   const { user, isAuthenticated, refreshUserInfo } = useAuth();
   const navigate = useNavigate();
   const [loading, setLoading] = useState(false);
+  const [favoriteLoading, setFavoriteLoading] = useState(false);
   const [favoriteNovels, setFavoriteNovels] = useState([]);
+  const [favoritePage, setFavoritePage] = useState(1);
+  const [favoriteTotal, setFavoriteTotal] = useState(0);
   const [readingHistory, setReadingHistory] = useState([]);
+  const [historyPage, setHistoryPage] = useState(1);
+  const [historyTotal, setHistoryTotal] = useState(0);
 
   // 如果未登录，重定向到登录页
   useEffect(() => {
@@ -21,36 +29,54 @@ const ProfilePage = () => {
     }
   }, [isAuthenticated, navigate]);
 
-  // 加载用户收藏和阅读历史
+  // 刷新用户资料（只包含收藏数和阅读历史数）
+  useEffect(() => {
+    if (isAuthenticated) {
+      refreshUserInfo();
+    }
+  }, [isAuthenticated]);
+
+  // 分页加载阅读历史
   useEffect(() => {
-    const loadUserData = async () => {
+    const loadReadingHistory = async () => {
       if (isAuthenticated) {
         setLoading(true);
         try {
-          // 刷新用户信息，获取最新的收藏和阅读历史
-          const updatedUser = await refreshUserInfo();
-          if (updatedUser) {
-            setFavoriteNovels(updatedUser.favoriteNovels || []);
-            setReadingHistory(updatedUser.readingHistory || []);
-          } else {
-            // 如果刷新失败，使用当前用户数据
-            setFavoriteNovels(user?.favoriteNovels || []);
-            setReadingHistory(user?.readingHistory || []);
-          }
+          const response = await novelApi.getReadingHistory(historyPage, PAGE_SIZE);
+          setReadingHistory(response.history || []);
+          setHistoryTotal(response.total || 0);
         } catch (error) {
-          console.error('获取用户数据失败:', error);
-          message.error('获取用户数据失败');
-          // 使用当前用户数据作为备选
-          setFavoriteNovels(user?.favoriteNovels || []);
-          setReadingHistory(user?.readingHistory || []);
+          console.error('获取阅读历史失败:', error);
+          message.error('获取阅读历史失败');
         } finally {
           setLoading(false);
         }
       }
     };
 
-    loadUserData();
-  }, [isAuthenticated, user, refreshUserInfo]);
+    loadReadingHistory();
+  }, [isAuthenticated, historyPage]);
+
+  // 分页加载收藏
+  useEffect(() => {
+    const loadFavorites = async () => {
+      if (isAuthenticated) {
+        setFavoriteLoading(true);
+        try {
+          const response = await novelApi.getFavorites(favoritePage, PAGE_SIZE);
+          setFavoriteNovels(response.favorites || []);
+          setFavoriteTotal(response.total || 0);
+        } catch (error) {
+          console.error('获取收藏失败:', error);
+          message.error('获取收藏失败');
+        } finally {
+          setFavoriteLoading(false);
+        }
+      }
+    };
+
+    loadFavorites();
+  }, [isAuthenticated, favoritePage]);
 
   if (!isAuthenticated) {
     return null; // 未登录时不渲染内容
@@ -60,17 +86,24 @@ const ProfilePage = () => {
   const tabItems = [
     {
       key: 'reading-history',
-      label: <span><HistoryOutlined /> 阅读历史</span>,
+      label: <span><HistoryOutlined /> 阅读历史 ({user?.readingHistoryCount ?? historyTotal})</span>,
       children: (
         <Skeleton loading={loading} active paragraph={{ rows: 5 }}>
           {readingHistory.length > 0 ? (
             <List
               itemLayout="horizontal"
               dataSource={readingHistory}
+              pagination={{
+                current: historyPage,
+                pageSize: PAGE_SIZE,
+                total: historyTotal,
+                onChange: setHistoryPage,
+                hideOnSinglePage: true
+              }}
               renderItem={item => (
                 <List.Item
                   actions={[
-                    <Button type="link" onClick={() => navigate(`/novel/${item.novelId}/chapter/${item.chapterId}`)}>
+                    <Button type="link" onClick={() => navigate(`/novel/${item.novelId}/chapter/${item.chapterId}`, { state: { scrollPosition: item.scrollPosition } })}>
                       继续阅读
                     </Button>
                   ]}
@@ -91,13 +124,20 @@ const ProfilePage = () => {
     },
     {
       key: 'favorites',
-      label: <span><HeartOutlined /> 我的收藏</span>,
+      label: <span><HeartOutlined /> 我的收藏 ({user?.favoriteCount ?? favoriteTotal})</span>,
       children: (
-        <Skeleton loading={loading} active paragraph={{ rows: 5 }}>
+        <Skeleton loading={favoriteLoading} active paragraph={{ rows: 5 }}>
           {favoriteNovels.length > 0 ? (
             <List
               itemLayout="horizontal"
               dataSource={favoriteNovels}
+              pagination={{
+                current: favoritePage,
+                pageSize: PAGE_SIZE,
+                total: favoriteTotal,
+                onChange: setFavoritePage,
+                hideOnSinglePage: true
+              }}
               renderItem={item => (
                 <List.Item
                   actions={[
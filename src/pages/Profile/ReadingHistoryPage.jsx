@@ -3,14 +3,19 @@ import { Card, List, Avatar, Button, message, Skeleton, Empty, Typography } from
 import { BookOutlined, ClockCircleOutlined } from '@ant-design/icons';
 import { useAuth } from '../../contexts/AuthContext';
 import { useNavigate } from 'react-router-dom';
+import { novelApi } from '../../services/api';
 
 const { Title } = Typography;
 
+const PAGE_SIZE = 10;
+
 const ReadingHistoryPage = () => {
-  const { user, isAuthenticated, refreshUserInfo } = useAuth();
+  const { isAuthenticated } = useAuth();
   const navigate = useNavigate();
   const [loading, setLoading] = useState(false);
   const [readingHistory, setReadingHistory] = useState([]);
+  const [page, setPage] = useState(1);
+  const [total, setTotal] = useState(0);
 
   // 如果未登录，重定向到登录页
   useEffect(() => {
@@ -20,25 +25,18 @@ const ReadingHistoryPage = () => {
     }
   }, [isAuthenticated, navigate]);
 
-  // 加载阅读历史
+  // 分页加载阅读历史
   useEffect(() => {
     const loadReadingHistory = async () => {
       if (isAuthenticated) {
         setLoading(true);
         try {
-          // 刷新用户信息，获取最新的阅读历史
-          const updatedUser = await refreshUserInfo();
-          if (updatedUser) {
-            setReadingHistory(updatedUser.readingHistory || []);
-          } else {
-            // 如果刷新失败，使用当前用户数据
-            setReadingHistory(user?.readingHistory || []);
-          }
+          const response = await novelApi.getReadingHistory(page, PAGE_SIZE);
+          setReadingHistory(response.history || []);
+          setTotal(response.total || 0);
         } catch (error) {
           console.error('获取阅读历史失败:', error);
           message.error('获取阅读历史失败');
-          // 使用当前用户数据作为备选
-          setReadingHistory(user?.readingHistory || []);
         } finally {
           setLoading(false);
         }
@@ -46,7 +44,7 @@ const ReadingHistoryPage = () => {
     };
 
     loadReadingHistory();
-  }, [isAuthenticated, user, refreshUserInfo]);
+  }, [isAuthenticated, page]);
 
   if (!isAuthenticated) {
     return null; // 未登录时不渲染内容
@@ -67,14 +65,17 @@ const ReadingHistoryPage = () => {
                 itemLayout="vertical"
                 dataSource={readingHistory}
                 pagination={{
-                  pageSize: 10,
+                  current: page,
+                  pageSize: PAGE_SIZE,
+                  total,
+                  onChange: setPage,
                   hideOnSinglePage: true
                 }}
                 renderItem={item => (
                   <List.Item
                     key={item.novelId}
                     actions={[
-                      <Button type="primary" onClick={() => navigate(`/novel/${item.novelId}/chapter/${item.chapterId}`)}>
+                      <Button type="primary" onClick={() => navigate(`/novel/${item.novelId}/chapter/${item.chapterId}`, { state: { scrollPosition: item.scrollPosition } })}>
                         继续阅读
                       </Button>,
                       <Button onClick={() => navigate(`/novel/${item.novelId}`)}>
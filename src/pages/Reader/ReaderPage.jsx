@@ -1,5 +1,5 @@
-import React, { useEffect, useState } from 'react';
-import { useParams, useNavigate } from 'react-router-dom';
+import React, { useEffect, useRef, useState } from 'react';
+import { useParams, useNavigate, useLocation } from 'react-router-dom';
 import { 
   Typography, Button, Drawer, Menu, 
   Spin, message, Tooltip, Space, 
@@ -24,9 +24,21 @@ const defaultSettings = {
   letterSpacing: 0.05
 };
 
+// 滚动停止多久后上报一次阅读位置（毫秒）
+const SCROLL_SAVE_DELAY = 3000;
+
+// 当前阅读位置，0为章节开头，1为末尾
+const getScrollPosition = () => {
+  const scrollable = document.documentElement.scrollHeight - window.innerHeight;
+  return scrollable > 0 ? Math.min(Math.max(window.scrollY / scrollable, 0), 1) : 0;
+};
+
 const ReaderPage = () => {
   const { id, chapterId } = useParams();
   const navigate = useNavigate();
+  const location = useLocation();
+  // 最近一次上报的阅读历史，滚动时只更新其中的位置
+  const historyRef = useRef(null);
   const { user, isAuthenticated } = useAuth();
   
   const [loading, setLoading] = useState(true);
@@ -57,6 +69,8 @@ const ReaderPage = () => {
   useEffect(() => {
     const fetchNovelAndChapter = async () => {
       setLoading(true);
+      // 新章节加载完成前不上报滚动位置
+      historyRef.current = null;
       try {
         // 加载小说详情
         const novelData = await novelApi.getNovelDetail(id);
@@ -70,8 +84,12 @@ const ReaderPage = () => {
         // 更新阅读计数
         await novelApi.incrementReadCount(id);
         
-        // 滚动到顶部
-        window.scrollTo(0, 0);
+        // 从阅读历史进入时恢复上次的阅读位置，否则滚动到顶部
+        const savedPosition = location.state?.scrollPosition || 0;
+        window.requestAnimationFrame(() => {
+          const scrollable = document.documentElement.scrollHeight - window.innerHeight;
+          window.scrollTo(0, scrollable > 0 ? scrollable * savedPosition : 0);
+        });
         
         // 保存阅读历史（如果已登录）
         if (isAuthenticated && user) {
@@ -82,9 +100,11 @@ const ReaderPage = () => {
               title: novelData.title,
               author: novelData.author,
               chapterTitle: chapterData.title,
-              coverImage: novelData.cover
+              coverImage: novelData.cover,
+              scrollPosition: savedPosition
             };
             
+            historyRef.current = historyData;
             await novelApi.saveReadingHistory(historyData);
           } catch (error) {
             console.error('保存阅读历史失败:', error);
@@ -103,6 +123,28 @@ const ReaderPage = () => {
     }
   }, [id, chapterId, isAuthenticated, user]);
   
+  // 滚动停止后上报阅读位置（服务端也会合并短时间内的多次更新）
+  useEffect(() => {
+    if (!isAuthenticated) {
+      return undefined;
+    }
+    let timer = null;
+    const handleScroll = () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => {
+        if (historyRef.current) {
+          historyRef.current = { ...historyRef.current, scrollPosition: getScrollPosition() };
+          novelApi.saveReadingHistory(historyRef.current).catch(error => console.error('保存阅读位置失败:', error));
+        }
+      }, SCROLL_SAVE_DELAY);
+    };
+    window.addEventListener('scroll', handleScroll, { passive: true });
+    return () => {
+      clearTimeout(timer);
+      window.removeEventListener('scroll', handleScroll);
+    };
+  }, [isAuthenticated]);
+  
   // 切换到上一章
   const goToPrevChapter = () => {
     if (chapter?.prevChapter) {
@@ -108,6 +108,16 @@ export const novelApi = {
     return api.post('/users/reading-history', novelInfo);
   },
   
+  // 分页获取阅读历史
+  getReadingHistory: (page = 1, limit = 10) => {
+    return api.get(`/users/reading-history?page=${page}&limit=${limit}`);
+  },
+  
+  // 分页获取收藏列表
+  getFavorites: (page = 1, limit = 10) => {
+    return api.get(`/users/favorites?page=${page}&limit=${limit}`);
+  },
+  
   // 收藏或取消收藏小说
   toggleFavorite: (novelId, novelInfo) => {
     return api.post(`/users/favorite/${novelId}`, novelInfo);
@@ -116,6 +126,13 @@ export const novelApi = {
   // 检查小说是否已收藏
   checkFavoriteStatus: (novelId) => {
     return api.get(`/users/favorite/status/${novelId}`);
+  },
+  
+  // 批量检查收藏状态，返回 { statuses: { [novelId]: boolean } }
+  checkFavoriteStatuses: (novelIds) => {
+    return api.get('/users/favorite/status', {
+      params: { novel_ids: novelIds.join(',') }
+    });
   }
 };
 
@@ -143,6 +160,14 @@ export const userApi = {
     return api.post('/users/register', userData);
   },
   
+  // 退出登录（服务端注销已签发的令牌）
+  // 显式传入token：调用方会紧接着清除localStorage，拦截器执行时可能已读不到
+  logout: (token) => {
+    return api.post('/users/logout', null, {
+      headers: { Authorization: `Bearer ${token}` }
+    });
+  },
+  
   // 获取用户信息
   getUserInfo: () => {
     return api.get('/users/profile');